@@ -1,6 +1,9 @@
 __version__ = "0.1.0"
 
+from .archive import ArchiveMissError, PageArchive
+from .code_index import CodeIndex
 from .common import BASE_URL, Semester, Weekday
+from .dead_letter import DeadLetterStore
 from .ja import (
     ClassForm,
     CommonCode,
@@ -11,6 +14,12 @@ from .ja import (
     SearchParams,
     UTCourseCatalog,
 )
+from .journal import CrawlJournal
+from .metrics import Metrics
+from .profiling import Profiler
+from .retry_policy import HTTPStatusError, RetryPolicy
+from .table import CatalogTable
+from .transport import TransportConfig
 
 __all__ = [
     "Semester",
@@ -24,4 +33,15 @@ __all__ = [
     "ClassForm",
     "Language",
     "CommonCode",
+    "CrawlJournal",
+    "PageArchive",
+    "ArchiveMissError",
+    "CodeIndex",
+    "TransportConfig",
+    "Metrics",
+    "Profiler",
+    "RetryPolicy",
+    "HTTPStatusError",
+    "DeadLetterStore",
+    "CatalogTable",
 ]
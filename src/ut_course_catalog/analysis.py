@@ -2,14 +2,16 @@ from __future__ import annotations
 
 from enum import Enum, auto
 from logging import getLogger
-from typing import Any, Iterable
+from typing import TYPE_CHECKING, Any, Iterable
 
 import pandas as pd
-from PIL.Image import Image
 from tqdm.auto import tqdm
 
 from .ja import CommonCode
 
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
 LOG = getLogger(__name__)
 
 
@@ -118,5 +120,6 @@ def to_perfect_isolated_dataframe(df: pd.DataFrame) -> pd.DataFrame:
             return tuple(deenum(y) for y in x)
         return x
 
-    df = df.applymap(deenum)
+    # DataFrame.applymap is deprecated since pandas 2.1 and removed in 3.0
+    df = df.map(deenum)
     return df
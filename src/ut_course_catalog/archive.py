@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple
+from urllib.parse import parse_qsl, urlencode
+
+from typing_extensions import Self
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class ArchiveMissError(LookupError):
+    """Raised when a page is not in the archive in offline mode."""
+
+
+class ArchivedPage(NamedTuple):
+    """A page in the archive."""
+
+    endpoint: str
+    params: dict[str, str]
+    digest: str
+    """SHA-256 of the page."""
+    fetched_at: float
+    """UNIX time when the page was archived."""
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _encode_params(params: dict[str, Any]) -> str:
+    return urlencode(sorted((k, str(v)) for k, v in params.items()))
+
+
+def archive_key(endpoint: str, params: dict[str, Any]) -> str:
+    """Key of a page in the archive."""
+    return endpoint + "?" + _encode_params(params)
+
+
+class PageArchive:
+    """Compressed, content-addressed archive of the raw pages of the website.
+
+    Pages are compressed individually (zstd if `zstandard` is installed, otherwise zlib)
+    and appended to segment files. Identical pages are stored only once.
+    An SQLite index maps the endpoint and query parameters of each page to its content.
+    """
+
+    path: Path
+    codec: str
+    segment_size: int
+    _connection: sqlite3.Connection | None
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        codec: str | None = None,
+        segment_size: int = 64 * 1024 * 1024,
+    ) -> None:
+        """Compressed archive of raw pages.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Directory of the archive. Created if it does not exist.
+        codec : Optional[str], optional
+            "zstd" or "zlib", by default "zstd" if `zstandard` is installed.
+            Pages written with either codec can always be read (zstd requires `zstandard`).
+        segment_size : int, optional
+            Size in bytes after which a new segment is started, by default 64 MiB
+        """
+        if codec is None:
+            codec = "zstd" if zstandard is not None else "zlib"
+        if codec == "zstd" and zstandard is None:
+            raise ImportError(
+                "zstandard is required for the zstd codec. "
+                "Install it with `pip install ut-course-catalog[zstd]`."
+            )
+        if codec not in ("zstd", "zlib"):
+            raise ValueError(f"Unknown codec: {codec}")
+        self.path = Path(path)
+        self.codec = codec
+        self.segment_size = segment_size
+        self._connection = None
+
+    def open(self) -> Self:
+        if self._connection is not None:
+            return self
+        (self.path / "segments").mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path / "index.sqlite")
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                params TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_endpoint ON pages (endpoint);
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                codec TEXT NOT NULL
+            );
+            """
+        )
+        return self
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        assert self._connection is not None  # nosec
+        return self._connection
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.path / "segments" / f"{segment:06d}.seg"
+
+    def _write_blob(self, data: bytes) -> tuple[int, int, int]:
+        row = self.connection.execute("SELECT MAX(segment) FROM blobs").fetchone()
+        segment = row[0] or 0
+        segment_path = self._segment_path(segment)
+        if segment_path.exists() and segment_path.stat().st_size >= self.segment_size:
+            segment += 1
+            segment_path = self._segment_path(segment)
+        with segment_path.open("ab") as f:
+            offset = f.tell()
+            f.write(data)
+        return segment, offset, len(data)
+
+    def put(self, endpoint: str, params: dict[str, Any], text: str) -> str:
+        """Archive a page.
+
+        Parameters
+        ----------
+        endpoint : str
+            Endpoint relative to `BASE_URL`.
+        params : dict[str, Any]
+            Query parameters.
+        text : str
+            Content of the page.
+
+        Returns
+        -------
+        str
+            SHA-256 of the page.
+        """
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        connection = self.connection
+        if not connection.execute(
+            "SELECT 1 FROM blobs WHERE digest = ?", (digest,)
+        ).fetchone():
+            segment, offset, length = self._write_blob(_compress(data, self.codec))
+            connection.execute(
+                "INSERT INTO blobs VALUES (?, ?, ?, ?, ?)",
+                (digest, segment, offset, length, self.codec),
+            )
+        connection.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+            (
+                archive_key(endpoint, params),
+                endpoint,
+                _encode_params(params),
+                digest,
+                time.time(),
+            ),
+        )
+        connection.commit()
+        return digest
+
+    def read(self, digest: str) -> str:
+        """Read a page by its SHA-256."""
+        row = self.connection.execute(
+            "SELECT segment, offset, length, codec FROM blobs WHERE digest = ?",
+            (digest,),
+        ).fetchone()
+        if row is None:
+            raise ArchiveMissError(digest)
+        segment, offset, length, codec = row
+        with self._segment_path(segment).open("rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        return _decompress(data, codec).decode()
+
+    def read_compressed(self, digest: str) -> tuple[bytes, str]:
+        """Read a page by its SHA-256 without decompressing it.
+
+        Returns
+        -------
+        tuple[bytes, str]
+            Compressed page and its codec.
+        """
+        row = self.connection.execute(
+            "SELECT segment, offset, length, codec FROM blobs WHERE digest = ?",
+            (digest,),
+        ).fetchone()
+        if row is None:
+            raise ArchiveMissError(digest)
+        segment, offset, length, codec = row
+        with self._segment_path(segment).open("rb") as f:
+            f.seek(offset)
+            return f.read(length), codec
+
+    def get(self, endpoint: str, params: dict[str, Any]) -> str | None:
+        """Get the latest archived content of a page, or None if not archived."""
+        row = self.connection.execute(
+            "SELECT digest FROM pages WHERE key = ?", (archive_key(endpoint, params),)
+        ).fetchone()
+        if row is None:
+            return None
+        return self.read(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            is not None
+        )
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def iter_pages(self, endpoint: str | None = None) -> Iterator[ArchivedPage]:
+        """Iterate over the archived pages.
+
+        Parameters
+        ----------
+        endpoint : Optional[str], optional
+            Endpoint to filter by, e.g. "detail" or "result", by default None (all).
+        """
+        query = "SELECT endpoint, params, digest, fetched_at FROM pages"
+        args: tuple[str, ...] = ()
+        if endpoint is not None:
+            query += " WHERE endpoint = ?"
+            args = (endpoint,)
+        for endpoint_, params, digest, fetched_at in self.connection.execute(
+            query + " ORDER BY key", args
+        ).fetchall():
+            yield ArchivedPage(endpoint_, dict(parse_qsl(params)), digest, fetched_at)
@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import json
+import math
+import platform
+import time
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple
+
+from .archive import PageArchive
+from .ja import (
+    ITEMS_PER_PAGE,
+    Details,
+    Parser,
+    SearchParams,
+    UTCourseCatalog,
+    get_parser,
+)
+
+
+class ParserBenchmark(NamedTuple):
+    """Parse throughput of a parser."""
+
+    parser: str
+    pages: int
+    seconds: float
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else float("inf")
+
+
+def is_detail_page(text: str) -> bool:
+    """Whether the page is a page of details rather than search results."""
+    return "catalog-page-detail-lecture-aim" in text
+
+
+def _parse_all(parser: Parser, texts: list[str]) -> list[Any]:
+    results: list[Any] = []
+    for text in texts:
+        try:
+            if is_detail_page(text):
+                results.append(parser.parse_detail(text))
+            else:
+                results.append(parser.parse_search(text))
+        except Exception as e:
+            results.append(type(e))
+    return results
+
+
+def compare_parsers(
+    texts: Iterable[str],
+    parsers: Iterable[str | Parser] = ("html.parser", "lxml"),
+    *,
+    repeat: int = 1,
+) -> list[ParserBenchmark]:
+    """Parse saved pages with each parser, check that the results are identical
+    and measure the throughput.
+
+    Parameters
+    ----------
+    texts : Iterable[str]
+        HTML of search and detail pages.
+    parsers : Iterable[Union[str, Parser]], optional
+        Parsers to compare, by default ("html.parser", "lxml").
+        The first one is the reference.
+    repeat : int, optional
+        Number of times to parse each page, by default 1
+
+    Returns
+    -------
+    list[ParserBenchmark]
+        Throughput of each parser.
+
+    Raises
+    ------
+    ValueError
+        Raises when a parser produces a different result from the reference.
+    """
+    texts = list(texts)
+    benchmarks = []
+    reference: list[Any] | None = None
+    reference_name = ""
+    for parser in map(get_parser, parsers):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = _parse_all(parser, texts)
+        seconds = time.perf_counter() - start
+        if reference is None:
+            reference, reference_name = results, parser.name
+        else:
+            for i, (expected, actual) in enumerate(zip(reference, results)):
+                if expected != actual:
+                    raise ValueError(
+                        f"{parser.name} differs from {reference_name} on page {i}: "
+                        f"{actual} != {expected}"
+                    )
+        benchmarks.append(ParserBenchmark(parser.name, len(texts) * repeat, seconds))
+    return benchmarks
+
+
+def compare_parsers_on_files(
+    paths: Iterable[str | Path],
+    parsers: Iterable[str | Parser] = ("html.parser", "lxml"),
+    *,
+    repeat: int = 1,
+) -> list[ParserBenchmark]:
+    """`compare_parsers` on saved HTML files."""
+    texts = [Path(path).read_text(encoding="utf-8") for path in paths]
+    return compare_parsers(texts, parsers, repeat=repeat)
+
+
+class BenchmarkResult(NamedTuple):
+    """Throughput of a benchmark of the suite."""
+
+    name: str
+    count: int
+    """Number of pages, courses or rows processed."""
+    seconds: float
+    unit: str
+
+    @property
+    def value(self) -> float:
+        """Throughput in `unit`. Higher is better."""
+        return self.count / self.seconds if self.seconds else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.value:.1f} {self.unit} "
+            f"({self.count} in {self.seconds:.3f}s)"
+        )
+
+
+class Regression(NamedTuple):
+    """Benchmark which became slower than the baseline."""
+
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        """Relative change of the throughput, negative for a slowdown."""
+        return self.current / self.baseline - 1
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.baseline:.1f} -> {self.current:.1f} "
+            f"({self.change:+.1%})"
+        )
+
+
+@dataclass
+class BenchmarkReport:
+    """Results of `run_benchmarks`, stored as JSON to compare versions."""
+
+    results: list[BenchmarkResult] = field(default_factory=list)
+    environment: dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "environment": self.environment,
+            "results": [
+                {**result._asdict(), "value": result.value} for result in self.results
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> BenchmarkReport:
+        return cls(
+            results=[
+                BenchmarkResult(x["name"], x["count"], x["seconds"], x["unit"])
+                for x in data["results"]
+            ],
+            environment=data.get("environment", {}),
+        )
+
+    def save(self, path: str | Path) -> None:
+        Path(path).write_text(
+            json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> BenchmarkReport:
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def compare(
+        self, baseline: BenchmarkReport, *, tolerance: float = 0.1
+    ) -> list[Regression]:
+        """Benchmarks whose throughput dropped by more than `tolerance`
+        (relative) from `baseline`. Benchmarks missing from either are ignored."""
+        baseline_values = {result.name: result.value for result in baseline.results}
+        regressions = []
+        for result in self.results:
+            value = baseline_values.get(result.name)
+            if value is not None and result.value < value * (1 - tolerance):
+                regressions.append(Regression(result.name, value, result.value))
+        return regressions
+
+
+def _catalog(base_url: str, parser: str | Parser) -> UTCourseCatalog:
+    """Catalog without caches or rate limits, so that every call hits the server."""
+    return UTCourseCatalog(
+        min_interval=0,
+        adaptive=False,
+        parser=parser,
+        cache=False,
+        code_index=False,
+        base_url=base_url,
+    )
+
+
+async def _best_of(
+    repeat: int, func: Callable[[], Awaitable[int]]
+) -> tuple[int, float]:
+    """Count and seconds of the fastest of `repeat` runs."""
+    best = (0, math.inf)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = await func()
+        seconds = time.perf_counter() - start
+        if seconds < best[1]:
+            best = (count, seconds)
+    return best
+
+
+async def bench_fetch_search(
+    base_url: str,
+    pages: int | Iterable[int],
+    *,
+    parser: str | Parser = "html.parser",
+    repeat: int = 1,
+) -> BenchmarkResult:
+    """Fetch and parse search pages one by one. `pages` is the number of pages
+    from the first one, or the page numbers."""
+    pages = list(range(1, pages + 1) if isinstance(pages, int) else pages)
+
+    async def run() -> int:
+        async with _catalog(base_url, parser) as catalog:
+            for page in pages:
+                await catalog.fetch_search(SearchParams(), page)
+        return len(pages)
+
+    return BenchmarkResult("fetch_search", *await _best_of(repeat, run), "pages/s")
+
+
+async def bench_fetch_detail(
+    base_url: str,
+    codes: Iterable[str],
+    year: int,
+    *,
+    parser: str | Parser = "html.parser",
+    repeat: int = 1,
+) -> BenchmarkResult:
+    """Fetch and parse detail pages one by one."""
+    codes = list(codes)
+
+    async def run() -> int:
+        async with _catalog(base_url, parser) as catalog:
+            for code in codes:
+                await catalog.fetch_detail(code, year)
+        return len(codes)
+
+    return BenchmarkResult("fetch_detail", *await _best_of(repeat, run), "pages/s")
+
+
+async def bench_crawl(
+    base_url: str,
+    year: int,
+    *,
+    parser: str | Parser = "html.parser",
+    repeat: int = 1,
+) -> tuple[BenchmarkResult, list[Details]]:
+    """Crawl all courses with `fetch_search_detail_all`."""
+    details: list[Details] = []
+
+    async def run() -> int:
+        nonlocal details
+        async with _catalog(base_url, parser) as catalog:
+            details = await catalog.fetch_search_detail_all(
+                SearchParams(), year=year, use_tqdm=False
+            )
+        return len(details)
+
+    count, seconds = await _best_of(repeat, run)
+    return BenchmarkResult("crawl", count, seconds, "courses/s"), details
+
+
+def bench_to_perfect_isolated_dataframe(
+    details: list[Details], *, repeat: int = 1
+) -> BenchmarkResult:
+    """Convert details with `analysis.to_perfect_isolated_dataframe`."""
+    from .analysis import to_perfect_isolated_dataframe
+    from .pandas import to_dataframe
+
+    df = to_dataframe(details)
+    seconds = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        to_perfect_isolated_dataframe(df)
+        seconds = min(seconds, time.perf_counter() - start)
+    return BenchmarkResult("to_perfect_isolated_dataframe", len(df), seconds, "rows/s")
+
+
+def recorded_pages(archive: PageArchive) -> tuple[list[int], list[str], int]:
+    """Pages of an archive which the benchmarks can replay.
+
+    Returns
+    -------
+    tuple[list[int], list[str], int]
+        Numbers of the recorded search pages of `SearchParams()`,
+        and the codes of the recorded details of the most recorded year
+        together with that year.
+
+    Raises
+    ------
+    ValueError
+        If the archive has no search page of `SearchParams()` or no details.
+    """
+    search = {"type": SearchParams().課程.value}
+    pages = sorted(
+        int(page.params["page"])
+        for page in archive.iter_pages("result")
+        if set(page.params) == {"type", "page"}
+        and page.params["type"] == search["type"]
+    )
+    details = [page.params for page in archive.iter_pages("detail")]
+    if not pages or not details:
+        raise ValueError(f"{archive.path} has no search results or details to replay")
+    ((year, _),) = Counter(params["year"] for params in details).most_common(1)
+    codes = [params["code"] for params in details if params["year"] == year]
+    return pages, codes, int(year)
+
+
+async def run_benchmarks(
+    *,
+    courses: int = 500,
+    latency: float = 0.005,
+    parser: str = "html.parser",
+    repeat: int = 3,
+    seed: int = 0,
+    archive: PageArchive | str | Path | None = None,
+) -> BenchmarkReport:
+    """Run the benchmark suite against a `StandInServer`.
+
+    Parameters
+    ----------
+    courses : int, optional
+        Number of courses served, by default 500. Ignored if `archive` is specified.
+    latency : float, optional
+        Latency of the server in the crawl benchmark in seconds, by default 0.005.
+        The other benchmarks run without latency to measure the client.
+    parser : str, optional
+        HTML parser backend, by default "html.parser"
+    repeat : int, optional
+        Number of runs of each benchmark, of which the fastest is reported, by default 3
+    seed : int, optional
+        Seed of the generated courses, by default 0
+    archive : Optional[Union[PageArchive, str, Path]], optional
+        Archive of recorded pages to replay instead of generated courses,
+        by default None. The search pages of `SearchParams()` and the details
+        of the most recorded year are fetched (see `recorded_pages`),
+        so that the parsers run on the markup of the real website.
+
+    Returns
+    -------
+    BenchmarkReport
+        Throughput of each benchmark.
+    """
+    from . import __version__
+    from .stand_in import StandInServer
+
+    with ExitStack() as stack:
+        if archive is None:
+            server = StandInServer(courses, seed=seed)
+            pages: list[int] = list(range(1, math.ceil(courses / ITEMS_PER_PAGE) + 1))
+            codes = [course.時間割コード for course in server.courses]
+            year = 2023
+        else:
+            if not isinstance(archive, PageArchive):
+                archive = stack.enter_context(PageArchive(archive))
+            server = StandInServer(archive=archive)
+            pages, codes, year = recorded_pages(archive)
+        report = BenchmarkReport(
+            environment={
+                "version": __version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "parser": parser,
+                "courses": len(codes),
+                "archive": None if archive is None else str(archive.path),
+                "latency": latency,
+                "repeat": repeat,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+            }
+        )
+        async with server:
+            report.results.append(
+                await bench_fetch_search(
+                    server.base_url, pages, parser=parser, repeat=repeat
+                )
+            )
+            report.results.append(
+                await bench_fetch_detail(
+                    server.base_url, codes, year, parser=parser, repeat=repeat
+                )
+            )
+            server.latency = latency
+            result, details = await bench_crawl(
+                server.base_url, year, parser=parser, repeat=repeat
+            )
+            report.results.append(result)
+    report.results.append(bench_to_perfect_isolated_dataframe(details, repeat=repeat))
+    return report
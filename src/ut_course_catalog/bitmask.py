@@ -0,0 +1,138 @@
+"""Bitmask encodings of 学期 and 曜限.
+
+学期 is encoded into a uint8 with a bit per `Semester` in the order of the members,
+and 曜限 into a uint64 with the bit `weekday * 8 + period - 1` per slot,
+so that filtering a catalog by semester or timetable slot is a bitwise operation
+over an array of masks instead of set operations per course.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from .common import Semester, Weekday
+
+SEMESTERS = tuple(Semester)
+"""Semesters in the order of their bits."""
+PERIODS_PER_DAY = 8
+"""Number of periods of a day which have a bit. Periods are 1-based."""
+SLOTS_MASK = (1 << len(Weekday) * PERIODS_PER_DAY) - 1
+"""Bits of all the weekday × period slots."""
+UNKNOWN_PERIOD_BIT = 63
+"""Bit set when 曜限 contains None, i.e. a period which could not be parsed.
+It is not a slot, so it never overlaps and never fits in free slots."""
+
+Slot = tuple[Weekday, int]
+Masks = Union[npt.NDArray[np.uint64], Iterable[int]]
+
+
+def encode_semesters(semesters: Iterable[Semester]) -> int:
+    """Bitmask of semesters."""
+    mask = 0
+    for semester in semesters:
+        mask |= 1 << SEMESTERS.index(semester)
+    return mask
+
+
+def decode_semesters(mask: int) -> set[Semester]:
+    """Semesters of a bitmask."""
+    return {s for i, s in enumerate(SEMESTERS) if int(mask) >> i & 1}
+
+
+def slot_bit(weekday: Weekday | int, period: int) -> int:
+    """Bitmask of a single slot.
+
+    Raises
+    ------
+    ValueError
+        If the weekday or the period is out of range.
+    """
+    if not 0 <= weekday < len(Weekday):
+        raise ValueError(f"Weekday {weekday} is out of range")
+    if not 1 <= period <= PERIODS_PER_DAY:
+        raise ValueError(f"Period {period} is out of range")
+    return 1 << (int(weekday) * PERIODS_PER_DAY + period - 1)
+
+
+def encode_periods(periods: Iterable[Slot | None]) -> int:
+    """Bitmask of slots. None sets `UNKNOWN_PERIOD_BIT`."""
+    mask = 0
+    for period in periods:
+        if period is None:
+            mask |= 1 << UNKNOWN_PERIOD_BIT
+        else:
+            mask |= slot_bit(*period)
+    return mask
+
+
+def decode_periods(mask: int) -> set[Slot | None]:
+    """Slots of a bitmask, with None if `UNKNOWN_PERIOD_BIT` is set."""
+    mask = int(mask)
+    result: set[Slot | None] = set()
+    if mask >> UNKNOWN_PERIOD_BIT & 1:
+        result.add(None)
+    mask &= SLOTS_MASK
+    while mask:
+        bit = (mask & -mask).bit_length() - 1
+        result.add((Weekday(bit // PERIODS_PER_DAY), bit % PERIODS_PER_DAY + 1))
+        mask &= mask - 1
+    return result
+
+
+def encode_semesters_array(
+    semesters: Iterable[Iterable[Semester]],
+) -> npt.NDArray[np.uint8]:
+    """Array of bitmasks of the 学期 of many courses."""
+    return np.fromiter((encode_semesters(x) for x in semesters), dtype=np.uint8)
+
+
+def encode_periods_array(
+    periods: Iterable[Iterable[Slot | None]],
+) -> npt.NDArray[np.uint64]:
+    """Array of bitmasks of the 曜限 of many courses."""
+    return np.fromiter((encode_periods(x) for x in periods), dtype=np.uint64)
+
+
+def _asarray(masks: Masks, dtype: type[np.unsignedinteger] = np.uint64) -> np.ndarray:
+    if isinstance(masks, np.ndarray):
+        return masks.astype(dtype, copy=False)
+    return np.fromiter(masks, dtype=dtype)
+
+
+def has_semester(
+    masks: npt.NDArray[np.uint8] | Iterable[int], semesters: Iterable[Semester]
+) -> npt.NDArray[np.bool_]:
+    """Whether each course is held in any of the semesters."""
+    return _asarray(masks, np.uint8) & np.uint8(encode_semesters(semesters)) != 0
+
+
+def occupies(
+    masks: Masks, weekday: Weekday | int, period: int
+) -> npt.NDArray[np.bool_]:
+    """Whether each course occupies the slot."""
+    return _asarray(masks) & np.uint64(slot_bit(weekday, period)) != 0
+
+
+def overlaps(masks: Masks, other: int) -> npt.NDArray[np.bool_]:
+    """Whether each course shares a slot with the bitmask `other`,
+    e.g. the slots of a timetable or of another course."""
+    return _asarray(masks) & np.uint64(int(other) & SLOTS_MASK) != 0
+
+
+def fits(masks: Masks, free: int) -> npt.NDArray[np.bool_]:
+    """Whether all the slots of each course are in the bitmask `free`.
+
+    Courses without slots, e.g. intensive courses, always fit,
+    and courses with a period which could not be parsed never fit.
+    """
+    return _asarray(masks) & np.uint64(~(int(free) & SLOTS_MASK) & (1 << 64) - 1) == 0
+
+
+def slot_matrix(masks: Masks) -> npt.NDArray[np.bool_]:
+    """Boolean array of shape (courses, weekdays, periods) of the occupied slots.
+    Summing over the first axis counts the courses of each slot."""
+    shifts = np.arange(len(Weekday) * PERIODS_PER_DAY, dtype=np.uint64)
+    bits = _asarray(masks)[:, None] >> shifts & np.uint64(1)
+    return bits.astype(np.bool_).reshape(-1, len(Weekday), PERIODS_PER_DAY)
@@ -1,9 +1,30 @@
+from __future__ import annotations
+
 import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
 from datetime import datetime, timedelta
+from functools import partial, wraps
+from pathlib import Path
+from typing import Any, AsyncContextManager, Callable, ContextManager
 
 import click
 
 import ut_course_catalog.ja as utcc
+from ut_course_catalog.dead_letter import DEFAULT_DEAD_LETTER_PATH, DeadLetterStore
+from ut_course_catalog.journal import CrawlJournal
+from ut_course_catalog.metrics import (
+    JSONFormatter,
+    JSONLinesSink,
+    Metrics,
+    MetricsSink,
+    PrometheusTextSink,
+    reporting,
+)
+from ut_course_catalog.profiling import Profiler
+from ut_course_catalog.response_cache import ResponseCache
+from ut_course_catalog.retry_policy import RetryBudget, RetryPolicy
+from ut_course_catalog.transport import TransportConfig
 
 
 @click.group()
@@ -11,6 +32,206 @@ def cli() -> None:
     pass
 
 
+def _transport_options(func: Callable[..., None]) -> Callable[..., None]:
+    """Add the options of `TransportConfig`, passed to `func` as `transport`."""
+
+    @wraps(func)
+    def wrapper(
+        *args: Any,
+        connections: int,
+        connections_per_host: int,
+        keepalive: float,
+        dns_cache_ttl: float,
+        timeout: float,
+        connect_timeout: float,
+        compress: bool,
+        **kwargs: Any,
+    ) -> None:
+        transport = TransportConfig(
+            limit=connections,
+            limit_per_host=connections_per_host,
+            keepalive_timeout=keepalive or None,
+            ttl_dns_cache=dns_cache_ttl,
+            total_timeout=timeout or None,
+            connect_timeout=connect_timeout or None,
+            accept_encoding=None if compress else "identity",
+        )
+        return func(*args, transport=transport, **kwargs)
+
+    for option in reversed(
+        [
+            click.option(
+                "--connections",
+                default=100,
+                help="Maximum number of connections. 0 for no limit.",
+            ),
+            click.option(
+                "--connections-per-host",
+                default=16,
+                help="Maximum number of connections to the host. 0 for no limit.",
+            ),
+            click.option(
+                "--keepalive",
+                default=15.0,
+                help="Seconds to keep idle connections open. "
+                "0 to close them after each request.",
+            ),
+            click.option(
+                "--dns-cache-ttl", default=10.0, help="Seconds to cache DNS entries."
+            ),
+            click.option(
+                "--timeout",
+                default=300.0,
+                help="Seconds for a whole request. 0 for no limit.",
+            ),
+            click.option(
+                "--connect-timeout",
+                default=0.0,
+                help="Seconds to connect. 0 for no limit.",
+            ),
+            click.option(
+                "--compress/--no-compress",
+                default=True,
+                help="Accept compressed responses.",
+            ),
+        ]
+    ):
+        wrapper = option(wrapper)
+    return wrapper
+
+
+def _retry_options(func: Callable[..., None]) -> Callable[..., None]:
+    """Add the options of `RetryPolicy`, passed to `func` as `retry_policy`."""
+
+    @wraps(func)
+    def wrapper(
+        *args: Any,
+        max_attempts: int,
+        retry_budget: float,
+        circuit_breaker: bool,
+        **kwargs: Any,
+    ) -> None:
+        retry_policy = RetryPolicy(
+            max_attempts=max_attempts,
+            budget=RetryBudget(ratio=retry_budget),
+            breaker=circuit_breaker,
+        )
+        return func(*args, retry_policy=retry_policy, **kwargs)
+
+    for option in reversed(
+        [
+            click.option(
+                "--max-attempts", default=3, help="Maximum number of attempts."
+            ),
+            click.option(
+                "--retry-budget",
+                default=0.1,
+                help="Retries allowed per successful request.",
+            ),
+            click.option(
+                "--circuit-breaker/--no-circuit-breaker",
+                default=True,
+                help="Pause all requests when the error rate spikes.",
+            ),
+        ]
+    ):
+        wrapper = option(wrapper)
+    return wrapper
+
+
+def _profile_option(func: Callable[..., None]) -> Callable[..., None]:
+    """Add --profile, passed to `func` as `profiler`, which is None if not specified."""
+
+    @wraps(func)
+    def wrapper(*args: Any, profile: str | None, **kwargs: Any) -> None:
+        if profile is None:
+            return func(*args, profiler=None, **kwargs)
+        with Profiler(profile) as profiler:
+            func(*args, profiler=profiler, **kwargs)
+        click.echo(profiler.summary(top=0))
+        click.echo(f"Profile written to {profiler.directory}")
+
+    return click.option(
+        "--profile",
+        type=click.Path(file_okay=False),
+        default=None,
+        help="Write a CPU profile, memory snapshots and the event loop lag "
+        "of each stage to this directory.",
+    )(wrapper)
+
+
+def _metrics_options(func: Callable[..., None]) -> Callable[..., None]:
+    """Add the options of the metrics, passed to `func` as `metrics` and
+    `report`, which returns a context manager to run the crawl in."""
+
+    @wraps(func)
+    def wrapper(
+        *args: Any,
+        metrics_jsonl: str | None,
+        metrics_prom: str | None,
+        metrics_port: int | None,
+        metrics_interval: float,
+        log_json: bool,
+        **kwargs: Any,
+    ) -> None:
+        sinks: list[MetricsSink] = []
+        if metrics_jsonl is not None:
+            sinks.append(JSONLinesSink(metrics_jsonl))
+        if metrics_prom is not None:
+            sinks.append(PrometheusTextSink(metrics_prom))
+        if log_json:
+            import logging
+
+            handler = logging.StreamHandler()
+            handler.setFormatter(JSONFormatter())
+            logger = logging.getLogger("ut_course_catalog")
+            logger.addHandler(handler)
+            logger.setLevel(logging.DEBUG)
+        metrics = Metrics(sinks)
+        report = partial(
+            reporting, metrics, interval=metrics_interval, port=metrics_port
+        )
+        try:
+            return func(*args, metrics=metrics, report=report, **kwargs)
+        finally:
+            metrics.close()
+
+    for option in reversed(
+        [
+            click.option(
+                "--metrics-jsonl",
+                type=click.Path(dir_okay=False),
+                default=None,
+                help="Append the metrics to this file as JSON lines.",
+            ),
+            click.option(
+                "--metrics-prom",
+                type=click.Path(dir_okay=False),
+                default=None,
+                help="Write the metrics to this file in the Prometheus text format.",
+            ),
+            click.option(
+                "--metrics-port",
+                type=int,
+                default=None,
+                help="Serve the metrics at http://127.0.0.1:PORT/metrics.",
+            ),
+            click.option(
+                "--metrics-interval",
+                default=10.0,
+                help="Seconds between writes of the metrics.",
+            ),
+            click.option(
+                "--log-json",
+                is_flag=True,
+                help="Log every request and failure as JSON to stderr.",
+            ),
+        ]
+    ):
+        wrapper = option(wrapper)
+    return wrapper
+
+
 @cli.command()
 @click.option(
     "-m",
@@ -18,32 +239,799 @@ def cli() -> None:
     default=0.5,
     help="Minimum interval between calls in seconds.",
 )
-def download(min_interval: float) -> None:
-    """Download the entire course catalog."""
-    asyncio.run(_download(min_interval))
+@click.option(
+    "-b",
+    "--burst",
+    default=1,
+    help="Number of calls which can be made without waiting.",
+)
+@click.option(
+    "--adaptive/--no-adaptive",
+    default=True,
+    help="Slow down on 429 / 5xx or slow responses.",
+)
+@click.option(
+    "--shared-rate-limit",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File to share the rate limit with the other processes on this machine.",
+)
+@click.option(
+    "-p",
+    "--parser",
+    type=click.Choice(["html.parser", "lxml"]),
+    default="html.parser",
+    help="HTML parser backend.",
+)
+@click.option(
+    "-w",
+    "--parse-workers",
+    default=0,
+    help="Number of workers to parse pages in. 0 to parse in the event loop.",
+)
+@click.option(
+    "--parse-executor",
+    type=click.Choice(["process", "thread"]),
+    default="process",
+    help="Kind of workers to parse pages in.",
+)
+@click.option(
+    "-r",
+    "--resume",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Journal of an interrupted download to resume.",
+)
+@click.option(
+    "-i",
+    "--incremental",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Previous snapshot (or download) to refetch only the changed courses of.",
+)
+@click.option(
+    "-a",
+    "--archive",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory of an archive to write the raw pages to.",
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    help="Read all pages from --archive without accessing the network.",
+)
+@click.option(
+    "--dead-letters",
+    type=click.Path(dir_okay=False),
+    default=DEFAULT_DEAD_LETTER_PATH,
+    help="Record the pages and courses which could not be fetched to this "
+    "SQLite file for `utcc redrive`.",
+)
+@click.option(
+    "--parsed-cache/--no-parsed-cache",
+    default=True,
+    help="Cache parsed pages so that unchanged pages are not parsed again.",
+)
+@click.option(
+    "--code-index/--no-code-index",
+    default=True,
+    help="Record 時間割コード and 共通科目コード of every course to an index "
+    "in ~/.cache/ut_course_catalog.",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Serve responses from the cache if they are fresh enough.",
+)
+@click.option(
+    "--search-ttl",
+    default=24.0,
+    help="Hours after which cached search pages expire.",
+)
+@click.option(
+    "--detail-ttl",
+    default=24.0 * 7,
+    help="Hours after which cached detail pages expire.",
+)
+@click.option(
+    "--cache-size",
+    default=256,
+    help="Maximum size of the cache in MiB.",
+)
+@click.option(
+    "-y",
+    "--years",
+    default=None,
+    help="Years to download, e.g. 2021-2023 or 2021,2023. "
+    "By default the current fiscal year.",
+)
+@click.option(
+    "--base-url",
+    default=utcc.BASE_URL,
+    help="URL of the website, e.g. of `utcc stand-in`.",
+)
+@_transport_options
+@_retry_options
+@_metrics_options
+@_profile_option
+def download(
+    min_interval: float,
+    burst: int,
+    adaptive: bool,
+    shared_rate_limit: str | None,
+    parser: str,
+    parse_workers: int,
+    parse_executor: str,
+    resume: str | None,
+    incremental: str | None,
+    archive: str | None,
+    offline: bool,
+    dead_letters: str,
+    parsed_cache: bool,
+    code_index: bool,
+    cache: bool,
+    search_ttl: float,
+    detail_ttl: float,
+    cache_size: int,
+    years: str | None,
+    base_url: str,
+    transport: TransportConfig,
+    retry_policy: RetryPolicy,
+    metrics: Metrics,
+    report: Callable[[], AsyncContextManager[Metrics]],
+    profiler: Profiler | None,
+) -> None:
+    """Download the entire course catalog.
+    Progress is recorded to a journal which can be passed to --resume."""
+    catalog_kwargs: dict[str, Any] = dict(
+        min_interval=timedelta(seconds=min_interval),
+        burst=burst,
+        adaptive=adaptive,
+        shared_rate_limit=shared_rate_limit,
+        parser=parser,
+        archive=archive,
+        offline=offline,
+        transport=transport,
+        base_url=base_url,
+        retry_policy=retry_policy,
+        dead_letters=dead_letters,
+        code_index=code_index,
+        metrics=metrics,
+        profiler=profiler,
+        parsed_cache="~/.cache/ut_course_catalog/parsed.sqlite"
+        if parsed_cache
+        else None,
+    )
+    if offline and archive is None:
+        raise click.UsageError("--offline requires --archive")
+    if incremental is not None and resume is not None:
+        raise click.UsageError("--resume cannot be used with --incremental")
+    if incremental is not None and years is not None:
+        raise click.UsageError("--years cannot be used with --incremental")
+    year = None if years is None else _parse_years(years)
+    response_cache = None
+    with ExitStack() as stack:
+        if cache:
+            response_cache = stack.enter_context(
+                ResponseCache(
+                    search_ttl=timedelta(hours=search_ttl),
+                    detail_ttl=timedelta(hours=detail_ttl),
+                    max_bytes=cache_size * 1024 * 1024,
+                )
+            )
+        catalog_kwargs["cache"] = False if response_cache is None else response_cache
+        if parse_workers > 0:
+            executor_class = (
+                ProcessPoolExecutor
+                if parse_executor == "process"
+                else ThreadPoolExecutor
+            )
+            catalog_kwargs["executor"] = stack.enter_context(
+                executor_class(max_workers=parse_workers)
+            )
+        if incremental is not None:
+            asyncio.run(_download_incremental(catalog_kwargs, incremental, report))
+        else:
+            asyncio.run(_download(catalog_kwargs, resume, year, report))
+    if response_cache is not None:
+        click.echo(f"Cache: {response_cache.stats}")
 
 
 @cli.command()
 @click.argument("name", type=str)
-def convert(name: str) -> None:
+@_profile_option
+def convert(name: str, profiler: Profiler | None) -> None:
     import pickle  # nosec
-    from pathlib import Path
 
     from ut_course_catalog.analysis import to_perfect_isolated_dataframe
 
+    def stage(name: str) -> ContextManager[None]:
+        return nullcontext() if profiler is None else profiler.stage(name)
+
     path = Path(name)
-    with path.open("rb") as f:
+    with stage("load"), path.open("rb") as f:
         df = pickle.load(f)  # nosec
+    with stage("convert"):
         df = to_perfect_isolated_dataframe(df)
+    with stage("save"):
         df.to_csv(path.with_suffix(".csv"))
 
 
-async def _download(min_interval: float) -> None:
+@cli.command("bench-parsers")
+@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-p",
+    "--parser",
+    "parsers",
+    multiple=True,
+    default=["html.parser", "lxml"],
+    help="Parsers to compare. The first one is the reference.",
+)
+@click.option("-n", "--repeat", default=1, help="Number of times to parse each page.")
+def bench_parsers(
+    files: tuple[str, ...], parsers: tuple[str, ...], repeat: int
+) -> None:
+    """Compare the parse throughput of parsers on saved HTML pages."""
+    from ut_course_catalog.benchmark import compare_parsers_on_files
+
+    for benchmark in compare_parsers_on_files(files, parsers, repeat=repeat):
+        click.echo(
+            f"{benchmark.parser}: {benchmark.pages_per_second:.1f} pages/s "
+            f"({benchmark.pages} pages in {benchmark.seconds:.3f}s)"
+        )
+
+
+@cli.command()
+@click.argument("archive", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "-y", "--year", type=int, default=None, help="Year of the courses to parse."
+)
+@click.option(
+    "-p",
+    "--parser",
+    type=click.Choice(["html.parser", "lxml"]),
+    default="html.parser",
+    help="HTML parser backend.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes. 0 to parse in this process.",
+)
+@click.option(
+    "-c", "--chunk-size", default=64, help="Number of pages sent to a worker at once."
+)
+def reparse(
+    archive: str, year: int | None, parser: str, workers: int | None, chunk_size: int
+) -> None:
+    """Parse the pages in an archive again without accessing the network."""
+    import pickle  # nosec
+
+    from ut_course_catalog.archive import PageArchive
+    from ut_course_catalog.reparse import reparse_archive
+
+    with PageArchive(archive) as page_archive:
+        try:
+            result = reparse_archive(
+                page_archive,
+                year=year,
+                parser=parser,
+                workers=workers,
+                chunk_size=chunk_size,
+            )
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="ARCHIVE") from e
+    t = datetime.now().strftime("%Y%m%d%H%M%S")
+    result.snapshot.save(f"all_{t}.snapshot.pkl")
+    with open(f"all_{t}.pkl", "wb") as f:
+        pickle.dump(result.snapshot.to_list(), f)
+    for error in result.errors:
+        click.echo(f"Failed to parse {error.page.params}: {error.error}", err=True)
+    click.echo(
+        f"{len(result.snapshot.details)} courses in {result.snapshot.year}, "
+        f"{len(result.errors)} errors: {result.pages_per_second:.1f} pages/s "
+        f"({result.pages} pages in {result.seconds:.3f}s)"
+    )
+
+
+@cli.command("plan-shards")
+@click.option(
+    "-m", "--min-interval", default=0.5, help="Minimum interval between calls."
+)
+@click.option(
+    "-n", "--max-items", default=500, help="Number of items above which to split."
+)
+@click.option(
+    "-w", "--workers", default=1, help="Number of workers to assign the shards to."
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    default="shards.pkl",
+    help="File to save the plan to.",
+)
+def plan_shards(min_interval: float, max_items: int, workers: int, output: str) -> None:
+    """Split the entire course catalog into shards."""
+    import pickle  # nosec
+
+    from ut_course_catalog import sharding
+
+    async def plan() -> sharding.ShardPlan:
+        async with utcc.UTCourseCatalog(min_interval=min_interval) as catalog:
+            return await sharding.plan_shards(catalog, max_items=max_items)
+
+    shard_plan = asyncio.run(plan())
+    with open(output, "wb") as f:
+        pickle.dump(shard_plan, f)
+    for i, shards in enumerate(shard_plan.assign(workers)):
+        click.echo(f"Worker {i}: {sum(shard.pages for shard in shards)} pages")
+        for shard in shards:
+            click.echo(f"  {shard.total_items_count:6d} items: {shard.params}")
+    click.echo(
+        f"{len(shard_plan.shards)} shards covering {shard_plan.covered_items_count} "
+        f"of {shard_plan.total_items_count} items, {shard_plan.probes} probes"
+    )
+    if not shard_plan.disjoint:
+        click.echo(
+            "The shards may overlap or miss courses, "
+            "check the coverage of the crawled shards",
+            err=True,
+        )
+    elif not shard_plan.exact:
+        click.echo("The shards do not add up to the catalog", err=True)
+
+
+@cli.command()
+@click.argument("queue", type=click.Path(dir_okay=False))
+@click.option(
+    "-y",
+    "--years",
+    default=None,
+    help="Years to download, e.g. 2021-2023 or 2021,2023. "
+    "By default the current fiscal year.",
+)
+@click.option(
+    "-s",
+    "--shards",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Plan of plan-shards to enqueue each shard of.",
+)
+@click.option("--retry-failed", is_flag=True, help="Enqueue the failed jobs again.")
+def enqueue(
+    queue: str, years: str | None, shards: str | None, retry_failed: bool
+) -> None:
+    """Enqueue a crawl of the entire course catalog for `utcc worker`."""
+    import pickle  # nosec
+
+    from ut_course_catalog.work_queue import WorkQueue, enqueue_crawl
+
+    year = utcc.current_fiscal_year() if years is None else _parse_years(years)
+    params: Any = utcc.SearchParams()
+    if shards is not None:
+        with open(shards, "rb") as f:
+            params = pickle.load(f)  # nosec
+    with WorkQueue(queue) as work_queue:
+        count = enqueue_crawl(
+            work_queue, params, [year] if isinstance(year, int) else year
+        )
+        if retry_failed:
+            count += work_queue.retry_failed()
+        click.echo(f"{count} jobs enqueued: {work_queue.counts()}")
+
+
+@cli.command()
+@click.argument("queue", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-m",
+    "--min-interval",
+    default=0.5,
+    help="Minimum interval between calls of all the workers in seconds.",
+)
+@click.option(
+    "--adaptive/--no-adaptive",
+    default=True,
+    help="Slow down on 429 / 5xx or slow responses.",
+)
+@click.option(
+    "-p",
+    "--parser",
+    type=click.Choice(["html.parser", "lxml"]),
+    default="html.parser",
+    help="HTML parser backend.",
+)
+@click.option("-c", "--concurrency", default=8, help="Number of jobs in progress.")
+@click.option("-l", "--lease", default=300.0, help="Seconds for which a job is leased.")
+@click.option("-n", "--name", default=None, help="Name of the worker.")
+@click.option(
+    "--wait/--exit",
+    default=False,
+    help="Keep polling or exit when the queue is drained.",
+)
+@_transport_options
+@_metrics_options
+@_profile_option
+def worker(
+    queue: str,
+    min_interval: float,
+    adaptive: bool,
+    parser: str,
+    concurrency: int,
+    lease: float,
+    name: str | None,
+    wait: bool,
+    transport: TransportConfig,
+    metrics: Metrics,
+    report: Callable[[], AsyncContextManager[Metrics]],
+    profiler: Profiler | None,
+) -> None:
+    """Run jobs of a queue filled by `utcc enqueue`.
+    Several workers on the same machine can share the queue.
+    Keep the queue on a local disk: SQLite in WAL mode is not safe
+    over a network filesystem."""
+    from ut_course_catalog.work_queue import QueueRateLimitter, WorkQueue, run_worker
+
+    async def run(work_queue: WorkQueue) -> None:
+        rate_limitter = QueueRateLimitter(
+            work_queue, timedelta(seconds=min_interval), adaptive=adaptive
+        )
+        async with report(), utcc.UTCourseCatalog(
+            rate_limitter=rate_limitter,
+            parser=parser,
+            transport=transport,
+            metrics=metrics,
+            profiler=profiler,
+        ) as catalog:
+            stats = await run_worker(
+                catalog, work_queue, name=name, concurrency=concurrency, wait=wait
+            )
+        click.echo(f"Jobs: {stats}")
+        click.echo(f"Transport: {catalog.transport_stats}")
+
+    with WorkQueue(queue, lease=lease) as work_queue:
+        asyncio.run(run(work_queue))
+
+
+@cli.command()
+@click.argument("queue", type=click.Path(exists=True, dir_okay=False))
+def collect(queue: str) -> None:
+    """Save the details fetched by `utcc worker`."""
+    import pickle  # nosec
+
+    from ut_course_catalog.pandas import to_dataframe_by_year
+    from ut_course_catalog.work_queue import WorkQueue, collect_details
+
+    with WorkQueue(queue) as work_queue:
+        counts = work_queue.counts()
+        for kind, key, error in work_queue.failures():
+            click.echo(f"Failed {kind} {key}: {error}", err=True)
+        result = collect_details(work_queue)
+    t = datetime.now().strftime("%Y%m%d%H%M%S")
+    with open(f"all_{t}.pkl", "wb") as f:
+        pickle.dump(result, f)
+    to_dataframe_by_year(result).to_pickle(f"all_{t}.pandas.pkl")
+    click.echo(
+        ", ".join(f"{len(details)} courses in {y}" for y, details in result.items())
+    )
+    if counts["pending"] or counts["leased"]:
+        click.echo(f"The queue is not drained: {counts}", err=True)
+
+
+@cli.command()
+@click.argument("snapshot", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-m",
+    "--min-interval",
+    default=1.0,
+    help="Minimum interval between calls in seconds.",
+)
+@click.option(
+    "--dead-letters",
+    type=click.Path(exists=True, dir_okay=False),
+    default=str(Path(DEFAULT_DEAD_LETTER_PATH).expanduser()),
+    help="Dead letters recorded by `utcc download`.",
+)
+@click.option(
+    "-y",
+    "--year",
+    type=int,
+    default=None,
+    help="Year of the courses if SNAPSHOT is a list of details, "
+    "by default the current fiscal year, or the year to redrive if it is "
+    "a multi-year download, by default its only year.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File to save the merged snapshot to. By default SNAPSHOT.",
+)
+@click.option(
+    "--base-url",
+    default=utcc.BASE_URL,
+    help="URL of the website, e.g. of `utcc stand-in`.",
+)
+def redrive(
+    snapshot: str,
+    min_interval: float,
+    dead_letters: str,
+    year: int | None,
+    output: str | None,
+    base_url: str,
+) -> None:
+    """Fetch the pages and courses which could not be fetched again
+    and merge them into SNAPSHOT, a snapshot, a pickled list of details
+    or the details by year of a multi-year download."""
+    import pickle  # nosec
+
+    from ut_course_catalog.snapshot import Delta, Snapshot
+
+    with open(snapshot, "rb") as f:
+        obj = pickle.load(f)  # nosec
+    try:
+        previous = Snapshot.from_pickled(obj, year)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--year") from e
+
+    async def run(store: DeadLetterStore) -> Delta:
+        async with utcc.UTCourseCatalog(
+            min_interval=timedelta(seconds=min_interval),
+            dead_letters=store,
+            base_url=base_url,
+        ) as catalog:
+            return await catalog.redrive(previous)
+
+    with DeadLetterStore(dead_letters) as store:
+        delta = asyncio.run(run(store))
+        click.echo(f"{len(store)} pages or courses still could not be fetched")
+    output = output or snapshot
+    if isinstance(obj, Snapshot):
+        previous.save(output)
+    else:
+        if isinstance(obj, dict):
+            # a multi-year download, only the year redriven is replaced
+            obj[previous.year] = previous.to_list()
+        else:
+            obj = previous.to_list()
+        with open(output, "wb") as f:
+            pickle.dump(obj, f)
+    click.echo(f"{len(delta.added)} added, {len(delta.changed)} changed")
+
+
+@cli.command()
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    default="benchmark.json",
+    help="File to save the results to.",
+)
+@click.option("-n", "--courses", default=500, help="Number of courses served.")
+@click.option(
+    "-a",
+    "--archive",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Archive of recorded pages to replay instead of generated courses.",
+)
+@click.option(
+    "-l", "--latency", default=0.005, help="Latency of the server in the crawl."
+)
+@click.option(
+    "-p",
+    "--parser",
+    type=click.Choice(["html.parser", "lxml"]),
+    default="html.parser",
+    help="HTML parser backend.",
+)
+@click.option("-r", "--repeat", default=3, help="Number of runs of each benchmark.")
+@click.option(
+    "-c",
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Results of a previous version to compare with.",
+)
+@click.option(
+    "-t",
+    "--tolerance",
+    default=0.1,
+    help="Relative slowdown reported as a regression.",
+)
+def bench(
+    output: str,
+    courses: int,
+    archive: str | None,
+    latency: float,
+    parser: str,
+    repeat: int,
+    compare: str | None,
+    tolerance: float,
+) -> None:
+    """Benchmark fetching, parsing and converting against a local stand-in server."""
+    from ut_course_catalog.benchmark import BenchmarkReport, run_benchmarks
+
+    report = asyncio.run(
+        run_benchmarks(
+            courses=courses,
+            archive=archive,
+            latency=latency,
+            parser=parser,
+            repeat=repeat,
+        )
+    )
+    report.save(output)
+    for result in report.results:
+        click.echo(str(result))
+    if compare is None:
+        return
+    regressions = report.compare(BenchmarkReport.load(compare), tolerance=tolerance)
+    for regression in regressions:
+        click.echo(f"Regression in {regression}", err=True)
+    if regressions:
+        raise SystemExit(1)
+
+
+@cli.command("stand-in")
+@click.option("--host", default="127.0.0.1", help="Host to listen on.")
+@click.option("--port", default=8080, help="Port to listen on.")
+@click.option("-n", "--courses", default=1000, help="Number of courses to generate.")
+@click.option(
+    "-a",
+    "--archive",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Archive to replay instead of generated courses.",
+)
+@click.option("-l", "--latency", default=0.0, help="Seconds before each response.")
+@click.option("-j", "--jitter", default=0.0, help="Maximum random extra latency.")
+@click.option("-e", "--error-rate", default=0.0, help="Probability of a 503.")
+def stand_in(
+    host: str,
+    port: int,
+    courses: int,
+    archive: str | None,
+    latency: float,
+    jitter: float,
+    error_rate: float,
+) -> None:
+    """Serve a local stand-in for the catalog website."""
+    from ut_course_catalog.archive import PageArchive
+    from ut_course_catalog.stand_in import StandInServer
+
+    async def serve() -> None:
+        with ExitStack() as stack:
+            server = StandInServer(
+                courses,
+                archive=None
+                if archive is None
+                else stack.enter_context(PageArchive(archive)),
+                latency=latency,
+                jitter=jitter,
+                error_rate=error_rate,
+                host=host,
+                port=port,
+            )
+            async with server:
+                click.echo(f"Serving on {server.base_url}")
+                await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def _parse_years(text: str) -> int | tuple[int, ...]:
+    """Parse years like "2021-2023,2025". A single year is returned as an int."""
+    years: list[int] = []
+    try:
+        for part in text.split(","):
+            first, _, last = part.partition("-")
+            years.extend(range(int(first), int(last or first) + 1))
+    except ValueError as e:
+        raise click.BadParameter(f"invalid years: {text}") from e
+    if not years:
+        raise click.BadParameter(f"invalid years: {text}")
+    return years[0] if len(years) == 1 else tuple(dict.fromkeys(years))
+
+
+async def _download(
+    catalog_kwargs: dict[str, Any],
+    resume: str | None,
+    year: int | tuple[int, ...] | None,
+    report: Callable[[], AsyncContextManager[Metrics]],
+) -> None:
     params = utcc.SearchParams()
-    async with utcc.UTCourseCatalog(
-        min_interval=timedelta(seconds=min_interval)
-    ) as catalog:
+    if resume is None:
         t = datetime.now().strftime("%Y%m%d%H%M%S")
-        await catalog.fetch_and_save_search_detail_all_pandas(
-            params, filename=f"all_{t}.pkl"
+        journal = CrawlJournal(f"all_{t}.journal")
+    else:
+        journal = CrawlJournal(resume).open()
+        if year is not None and journal.year is not None and journal.year != year:
+            journal.close()
+            raise click.UsageError(
+                f"{resume} was recorded in {journal.year}, not in {year}"
+            )
+        params = journal.params or params
+        year = journal.year or year
+    if year is None:
+        year = utcc.current_fiscal_year()
+    click.echo(f"Recording progress to {journal.path}")
+    async with report(), utcc.UTCourseCatalog(**catalog_kwargs) as catalog:
+        if isinstance(year, int):
+            await catalog.fetch_and_save_search_detail_all_pandas(
+                params,
+                year=year,
+                filename=str(journal.path.with_suffix(".pkl")),
+                journal=journal,
+            )
+        else:
+            with journal:
+                journal.start(params, year)
+                async for _ in catalog.iter_search_detail_all_years(
+                    params, years=year, journal=journal
+                ):
+                    pass
+                result = journal.get_details_by_year()
+    click.echo(f"Transport: {catalog.transport_stats}")
+    _echo_dead_letters(catalog)
+    if isinstance(year, int):
+        return
+    import pickle  # nosec
+
+    from ut_course_catalog.pandas import to_dataframe_by_year
+
+    with journal.path.with_suffix(".pkl").open("wb") as f:
+        pickle.dump(result, f)
+    to_dataframe_by_year(result).to_pickle(journal.path.with_suffix(".pandas.pkl"))
+    click.echo(
+        ", ".join(f"{len(details)} courses in {y}" for y, details in result.items())
+    )
+
+
+def _echo_dead_letters(catalog: utcc.UTCourseCatalog) -> None:
+    dead_letters = catalog.dead_letters
+    if dead_letters is None or not len(dead_letters):
+        return
+    click.echo(
+        f"{len(dead_letters)} pages or courses could not be fetched. "
+        f"Run `utcc redrive` to fetch them again ({dead_letters.path})"
+    )
+
+
+async def _download_incremental(
+    catalog_kwargs: dict[str, Any],
+    previous_path: str,
+    report: Callable[[], AsyncContextManager[Metrics]],
+) -> None:
+    import pickle  # nosec
+
+    from ut_course_catalog.snapshot import Snapshot
+
+    params = utcc.SearchParams()
+    try:
+        previous = Snapshot.load(previous_path)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--incremental") from e
+    async with report(), utcc.UTCourseCatalog(**catalog_kwargs) as catalog:
+        snapshot, delta = await catalog.fetch_search_detail_all_incremental(
+            params, previous
         )
+    click.echo(f"Transport: {catalog.transport_stats}")
+    _echo_dead_letters(catalog)
+    t = datetime.now().strftime("%Y%m%d%H%M%S")
+    snapshot.save(f"all_{t}.snapshot.pkl")
+    with open(f"all_{t}.delta.pkl", "wb") as f:
+        pickle.dump(delta, f)
+    with open(f"all_{t}.pkl", "wb") as f:
+        pickle.dump(snapshot.to_list(), f)
+    click.echo(
+        f"{len(delta.added)} added, {len(delta.changed)} changed, "
+        f"{len(delta.removed)} removed"
+    )
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable
+
+from typing_extensions import Self
+
+if TYPE_CHECKING:
+    from .ja import CommonCode, Details, SearchResultItem
+
+DEFAULT_INDEX_PATH = "~/.cache/ut_course_catalog/codes.sqlite"
+
+
+class CodeIndex:
+    """Persistent index between 時間割コード and 共通科目コード.
+
+    The whole index is loaded into dicts on open, so lookups do not touch the disk.
+    A 共通科目コード may have several 時間割コード; the one indexed first is returned,
+    even if its 共通科目コード changed in the meantime.
+    """
+
+    path: Path
+    _connection: sqlite3.Connection | None
+
+    def __init__(
+        self, path: str | Path = DEFAULT_INDEX_PATH, *, commit_every: int = 100
+    ) -> None:
+        """Index between 時間割コード and 共通科目コード.
+
+        Parameters
+        ----------
+        path : Union[str, Path], optional
+            Path to the SQLite database, by default "~/.cache/ut_course_catalog/codes.sqlite".
+            Created if it does not exist.
+        commit_every : int, optional
+            Number of new entries before committing, by default 100.
+            Uncommitted entries are committed on close.
+        """
+        self.path = Path(path).expanduser()
+        self.commit_every = commit_every
+        self._connection = None
+        self._common_codes: dict[str, CommonCode] = {}
+        # 時間割コード of each 共通科目コード in the order of their rowids
+        self._codes: dict[str, list[str]] = {}
+        self._rowids: dict[str, int] = {}
+        self._uncommitted = 0
+
+    def open(self) -> Self:
+        from .ja import CommonCode
+
+        if self._connection is not None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS codes "
+            "(code TEXT PRIMARY KEY, common_code TEXT NOT NULL)"
+        )
+        for rowid, code, common_code in self._connection.execute(
+            "SELECT rowid, code, common_code FROM codes ORDER BY rowid"
+        ):
+            self._common_codes[code] = CommonCode(common_code)
+            self._codes.setdefault(common_code, []).append(code)
+            self._rowids[code] = rowid
+        return self
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+            self._uncommitted = 0
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _open_if_closed(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        assert self._connection is not None  # nosec
+        return self._connection
+
+    def __len__(self) -> int:
+        self._open_if_closed()
+        return len(self._common_codes)
+
+    def add(self, code: str, common_code: str) -> None:
+        """Index a pair of 時間割コード and 共通科目コード."""
+        from .ja import CommonCode
+
+        connection = self._open_if_closed()
+        previous = self._common_codes.get(code)
+        if previous == common_code:
+            return
+        # an update keeps the rowid, which orders the codes of a 共通科目コード
+        cursor = connection.execute(
+            "INSERT INTO codes VALUES (?, ?) "
+            "ON CONFLICT (code) DO UPDATE SET common_code = excluded.common_code",
+            (code, common_code),
+        )
+        self._common_codes[code] = CommonCode(common_code)
+        codes = self._codes.setdefault(common_code, [])
+        codes.append(code)
+        if previous is None:
+            assert cursor.lastrowid is not None  # nosec
+            self._rowids[code] = cursor.lastrowid
+        else:
+            old_codes = self._codes[previous]
+            old_codes.remove(code)
+            if not old_codes:
+                del self._codes[previous]
+            codes.sort(key=self._rowids.__getitem__)
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            connection.commit()
+            self._uncommitted = 0
+
+    def add_all(self, items: Iterable[SearchResultItem | Details]) -> None:
+        """Index search result items or details."""
+        for item in items:
+            self.add(item.時間割コード, item.共通科目コード)
+
+    def get_common_code(self, code: str) -> CommonCode | None:
+        """共通科目コード of a 時間割コード, or None if not indexed."""
+        self._open_if_closed()
+        return self._common_codes.get(code)
+
+    def get_code(self, common_code: str) -> str | None:
+        """時間割コード of a 共通科目コード, or None if not indexed."""
+        self._open_if_closed()
+        codes = self._codes.get(common_code)
+        return codes[0] if codes else None
+
+    def get_common_codes(self, codes: Iterable[str]) -> dict[str, CommonCode]:
+        """共通科目コード of the indexed 時間割コード among `codes`."""
+        self._open_if_closed()
+        return {
+            code: self._common_codes[code]
+            for code in codes
+            if code in self._common_codes
+        }
+
+    def get_codes(self, common_codes: Iterable[str]) -> dict[str, str]:
+        """時間割コード of the indexed 共通科目コード among `common_codes`."""
+        self._open_if_closed()
+        return {
+            common_code: self._codes[common_code][0]
+            for common_code in common_codes
+            if common_code in self._codes
+        }
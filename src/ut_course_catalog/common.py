@@ -1,14 +1,37 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timedelta
+import math
+import os
+import struct
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
 from enum import Enum, IntEnum
-from functools import wraps
-from typing import Any, AsyncIterable, Awaitable, Callable, Coroutine, Iterable, TypeVar
+from functools import partial, wraps
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    TypeVar,
+)
 
 from typing_extensions import ParamSpec
 
 T = TypeVar("T")
+R = TypeVar("R")
+K = TypeVar("K", bound=Hashable)
 BASE_URL = "https://catalog.he.u-tokyo.ac.jp/"
 
 
@@ -48,48 +71,189 @@ WrappedAwaitableFn = Callable[WrappedFnParam, Awaitable[WrappedFnResult]]
 
 
 class RateLimitter:
-    _min_interval: timedelta
-    _last_called: datetime
+    _max_rate: float
+    _rate: float
+    _burst: int
+    _tokens: float
+    _updated: float
+    _waiting: int
+    _lock: asyncio.Lock | None
 
-    def __init__(self, min_interval: timedelta | int):
-        """Rate limitter.
+    def __init__(
+        self,
+        min_interval: timedelta | float,
+        *,
+        burst: int = 1,
+        adaptive: bool = False,
+        min_rate: float | None = None,
+        slow_response: timedelta | float = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Token bucket rate limitter.
+
+        Tokens are refilled at `rate` tokens per second up to `burst` tokens
+        and each call consumes one token.
+        If `adaptive`, the rate is decreased multiplicatively on 429 / 5xx or slow responses
+        and increased additively on healthy ones. The rate never exceeds `1 / min_interval`.
 
         Parameters
         ----------
-        min_interval : Union[timedelta, int]
-            Minimum interval between calls. If int, it is treated as seconds.
+        min_interval : Union[timedelta, float]
+            Minimum average interval between calls. If float, it is treated as seconds.
+        burst : int, optional
+            Maximum number of calls which can be made without waiting, by default 1
+        adaptive : bool, optional
+            Whether to adapt the rate to the responses passed to `record`, by default False
+        min_rate : Optional[float], optional
+            Lower bound of the adaptive rate in calls per second,
+            by default 1/16 of the maximum rate
+        slow_response : Union[timedelta, float], optional
+            Latency above which a response is treated as slow, by default 5 seconds
+        clock : Callable[[], float], optional
+            Monotonic clock in seconds, by default time.monotonic
         """
-        if isinstance(min_interval, int):
-            min_interval = timedelta(seconds=min_interval)
-        self.min_interval = min_interval
-        self._last_called = datetime.min
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self._clock = clock
+        self._burst = burst
+        self._tokens = burst
+        self._updated = clock()
+        self._waiting = 0
+        self._lock = None
+        self.adaptive = adaptive
+        self._min_rate = min_rate
+        if isinstance(slow_response, timedelta):
+            slow_response = slow_response.total_seconds()
+        self.slow_response = slow_response
+        self.min_interval = min_interval  # type: ignore
 
     @property
-    def last_called(self) -> datetime:
-        return self._last_called
+    def min_interval(self) -> timedelta:
+        if math.isinf(self._max_rate):
+            return timedelta(0)
+        return timedelta(seconds=1 / self._max_rate)
+
+    @min_interval.setter
+    def min_interval(self, value: timedelta | float) -> None:
+        if isinstance(value, timedelta):
+            value = value.total_seconds()
+        if value < 0:
+            raise ValueError("min_interval must be positive")
+        self._max_rate = math.inf if value == 0 else 1 / value
+        self._rate = self._max_rate
 
     @property
-    def next_call(self) -> datetime:
-        return self.last_called + self.min_interval
+    def rate(self) -> float:
+        """Current rate in calls per second."""
+        return self._rate
 
     @property
-    def callable(self) -> bool:
-        return datetime.now() >= self.next_call
+    def max_rate(self) -> float:
+        return self._max_rate
 
     @property
-    def min_interval(self) -> timedelta:
-        return self._min_interval
+    def min_rate(self) -> float:
+        if self._min_rate is not None:
+            return min(self._min_rate, self._max_rate)
+        return self._max_rate / 16
 
-    @min_interval.setter
-    def min_interval(self, value: timedelta) -> None:
-        if value < timedelta(0):
-            raise ValueError("min_interval must be positive")
-        self._min_interval = value
+    @property
+    def burst(self) -> int:
+        return self._burst
+
+    @property
+    def tokens(self) -> float:
+        """Number of available tokens. Negative if calls were charged in advance."""
+        self._refill()
+        return self._tokens
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers waiting for a token."""
+        return self._waiting
+
+    @property
+    def callable(self) -> bool:
+        return self.tokens >= 1
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        if math.isinf(self._rate):
+            self._tokens = self._burst
+        elif self._tokens < self._burst:
+            self._tokens = min(self._burst, self._tokens + elapsed * self._rate)
+
+    def _try_acquire(self) -> float:
+        """Consume a token if available and return 0, otherwise return the time to wait."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    async def _acquire(self) -> float:
+        """`_try_acquire` which may wait for the state, e.g. for a file lock."""
+        return self._try_acquire()
+
+    async def wait(self) -> float:
+        """Wait until a token is available and consume it.
+
+        Returns
+        -------
+        float
+            Seconds waited.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        start = self._clock()
+        self._waiting += 1
+        try:
+            # the lock keeps the waiters in FIFO order
+            async with self._lock:
+                while True:
+                    delay = await self._acquire()
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+        finally:
+            self._waiting -= 1
+        return self._clock() - start
+
+    def charge(self) -> None:
+        """Consume a token without waiting. The bucket may go into debt."""
+        self._refill()
+        self._tokens -= 1
+
+    def refund(self) -> None:
+        """Give back a token consumed by a call which did not hit the server (e.g. cache hits)."""
+        self._refill()
+        self._tokens = min(self._burst, self._tokens + 1)
+
+    def record(self, latency: timedelta | float, status: int | None = None) -> None:
+        """Adapt the rate to a response. Does nothing if not `adaptive`.
 
-    async def wait(self) -> None:
-        while not self.callable:
-            await asyncio.sleep((self.next_call - datetime.now()).total_seconds())
-        self._last_called = datetime.now()
+        Parameters
+        ----------
+        latency : Union[timedelta, float]
+            Latency of the response. If float, it is treated as seconds.
+        status : Optional[int], optional
+            HTTP status of the response, by default None
+        """
+        if not self.adaptive or math.isinf(self._max_rate):
+            return
+        if isinstance(latency, timedelta):
+            latency = latency.total_seconds()
+        self._refill()
+        if status is not None and (status == 429 or status >= 500):
+            self._rate = max(self.min_rate, self._rate / 2)
+            # stop the burst
+            self._tokens = min(self._tokens, 0)
+        elif latency > self.slow_response:
+            self._rate = max(self.min_rate, self._rate * 3 / 4)
+        else:
+            self._rate = min(self._max_rate, self._rate + self._max_rate / 16)
 
     def wraps(
         self,
@@ -115,6 +279,178 @@ class RateLimitter:
         pass
 
 
+if sys.platform == "win32":
+    import msvcrt
+
+    _O_BINARY = os.O_BINARY
+
+    def _try_lock(fd: int) -> bool:
+        """Lock the file without blocking. False if another process holds the lock."""
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except PermissionError:
+            return False
+        return True
+
+    def _unlock(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    _O_BINARY = 0
+
+    def _try_lock(fd: int) -> bool:
+        """Lock the file without blocking. False if another process holds the lock."""
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class SharedRateLimitter(RateLimitter):
+    """`RateLimitter` whose bucket is shared by all the processes using the same file.
+
+    The tokens, the last refill time and the adapted rate are stored in a small file
+    which is read and written under an exclusive file lock on each acquisition,
+    so the budget is shared across processes on the same machine.
+    Each process still caps the rate at its own `min_interval`.
+
+    The lock is never waited for on the event loop: `wait` polls it with
+    `asyncio.sleep`, and `charge`, `refund` and `record` are applied the next time
+    the lock is taken if another process holds it.
+    """
+
+    _STATE = struct.Struct("<ddd")
+    _LOCK_POLL = 0.005
+
+    def __init__(
+        self,
+        path: str | Path,
+        min_interval: timedelta | float,
+        *,
+        clock: Callable[[], float] = time.time,
+        lock_timeout: float = 10,
+        **kwargs: Any,
+    ) -> None:
+        """Token bucket rate limitter shared across processes.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the state file. Created if it does not exist.
+        min_interval : Union[timedelta, float]
+            Minimum average interval between calls of all the processes.
+        clock : Callable[[], float], optional
+            Clock in seconds shared by the processes, by default time.time
+        lock_timeout : float, optional
+            Seconds `wait` polls the file lock before raising `TimeoutError`,
+            by default 10
+        **kwargs
+            Other arguments of `RateLimitter`.
+        """
+        super().__init__(min_interval, clock=clock, **kwargs)
+        self.path = Path(path).expanduser()
+        self.lock_timeout = lock_timeout
+        self._fd: int | None = None
+        self._pending: list[Callable[[], None]] = []
+
+    def open(self) -> SharedRateLimitter:
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | _O_BINARY, 0o644)
+        return self
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _fileno(self) -> int:
+        fd = self.open()._fd
+        assert fd is not None  # nosec
+        return fd
+
+    @contextmanager
+    def _shared(self, fd: int) -> Iterator[None]:
+        """Load the state locked by the caller, apply the deferred updates
+        and store it back on exit. Unlocks on exit."""
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            data = os.read(fd, self._STATE.size)
+            if len(data) == self._STATE.size:
+                self._tokens, updated, rate = self._STATE.unpack(data)
+                # the clock went backwards (e.g. the file survived a reboot)
+                self._updated = min(updated, self._clock())
+                self._rate = min(rate, self._max_rate)
+            pending, self._pending = self._pending, []
+            for update in pending:
+                update()
+            yield
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, self._STATE.pack(self._tokens, self._updated, self._rate))
+        finally:
+            _unlock(fd)
+
+    def _update(self, update: Callable[[], None]) -> None:
+        """Apply `update` to the shared state now if the lock is free,
+        otherwise the next time it is taken."""
+        fd = self._fileno()
+        if not _try_lock(fd):
+            self._pending.append(update)
+            return
+        with self._shared(fd):
+            update()
+
+    @property
+    def rate(self) -> float:
+        """Shared rate, or the last one seen if another process holds the lock."""
+        fd = self._fileno()
+        if not _try_lock(fd):
+            return self._rate
+        with self._shared(fd):
+            return super().rate
+
+    @property
+    def tokens(self) -> float:
+        """Shared number of tokens, or the last one seen
+        if another process holds the lock."""
+        fd = self._fileno()
+        if not _try_lock(fd):
+            return self._tokens
+        with self._shared(fd):
+            return super().tokens
+
+    async def _acquire(self) -> float:
+        fd = self._fileno()
+        deadline = time.monotonic() + self.lock_timeout
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"{self.path} was locked for more than {self.lock_timeout}s"
+                )
+            await asyncio.sleep(self._LOCK_POLL)
+        with self._shared(fd):
+            return super()._try_acquire()
+
+    def charge(self) -> None:
+        self._update(partial(RateLimitter.charge, self))
+
+    def refund(self) -> None:
+        self._update(partial(RateLimitter.refund, self))
+
+    def record(self, latency: timedelta | float, status: int | None = None) -> None:
+        if not self.adaptive:
+            return
+        self._update(partial(RateLimitter.record, self, latency, status))
+
+
 def async_for_task(async_iterable: AsyncIterable[T]) -> Iterable[asyncio.Task[T]]:
     iterator = type(async_iterable).__aiter__(async_iterable)
     running = True
@@ -139,3 +475,213 @@ def async_iterable_to_iterable(
                 yield coro
         except StopAsyncIteration:
             running = False
+
+
+async def _to_async_generator(
+    items: Iterable[T] | AsyncIterable[T],
+) -> AsyncGenerator[T, None]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class CancelScope:
+    """Futures, and other scopes, which are cancelled together."""
+
+    def __init__(self) -> None:
+        self._members: set[asyncio.Future[Any] | CancelScope] = set()
+
+    def add(self, member: asyncio.Future[Any] | CancelScope) -> None:
+        self._members.add(member)
+        if isinstance(member, asyncio.Future):
+            member.add_done_callback(self._members.discard)
+
+    def cancel(self) -> None:
+        """Cancel the futures in flight without waiting for them."""
+        for member in list(self._members):
+            try:
+                member.cancel()
+            except RuntimeError:
+                # the event loop of the future is already closed
+                pass
+
+
+class CancellableIterator(AsyncIterator[T]):
+    """Async iterator over an async generator whose work in flight is in `scope`.
+
+    The work is cancelled as soon as the iterator is closed by `aclose()` or
+    `async with`, or dropped, e.g. by breaking out of `async for`, instead of
+    when the event loop gets to finalize the generator.
+    """
+
+    scope: CancelScope
+
+    def __init__(self, generator: AsyncGenerator[T, None], scope: CancelScope) -> None:
+        self._generator = generator
+        self.scope = scope
+
+    def __aiter__(self) -> CancellableIterator[T]:
+        return self
+
+    async def __anext__(self) -> T:
+        return await self._generator.__anext__()
+
+    def cancel(self) -> None:
+        self.scope.cancel()
+
+    async def aclose(self) -> None:
+        self.scope.cancel()
+        await self._generator.aclose()
+
+    async def __aenter__(self) -> CancellableIterator[T]:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def __del__(self) -> None:
+        self.scope.cancel()
+
+
+async def map_bounded(
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T] | AsyncIterable[T],
+    *,
+    concurrency: int,
+    ordered: bool = True,
+    scope: CancelScope | None = None,
+) -> AsyncIterator[R]:
+    """Apply `func` to `items` concurrently with at most `concurrency` calls in flight.
+
+    `items` are pulled lazily, so the source is consumed only as fast as the results are.
+    Closing the returned iterator (e.g. by `aclose()`) cancels the calls in flight
+    and closes `items` if it is an async generator.
+
+    Parameters
+    ----------
+    func : Callable[[T], Awaitable[R]]
+        Function to apply.
+    items : Union[Iterable[T], AsyncIterable[T]]
+        Items to apply `func` to.
+    concurrency : int
+        Maximum number of calls in flight.
+    ordered : bool, optional
+        Whether to yield results in the order of `items`, by default True.
+        If False, results are yielded as soon as they complete.
+    scope : Optional[CancelScope], optional
+        Scope to add the calls to, by default None, so that they can be cancelled
+        without closing the returned iterator, e.g. by a `CancellableIterator`.
+
+    Yields
+    ------
+    R
+        Results of `func`.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    iterator = _to_async_generator(items)
+    pending: deque[asyncio.Future[R]] = deque()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                future = asyncio.ensure_future(func(item))
+                if scope is not None:
+                    scope.add(future)
+                pending.append(future)
+            if not pending:
+                return
+            if ordered:
+                yield await pending[0]
+                pending.popleft()
+            else:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    pending.remove(future)
+                for future in done:
+                    yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        await iterator.aclose()
+        aclose = getattr(items, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class _Flight(Generic[R]):
+    def __init__(self, task: asyncio.Future[R]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[K, R]):
+    """Coalesces concurrent calls with the same key onto one call.
+
+    The call is cancelled only when all of its callers are cancelled.
+    Results are not kept after the call completes.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[K, _Flight[R]] = {}
+        self.calls = 0
+        """Number of calls actually made."""
+        self.coalesced = 0
+        """Number of calls which joined a call in flight."""
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._flights
+
+    async def do(self, key: K, func: Callable[[], Awaitable[R]]) -> R:
+        """Call `func`, or wait for the call in flight with the same key.
+
+        Parameters
+        ----------
+        key : K
+            Key of the call.
+        func : Callable[[], Awaitable[R]]
+            Function to call if no call with `key` is in flight.
+
+        Returns
+        -------
+        R
+            Result of the call.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            self.calls += 1
+
+            def remove(_: asyncio.Future[R], flight: _Flight[R] = flight) -> None:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+            flight.task.add_done_callback(remove)
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                # later calls must not join the cancelled call
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import pickle  # nosec
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple
+
+from typing_extensions import Self
+
+DEFAULT_DEAD_LETTER_PATH = "~/.cache/ut_course_catalog/dead_letters.sqlite"
+
+
+class DeadLetter(NamedTuple):
+    """Page or course which could not be fetched."""
+
+    kind: str
+    """"search" or "detail"."""
+    key: str
+    """e.g. "<params id>/<page>/<year>" for search pages and "<code>/<year>" for details.
+    The year of a search page is omitted if it was not fetched for a year."""
+    payload: Any
+    """(SearchParams, page, year) or (SearchParams, page) for search pages
+    and (code, year) for details."""
+    error: str
+    """Class name of the last exception."""
+    message: str
+    attempts: int
+    """Number of attempts over all the crawls which failed to fetch it."""
+    first_failed: float
+    last_failed: float
+
+
+class DeadLetterStore:
+    """Persistent store of the pages and courses which could not be fetched,
+    so that they can be fetched again by `UTCourseCatalog.redrive`
+    instead of another full crawl.
+
+    All entries are loaded into a dict on open, so checking whether a key failed
+    before does not touch the disk.
+    """
+
+    path: Path
+    _connection: sqlite3.Connection | None
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_DEAD_LETTER_PATH,
+        *,
+        commit_every: int = 100,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Store of failed fetches.
+
+        Parameters
+        ----------
+        path : Union[str, Path], optional
+            Path to the SQLite database,
+            by default "~/.cache/ut_course_catalog/dead_letters.sqlite".
+            Created if it does not exist.
+        commit_every : int, optional
+            Number of changes before committing, by default 100.
+            Uncommitted changes are committed on close.
+        clock : Callable[[], float], optional
+            Clock of the failure times in seconds since the epoch, by default time.time
+        """
+        self.path = Path(path).expanduser()
+        self.commit_every = commit_every
+        self._clock = clock
+        self._connection = None
+        self._letters: dict[tuple[str, str], DeadLetter] = {}
+        self._uncommitted = 0
+
+    def open(self) -> Self:
+        if self._connection is not None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters "
+            "(kind TEXT NOT NULL, key TEXT NOT NULL, payload BLOB NOT NULL, "
+            "error TEXT NOT NULL, message TEXT NOT NULL, attempts INTEGER NOT NULL, "
+            "first_failed REAL NOT NULL, last_failed REAL NOT NULL, "
+            "PRIMARY KEY (kind, key))"
+        )
+        for row in self._connection.execute(
+            "SELECT * FROM dead_letters ORDER BY first_failed"
+        ):
+            letter = DeadLetter(*row)
+            letter = letter._replace(payload=pickle.loads(letter.payload))  # nosec
+            self._letters[letter.kind, letter.key] = letter
+        return self
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+            self._uncommitted = 0
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _open_if_closed(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        assert self._connection is not None  # nosec
+        return self._connection
+
+    def _changed(self, connection: sqlite3.Connection) -> None:
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            connection.commit()
+            self._uncommitted = 0
+
+    def __len__(self) -> int:
+        self._open_if_closed()
+        return len(self._letters)
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        self._open_if_closed()
+        return key in self._letters
+
+    def __iter__(self) -> Iterator[DeadLetter]:
+        self._open_if_closed()
+        return iter(list(self._letters.values()))
+
+    def get(self, kind: str, key: str) -> DeadLetter | None:
+        self._open_if_closed()
+        return self._letters.get((kind, key))
+
+    def letters(self, kind: str | None = None) -> list[DeadLetter]:
+        """Dead letters of a kind, or all of them, in the order they first failed."""
+        return [x for x in self if kind is None or x.kind == kind]
+
+    def add(
+        self,
+        kind: str,
+        key: str,
+        payload: Any,
+        error: BaseException,
+        attempts: int = 1,
+    ) -> DeadLetter:
+        """Record a failure. The attempts are added to those of earlier failures."""
+        connection = self._open_if_closed()
+        now = self._clock()
+        previous = self._letters.get((kind, key))
+        letter = DeadLetter(
+            kind=kind,
+            key=key,
+            payload=payload,
+            error=type(error).__name__,
+            message=str(error),
+            attempts=attempts + (previous.attempts if previous else 0),
+            first_failed=previous.first_failed if previous else now,
+            last_failed=now,
+        )
+        self._letters[kind, key] = letter
+        connection.execute(
+            "INSERT OR REPLACE INTO dead_letters VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            letter._replace(
+                payload=pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+            ),
+        )
+        self._changed(connection)
+        return letter
+
+    def discard(self, kind: str, key: str) -> bool:
+        """Remove a dead letter, e.g. when it was fetched. False if not found."""
+        connection = self._open_if_closed()
+        if self._letters.pop((kind, key), None) is None:
+            return False
+        connection.execute(
+            "DELETE FROM dead_letters WHERE kind = ? AND key = ?", (kind, key)
+        )
+        self._changed(connection)
+        return True
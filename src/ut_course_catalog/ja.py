@@ -5,7 +5,9 @@ import hashlib
 import math
 import pickle  # nosec
 import re
-from asyncio import create_task
+import time
+from concurrent.futures import Executor
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -15,9 +17,12 @@ from logging import Logger, getLogger
 from pathlib import Path
 from typing import (
     Any,
-    AsyncIterable,
+    AsyncContextManager,
+    AsyncGenerator,
+    AsyncIterator,
     Awaitable,
     Callable,
+    ContextManager,
     Iterable,
     NamedTuple,
     Optional,
@@ -27,20 +32,46 @@ from typing import (
 
 import aiofiles
 import aiohttp
-from aiohttp_client_cache import SQLiteBackend
 from aiohttp_client_cache.session import CachedSession
 from bs4 import BeautifulSoup, ResultSet, Tag
 from pandas import DataFrame
-from tenacity import WrappedFn, retry
-from tenacity.before_sleep import before_sleep_log
-from tenacity.stop import stop_after_attempt, stop_after_delay
-from tenacity.wait import wait_exponential
 from tqdm import tqdm
 from typing_extensions import Self
 
 from ut_course_catalog.common import BASE_URL, Semester, Weekday
 
-from .common import Language, RateLimitter
+from .archive import ArchiveMissError, PageArchive
+from .code_index import CodeIndex
+from .common import (
+    CancellableIterator,
+    CancelScope,
+    Language,
+    RateLimitter,
+    SharedRateLimitter,
+    SingleFlight,
+    WrappedAwaitableFn,
+    WrappedFnParam,
+    WrappedFnResult,
+    map_bounded,
+)
+from .dead_letter import DeadLetterStore
+from .journal import CrawlJournal
+from .metrics import Metrics
+from .parsed_cache import ParsedCache
+from .profiling import Profiler
+from .response_cache import ResponseCache
+from .retry_policy import (
+    RETRYABLE_STATUSES,
+    CircuitState,
+    HTTPStatusError,
+    RetryPolicy,
+    parse_retry_after,
+)
+from .snapshot import Delta, Fingerprint, Snapshot
+from .transport import TransportConfig, TransportStats
+
+ITEMS_PER_PAGE = 10
+"""Number of items in a page of search results."""
 
 
 def current_fiscal_year() -> int:
@@ -671,10 +702,318 @@ async def _await_if_future(obj: object) -> object:
     return obj
 
 
+def _search_letters(
+    params: SearchParams, page: int, years: tuple[int, ...] | None
+) -> list[tuple[str, Any]]:
+    """Keys and payloads of the dead letters of a search page, one per year."""
+    if years is None:
+        return [(f"{params.id()}/{page}", (params, page))]
+    return [(f"{params.id()}/{page}/{year}", (params, page, year)) for year in years]
+
+
 class ParserError(Exception):
     pass
 
 
+class Parser:
+    """Backend which parses the pages of the website.
+    All backends must produce identical results."""
+
+    name: str = ""
+    version: str = "1"
+    """Bumped when the results of the parser change."""
+
+    def parse_search(self, text: str, page: int | None = None) -> SearchResult:
+        """Parse a page of search results.
+
+        Parameters
+        ----------
+        text : str
+            HTML of the page.
+        page : Optional[int], optional
+            Requested page number, by default None.
+            If None, it is inferred from the page itself.
+
+        Returns
+        -------
+        SearchResult
+            Search results.
+
+        Raises
+        ------
+        ParserError
+            Raises when failed to parse the page.
+        """
+        raise NotImplementedError
+
+    def parse_detail(self, text: str) -> Details:
+        """Parse a page of details of a course.
+
+        Parameters
+        ----------
+        text : str
+            HTML of the page.
+
+        Returns
+        -------
+        Details
+            Details of the course.
+
+        Raises
+        ------
+        ParserError
+            Raises when failed to parse the page.
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class SoupParser(Parser):
+    """Parser using BeautifulSoup with the given tree builder."""
+
+    def __init__(self, features: str = "html.parser") -> None:
+        self.name = features if features == "html.parser" else f"bs4-{features}"
+        self.features = features
+
+    def parse_search(self, text: str, page: int | None = None) -> SearchResult:
+        return _parse_search(text, page, self.features)
+
+    def parse_detail(self, text: str) -> Details:
+        return _parse_detail(text, self.features)
+
+
+def get_parser(parser: str | Parser) -> Parser:
+    """Get a parser by its name.
+
+    Parameters
+    ----------
+    parser : Union[str, Parser]
+        "html.parser" (BeautifulSoup with the builtin parser, default)
+        or "lxml" (lxml with XPath, several times faster, requires lxml).
+        Instances of `Parser` are returned as is.
+
+    Returns
+    -------
+    Parser
+        Parser.
+    """
+    if isinstance(parser, Parser):
+        return parser
+    if parser == "html.parser":
+        return SoupParser("html.parser")
+    if parser == "lxml":
+        from .lxml_parser import LxmlParser
+
+        return LxmlParser()
+    raise ValueError(f"Unknown parser: {parser}")
+
+
+class Page(NamedTuple):
+    """Response of a page of the website."""
+
+    text: str
+    status: int
+    etag: str | None
+    last_modified: str | None
+    from_cache: bool
+
+
+def _search_result(
+    page_info_text: str | None, items: list[SearchResultItem], page: int | None
+) -> SearchResult:
+    """Check the items parsed from a page of search results against its page info.
+
+    Parameters
+    ----------
+    page_info_text : Optional[str]
+        Formatted text of the page info, e.g. "11-20件/全123件". None if not found.
+    items : list[SearchResultItem]
+        Items parsed from the page.
+    page : Optional[int]
+        Requested page number. If None, it is inferred from the page info.
+    """
+    if page_info_text is None:
+        # not found
+        return SearchResult(
+            items=[],
+            current_items_count=0,
+            total_items_count=0,
+            current_items_first_index=0,
+            current_items_last_index=0,
+            current_page=0,
+            total_pages=0,
+        )
+
+    page_info_match: list[str] = re.findall(r"\d+", page_info_text)
+    current_items_first_index = int(page_info_match[0])
+    current_items_last_index = int(page_info_match[1])
+    current_items_count = current_items_last_index - current_items_first_index + 1
+    total_items_count = int(page_info_match[2])
+    total_pages = math.ceil(total_items_count / ITEMS_PER_PAGE)
+    if page is None:
+        page = current_items_first_index // ITEMS_PER_PAGE + 1
+
+    if page != total_pages:
+        if len(items) != ITEMS_PER_PAGE:
+            raise ParserError(f"items count is not {ITEMS_PER_PAGE}")
+        if len(items) != current_items_count:
+            raise ParserError("items count is not current_items_count")
+    if page != current_items_first_index // ITEMS_PER_PAGE + 1:
+        raise ParserError("page number is not correct")
+
+    return SearchResult(
+        items=items,
+        total_items_count=total_items_count,
+        current_items_first_index=current_items_first_index,
+        current_items_last_index=current_items_last_index,
+        current_items_count=current_items_count,
+        total_pages=total_pages,
+        current_page=page,
+    )
+
+
+def _parse_search(
+    text: str, page: int | None, features: str = "html.parser"
+) -> SearchResult:
+    """Parse a page of search results with BeautifulSoup."""
+    soup = BeautifulSoup(text, features)
+
+    # get page info first
+    page_info_element = soup.find(class_="catalog-total-search-result")
+    if not page_info_element:
+        return _search_result(None, [], page)
+
+    def get_items() -> Iterable[SearchResultItem]:
+        """Get search result items."""
+        container = soup.find("div", class_="catalog-search-result-card-container")
+        if container is None:
+            return
+        if type(container) is not Tag:
+            raise ParserError(f"container not found: {container}")
+        cards = container.find_all("div", class_="catalog-search-result-card")
+        for card in cards:
+            rows = card.find_all(class_="catalog-search-result-table-row")
+            cells_parent: Tag = rows[1]
+            if not cells_parent:
+                continue
+
+            def get_cell(name: str) -> Tag:
+                cell = cells_parent.find("div", class_=f"{name}-cell")
+                if type(cell) is not Tag:
+                    raise ParserError(f"cell not found: {name}")
+                return cell
+
+            def get_cell_text(name: str) -> str:
+                cell = get_cell(name)
+                return _format(cell.text)
+
+            code_cell = _ensure_found(cells_parent.find(class_="code-cell"))
+            code_cell_children = list(code_cell.children)
+            yield SearchResultItem(
+                ねらい=_format_description(
+                    card.find(class_="catalog-search-result-card-body-text").text
+                ),
+                時間割コード=code_cell_children[1].text,
+                共通科目コード=CommonCode(code_cell_children[3].text),
+                コース名=get_cell_text("name"),
+                教員=get_cell_text("lecturer"),
+                学期={
+                    Semester(el.text.replace(" ", "").replace("\n", ""))
+                    for el in get_cell("semester").find_all(
+                        class_="catalog-semester-icon"
+                    )
+                },
+                曜限=set(_parse_weekday_period(get_cell_text("period"))),
+            )
+
+    return _search_result(_format(page_info_element.text), list(get_items()), page)
+
+
+def _parse_detail(text: str, features: str = "html.parser") -> Details:
+    """Parse a page of details of a course with BeautifulSoup.
+
+    We get information from 3 different types of elements:
+        cells 1: cells in the smallest table in the page.
+        cells 2: cells in the first card.
+        cards: cards.
+    """
+
+    # parse html
+    soup = BeautifulSoup(text, features)
+
+    # utility functions to get elements and their text
+    cells1_parent: Tag = soup.find_all(class_="catalog-row")[1]
+
+    def get_cell1(name: str) -> str:
+        class_ = f"{name}-cell"
+        cell = cells1_parent.find("div", class_=class_)
+        if not cell:
+            raise ParserError(f"Cell {name} not found")
+        return _format(cell.text)
+
+    def get_cell2(index: int) -> str:
+        class_ = f"td{index // 3 + 1}-cell"
+        return _format(soup.find_all(class_=class_)[index % 3].text)
+
+    def get_cards():
+        cards: ResultSet[Tag] = soup.find_all(class_="catalog-page-detail-card")
+        for card in cards:
+            card_header = card.find(class_="catalog-page-detail-card-header")
+            if not card_header:
+                raise ParserError("Card header not found")
+            title = _format(card_header.text)
+            card_body = card.find(class_="catalog-page-detail-card-body-pre")
+            if not card_body:
+                raise ParserError("card_body not found")
+            if type(card_body) is not Tag:
+                raise ParserError("card_body is not Tag")
+            yield title, card_body
+
+    cards = dict(get_cards())
+
+    def get_card(name: str) -> Tag | None:
+        return cards.get(name, None)
+
+    def get_card_text(name: str) -> str | None:
+        card = get_card(name)
+        if card:
+            return _format_description(card.text)
+        return None
+
+    code_cell = _ensure_found(cells1_parent.find(class_="code-cell"))
+    code_cell_children = list(code_cell.children)
+
+    # return the result
+    return Details(
+        時間割コード=code_cell_children[1].text,
+        共通科目コード=CommonCode(code_cell_children[3].text),
+        コース名=get_cell1("name"),
+        教員=get_cell1("lecturer"),
+        学期={
+            Semester(el.text.replace(" ", "").replace("\n", ""))
+            for el in cells1_parent.find_all(class_="catalog-semester-icon")
+        },
+        曜限=_parse_weekday_period(get_cell1("period")),
+        教室="N/A",  # get_cell2(0),
+        単位数=Decimal(get_cell2(3)),
+        他学部履修可="不可" not in get_cell2(4),
+        講義使用言語=get_cell2(0),
+        実務経験のある教員による授業科目="YES" in get_cell2(1),
+        開講所属=Faculty.value_of(get_cell2(2)),
+        授業計画=get_card_text("授業計画"),
+        授業の方法=get_card_text("授業の方法"),
+        成績評価方法=get_card_text("成績評価方法"),
+        教科書=get_card_text("教科書"),
+        参考書=get_card_text("参考書"),
+        履修上の注意=get_card_text("履修上の注意"),
+        ねらい=_format(
+            _ensure_found(soup.find(class_="catalog-page-detail-lecture-aim")).text
+        ),
+    )
+
+
 class UTCourseCatalog:
     """A parser for the [UTokyo Online Course Catalogue](https://catalog.he.u-tokyo.ac.jp)."""
 
@@ -685,37 +1024,451 @@ class UTCourseCatalog:
     def __init__(
         self,
         logger_level: int = 0,
-        min_interval: timedelta | int = 1,
+        min_interval: timedelta | float = 1,
         session: aiohttp.ClientSession | None = None,
+        *,
+        burst: int = 1,
+        adaptive: bool = True,
+        rate_limitter: RateLimitter | None = None,
+        shared_rate_limit: str | Path | None = None,
+        parser: str | Parser = "html.parser",
+        executor: Executor | None = None,
+        archive: PageArchive | str | Path | None = None,
+        offline: bool = False,
+        parsed_cache: ParsedCache | str | Path | None = None,
+        cache: ResponseCache | str | Path | bool = True,
+        code_index: CodeIndex | str | Path | bool = False,
+        transport: TransportConfig | None = None,
+        base_url: str = BASE_URL,
+        metrics: Metrics | None = None,
+        profiler: Profiler | None = None,
+        retry_policy: RetryPolicy | None = None,
+        dead_letters: DeadLetterStore | str | Path | None = None,
     ) -> None:
+        """A parser for the UTokyo Online Course Catalogue.
+
+        Parameters
+        ----------
+        logger_level : int, optional
+            Logger level, by default 0
+        min_interval : Union[timedelta, float], optional
+            Minimum average interval between requests, by default 1 second
+        session : Optional[aiohttp.ClientSession], optional
+            Session to use, by default None. If None, a session is created.
+        burst : int, optional
+            Number of requests which can be sent without waiting, by default 1
+        adaptive : bool, optional
+            Whether to slow down on 429 / 5xx or slow responses, by default True
+        rate_limitter : Optional[RateLimitter], optional
+            Rate limitter to use, by default None.
+            If specified, `min_interval`, `burst` and `adaptive` are ignored.
+        shared_rate_limit : Union[str, Path, None], optional
+            Path to the state file of a `SharedRateLimitter`, by default None.
+            All processes using the same file share `min_interval` and `burst`.
+            Ignored if `rate_limitter` is specified.
+        parser : Union[str, Parser], optional
+            Parser backend, by default "html.parser". See `get_parser`.
+        executor : Optional[Executor], optional
+            Executor to parse pages in, by default None (parse in the event loop).
+            A `ProcessPoolExecutor` lets parsing use multiple cores
+            while the event loop keeps sending requests.
+            The executor is not shut down by this class.
+        archive : Union[PageArchive, str, Path, None], optional
+            Archive to write every fetched page to, by default None.
+            If a path is specified, the archive is opened and closed by this class.
+        offline : bool, optional
+            Whether to serve all pages from `archive` without any network access,
+            by default False. Pages missing from the archive raise `ArchiveMissError`.
+        parsed_cache : Union[ParsedCache, str, Path, None], optional
+            Cache of parsed pages, by default None. Pages which were already parsed
+            by the same version of the parser are not parsed again.
+            If a path is specified, the cache is opened and closed by this class.
+        cache : Union[ResponseCache, str, Path, bool], optional
+            Cache of responses, by default True (a `ResponseCache` at its default path).
+            A path creates a `ResponseCache` with the default settings at the path,
+            which is opened and closed by this class. False to disable.
+            Cached responses are served without sending requests.
+        code_index : Union[CodeIndex, str, Path, bool], optional
+            Index between 時間割コード and 共通科目コード, by default False (disabled).
+            It is filled from every search and detail page, and
+            `fetch_common_code` / `fetch_code` look it up first.
+            True for a `CodeIndex` at its default path. A path or True is opened
+            and closed by this class.
+        transport : Optional[TransportConfig], optional
+            Settings of the connection pool and timeouts of the session created
+            by this class, by default TransportConfig(). Ignored if `session` is
+            specified. Connections and bytes are counted in `transport_stats`.
+        base_url : str, optional
+            URL of the website, by default BASE_URL.
+            Pages in the archive and the caches do not depend on it.
+        metrics : Optional[Metrics], optional
+            Registry to record request latencies, parse times, rate limitter waits,
+            cache hits, retries, failures and items in flight to,
+            by default a new `Metrics` without sinks.
+        profiler : Optional[Profiler], optional
+            Profiler to attribute the time, memory and event loop lag of the
+            "search", "detail", "parse" and "save" stages to, by default None.
+            The event loop is monitored while this class is entered.
+        retry_policy : Optional[RetryPolicy], optional
+            Policy of `retry`, shared by all the calls of this instance,
+            by default RetryPolicy(). Its circuit breaker pauses all requests
+            when the error rate spikes or a Retry-After is received.
+        dead_letters : Union[DeadLetterStore, str, Path, None], optional
+            Store to record the search pages and details which could not be fetched
+            by the crawls to, by default None. They can be fetched again by `redrive`.
+            If a path is specified, the store is opened and closed by this class.
+        """
+        if offline and archive is None:
+            raise ValueError("archive is required in offline mode")
         self.session = session
         self._logger = getLogger(__name__)
         self._logger.setLevel(logger_level)
-        self._rate_limitter = RateLimitter(min_interval=min_interval)
+        self._owns_rate_limitter = False
+        if rate_limitter is None and shared_rate_limit is not None:
+            rate_limitter = SharedRateLimitter(
+                shared_rate_limit, min_interval, burst=burst, adaptive=adaptive
+            )
+            self._owns_rate_limitter = True
+        if rate_limitter is None:
+            rate_limitter = RateLimitter(
+                min_interval=min_interval, burst=burst, adaptive=adaptive
+            )
+        self._rate_limitter = rate_limitter
+        self._transport = transport or TransportConfig()
+        self._transport_stats = TransportStats()
+        self._base_url = base_url
+        self._metrics = Metrics() if metrics is None else metrics
+        self._profiler = profiler
+        self._retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self._loop_monitor: AsyncContextManager[None] | None = None
+        self._parser = get_parser(parser)
+        self._executor = executor
+        self._owns_archive = False
+        if archive is not None and not isinstance(archive, PageArchive):
+            archive = PageArchive(archive)
+            self._owns_archive = True
+        self._archive = archive
+        self._offline = offline
+        self._owns_parsed_cache = False
+        if parsed_cache is not None and not isinstance(parsed_cache, ParsedCache):
+            parsed_cache = ParsedCache(parsed_cache)
+            self._owns_parsed_cache = True
+        self._parsed_cache = parsed_cache
+        self._detail_flights: SingleFlight[tuple[str, int], Details] = SingleFlight()
+        self._owns_cache = cache is True or isinstance(cache, (str, Path))
+        if cache is True:
+            cache = ResponseCache()
+        elif isinstance(cache, (str, Path)):
+            cache = ResponseCache(cache)
+        self._cache = None if cache is False else cache
+        self._owns_code_index = code_index is True or isinstance(
+            code_index, (str, Path)
+        )
+        if code_index is True:
+            code_index = CodeIndex()
+        elif isinstance(code_index, (str, Path)):
+            code_index = CodeIndex(code_index)
+        self._code_index = None if code_index is False else code_index
+        self._code_flights: SingleFlight[tuple[str, str], Any] = SingleFlight()
+        self._owns_dead_letters = False
+        if dead_letters is not None and not isinstance(dead_letters, DeadLetterStore):
+            dead_letters = DeadLetterStore(dead_letters)
+            self._owns_dead_letters = True
+        self._dead_letters = dead_letters
+
+    @property
+    def rate_limitter(self) -> RateLimitter:
+        return self._rate_limitter
+
+    @property
+    def parser(self) -> Parser:
+        return self._parser
+
+    @property
+    def archive(self) -> PageArchive | None:
+        return self._archive
+
+    @property
+    def offline(self) -> bool:
+        return self._offline
+
+    @property
+    def parsed_cache(self) -> ParsedCache | None:
+        return self._parsed_cache
+
+    @property
+    def cache(self) -> ResponseCache | None:
+        return self._cache
+
+    @property
+    def code_index(self) -> CodeIndex | None:
+        return self._code_index
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._metrics
+
+    @property
+    def profiler(self) -> Profiler | None:
+        return self._profiler
+
+    @property
+    def dead_letters(self) -> DeadLetterStore | None:
+        return self._dead_letters
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def transport_stats(self) -> TransportStats:
+        """Counters of the session created by this class."""
+        return self._transport_stats
 
     async def __aenter__(self) -> Self:
+        if self._profiler is not None:
+            self._loop_monitor = self._profiler.monitor_loop()
+            await self._loop_monitor.__aenter__()
+        if self._archive is not None:
+            self._archive.open()
+        if self._offline:
+            return self
         if self.session is None:
-            self.session = CachedSession(
-                cache=SQLiteBackend(
-                    cache_name="~/.cache/ut_course_catalog/cache.sqlite"
-                ),
-                logger=self._logger,
+            self.session = self._transport.create_session(
+                [self._transport_stats.trace_config()]
             )
         await self.session.__aenter__()
         return self
 
     async def __aexit__(self, *args: Any) -> None:
+        if self._loop_monitor is not None:
+            await self._loop_monitor.__aexit__(*args)
+            self._loop_monitor = None
+        if self._owns_archive and self._archive is not None:
+            self._archive.close()
+        if self._owns_parsed_cache and self._parsed_cache is not None:
+            self._parsed_cache.close()
+        if self._owns_cache and self._cache is not None:
+            self._cache.close()
+        if self._owns_code_index and self._code_index is not None:
+            self._code_index.close()
+        if self._owns_dead_letters and self._dead_letters is not None:
+            self._dead_letters.close()
+        if self._owns_rate_limitter and isinstance(
+            self._rate_limitter, SharedRateLimitter
+        ):
+            self._rate_limitter.close()
+        if self._offline:
+            return
         self._check_client()
         if self.session is None:
             raise RuntimeError("__aenter__ not called")
 
         await self.session.__aexit__(*args)
 
+    def _stage(self, name: str) -> ContextManager[None]:
+        """Profile the block as a stage if `profiler` is specified."""
+        if self._profiler is None:
+            return nullcontext()
+        return self._profiler.stage(name)
+
     def _check_client(self) -> None:
-        if not self.session:
+        if not self.session and not self._offline:
+            raise RuntimeError("__aenter__ not called")
+
+    async def _is_cached(self, url: str, params: dict[str, Any]) -> bool:
+        """Whether the response is likely to be served from the cache of the session."""
+        cache = getattr(self.session, "cache", None)
+        if cache is None:
+            return False
+        try:
+            return bool(await cache.has_url(url, params=params))
+        except Exception:
+            return False
+
+    async def _parse(self, func: Callable[..., T], *args: Any) -> T:
+        """Call a parse function, in the executor if specified."""
+        if self._executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _parse_page(
+        self,
+        endpoint: str,
+        params: dict[str, Any],
+        text: str,
+        func: Callable[..., T],
+        *args: Any,
+    ) -> T:
+        """Call a parse function unless the page was already parsed."""
+        if self._parsed_cache is None:
+            with self._stage("parse"), self._metrics.timer(
+                "utcc_parse_seconds", endpoint=endpoint
+            ):
+                return await self._parse(func, *args)
+        key = self._parsed_cache.key(endpoint, params, text, self._parser)
+        result = self._parsed_cache.get(key)
+        self._metrics.increment(
+            "utcc_parsed_cache_requests_total",
+            endpoint=endpoint,
+            result="miss" if result is None else "hit",
+        )
+        if result is None:
+            with self._stage("parse"), self._metrics.timer(
+                "utcc_parse_seconds", endpoint=endpoint
+            ):
+                result = await self._parse(func, *args)
+            self._parsed_cache.put(key, result)
+        return result
+
+    async def _request(
+        self,
+        endpoint: str,
+        params: dict[str, Any],
+        *,
+        headers: dict[str, str] | None = None,
+        refresh: bool = False,
+    ) -> Page:
+        """Send a GET request to the website.
+        Cached responses do not consume the budget of the rate limitter.
+
+        Parameters
+        ----------
+        endpoint : str
+            Endpoint relative to the base URL.
+        params : dict[str, Any]
+            Query parameters.
+        headers : Optional[dict[str, str]], optional
+            Additional request headers, by default None
+        refresh : bool, optional
+            Whether to bypass reading the cache, by default False.
+            The response is still written to the `ResponseCache`.
+
+        Returns
+        -------
+        Page
+            Response.
+
+        Raises
+        ------
+        ArchiveMissError
+            Raises when the page is not in the archive in offline mode.
+        """
+        if self._offline:
+            assert self._archive is not None  # nosec
+            text = self._archive.get(endpoint, params)
+            if text is None:
+                raise ArchiveMissError(f"{endpoint} {params} is not in the archive")
+            return Page(
+                text=text, status=200, etag=None, last_modified=None, from_cache=True
+            )
+        if self._cache is not None and not refresh:
+            page = self._cache.get(endpoint, params)
+            self._metrics.increment(
+                "utcc_cache_requests_total",
+                endpoint=endpoint,
+                result="miss" if page is None else "hit",
+            )
+            self._metrics.set("utcc_cache_hit_ratio", self._cache.stats.hit_ratio)
+            if page is not None:
+                if self._archive is not None:
+                    self._archive.put(endpoint, params, page.text)
+                return page
+        self._check_client()
+        if self.session is None:
             raise RuntimeError("__aenter__ not called")
 
-    async def fetch_search(self, params: SearchParams, page: int = 1) -> SearchResult:
+        url = self._base_url + endpoint
+        kwargs: dict[str, Any] = {"params": params, "headers": headers}
+        if refresh and isinstance(self.session, CachedSession):
+            # neither read nor write the cache
+            kwargs["expire_after"] = 0
+        cached = not refresh and await self._is_cached(url, params)
+        waited = 0.0
+        probing = False
+        recorded = False
+        try:
+            if not cached:
+                await self._retry_policy.before_request()
+                # may be the probe of a half-open circuit, released in finally
+                # unless an outcome is recorded
+                probing = True
+                self._metrics.set(
+                    "utcc_rate_limit_waiting", self._rate_limitter.waiting
+                )
+                waited = await self._rate_limitter.wait()
+                self._metrics.observe("utcc_rate_limit_wait_seconds", waited)
+                self._metrics.set("utcc_rate_limit_rate", self._rate_limitter.rate)
+            start = time.monotonic()
+            try:
+                async with self.session.get(url, **kwargs) as response:
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._retry_policy.record(False)
+                recorded = True
+                raise
+            latency = time.monotonic() - start
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            from_cache = getattr(response, "from_cache", False)
+            if from_cache:
+                # e.g. cached by a concurrent request in the meantime
+                if not cached:
+                    self._rate_limitter.refund()
+            else:
+                if cached:
+                    # expired or evicted in the meantime
+                    self._rate_limitter.charge()
+                self._rate_limitter.record(latency, response.status)
+                self._retry_policy.record(
+                    response.status not in RETRYABLE_STATUSES,
+                    retry_after if response.status in (429, 503) else None,
+                )
+                recorded = True
+        finally:
+            if probing and not recorded:
+                # let another request probe
+                self._retry_policy.record(None)
+        if not from_cache:
+            breaker = self._retry_policy.breaker
+            if breaker is not None:
+                self._metrics.set(
+                    "utcc_circuit_open", breaker.state is not CircuitState.closed
+                )
+            self._metrics.observe("utcc_request_seconds", latency, endpoint=endpoint)
+            self._metrics.increment(
+                "utcc_requests_total", endpoint=endpoint, status=response.status
+            )
+            self._logger.debug(
+                f"GET {endpoint} {response.status} in {latency:.3f}s",
+                extra={
+                    "event": "request",
+                    "endpoint": endpoint,
+                    "params": params,
+                    "status": response.status,
+                    "seconds": latency,
+                    "waited": waited,
+                },
+            )
+        page = Page(
+            text=text,
+            status=response.status,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            from_cache=from_cache,
+        )
+        if response.status == 200:
+            if self._cache is not None:
+                self._cache.put(endpoint, params, page)
+            if self._archive is not None:
+                self._archive.put(endpoint, params, text)
+        if response.status >= 400:
+            raise HTTPStatusError(endpoint, response.status, retry_after)
+        return page
+
+    async def fetch_search(
+        self, params: SearchParams, page: int = 1, *, refresh: bool = False
+    ) -> SearchResult:
         """Fetch search results from the website.
 
         Parameters
@@ -724,6 +1477,8 @@ class UTCourseCatalog:
             Search parameters.
         page : int, optional
             page number, by default 1
+        refresh : bool, optional
+            Whether to bypass the cache, by default False
 
         Returns
         -------
@@ -736,8 +1491,6 @@ class UTCourseCatalog:
             Raises when failed to parse the website.
         """
         self._check_client()
-        if self.session is None:
-            raise RuntimeError("__aenter__ not called")
         # See: https://github.com/34j/ut-course-catalog-swagger/blob/master/swagger.yaml
 
         # build query
@@ -791,113 +1544,30 @@ class UTCourseCatalog:
             _params["facet"] = str(facet).replace("'", '"').replace(" ", "")
 
         # fetch website
-        await self._rate_limitter.wait()
-        async with self.session.get(BASE_URL + "result", params=_params) as response:
-            # parse website
-            soup = BeautifulSoup(await response.text(), "html.parser")
-
-            # get page info first
-            page_info_element = soup.find(class_="catalog-total-search-result")
-            if not page_info_element:
-                # not found
-                return SearchResult(
-                    items=[],
-                    current_items_count=0,
-                    total_items_count=0,
-                    current_items_first_index=0,
-                    current_items_last_index=0,
-                    current_page=0,
-                    total_pages=0,
-                )
-
-            page_info_text = _format(page_info_element.text)
-            page_info_match: list[str] = re.findall(r"\d+", page_info_text)
-            current_items_first_index = int(page_info_match[0])
-            current_items_last_index = int(page_info_match[1])
-            current_items_count = (
-                current_items_last_index - current_items_first_index + 1
-            )
-            total_items_count = int(page_info_match[2])
-            total_pages = math.ceil(total_items_count / 10)
-
-            def get_items() -> Iterable[SearchResultItem]:
-                """Get search result items."""
-                container = soup.find(
-                    "div", class_="catalog-search-result-card-container"
-                )
-                if container is None:
-                    return
-                if type(container) is not Tag:
-                    raise ParserError(f"container not found: {container}")
-                cards = container.find_all("div", class_="catalog-search-result-card")
-                for card in cards:
-                    cells_parent: Tag = card.find_all(
-                        class_="catalog-search-result-table-row"
-                    )[1]
-                    if not cells_parent:
-                        continue
-
-                    def get_cell(name: str) -> Tag:
-                        cell = cells_parent.find("div", class_=f"{name}-cell")
-                        if type(cell) is not Tag:
-                            raise ParserError(f"cell not found: {name}")
-                        return cell
-
-                    def get_cell_text(name: str) -> str:
-                        cell = get_cell(name)
-                        return _format(cell.text)
-
-                    code_cell = _ensure_found(cells_parent.find(class_="code-cell"))
-                    code_cell_children = list(code_cell.children)
-                    yield SearchResultItem(
-                        ねらい=_format_description(
-                            card.find(
-                                class_="catalog-search-result-card-body-text"
-                            ).text
-                        ),
-                        時間割コード=code_cell_children[1].text,
-                        共通科目コード=CommonCode(code_cell_children[3].text),
-                        コース名=get_cell_text("name"),
-                        教員=get_cell_text("lecturer"),
-                        学期={
-                            Semester(el.text.replace(" ", "").replace("\n", ""))
-                            for el in get_cell("semester").find_all(
-                                class_="catalog-semester-icon"
-                            )
-                        },
-                        曜限=set(_parse_weekday_period(get_cell_text("period"))),
-                    )
-
-            items = list(get_items())
-            if page != total_pages:
-                if len(items) != 10:
-                    raise ParserError("items count is not 10")
-                if len(items) != current_items_count:
-                    raise ParserError("items count is not current_items_count")
-            if page != current_items_first_index // 10 + 1:
-                raise ParserError("page number is not correct")
-
-            return SearchResult(
-                items=list(get_items()),
-                total_items_count=total_items_count,
-                current_items_first_index=current_items_first_index,
-                current_items_last_index=current_items_last_index,
-                current_items_count=current_items_count,
-                total_pages=total_pages,
-                current_page=page,
-            )
+        with self._stage("search"):
+            response = await self._request("result", _params, refresh=refresh)
+        result = await self._parse_page(
+            "result",
+            _params,
+            response.text,
+            self._parser.parse_search,
+            response.text,
+            page,
+        )
+        if self._code_index is not None:
+            self._code_index.add_all(result.items)
+        return result
 
-    async def fetch_detail(
-        self, code: str, year: int = current_fiscal_year()
-    ) -> Details:
+    async def fetch_detail(self, code: str, year: int | None = None) -> Details:
         """Fetch details of a course.
+        Concurrent calls for the same course share one request.
 
         Parameters
         ----------
         code : str
             Course (common) code.
         year : int, optional
-            Year of the course, by default current_fiscal_year().
+            Year of the course, by default current_fiscal_year() at the time of the call.
 
         Returns
         -------
@@ -910,132 +1580,260 @@ class UTCourseCatalog:
             Raises when the parser fails to parse the website.
         """
         self._check_client()
-        if self.session is None:
-            raise RuntimeError("__aenter__ not called")
+        year_ = current_fiscal_year() if year is None else int(year)
+        return await self._detail_flights.do(
+            (code, year_), lambda: self._fetch_detail(code, year_)
+        )
 
-        await self._rate_limitter.wait()
-        async with self.session.get(
-            BASE_URL + "detail", params={"code": code, "year": str(year)}
-        ) as response:
-            """
-            We get information from 3 different types of elements:
-                cells 1: cells in the smallest table in the page.
-                cells 2: cells in the first card.
-                cards: cards.
-            """
-
-            # parse html
-            soup = BeautifulSoup(await response.text(), "html.parser")
-
-            # utility functions to get elements and their text
-            cells1_parent: Tag = soup.find_all(class_="catalog-row")[1]
-
-            def get_cell1(name: str) -> str:
-                class_ = f"{name}-cell"
-                cell = cells1_parent.find("div", class_=class_)
-                if not cell:
-                    raise ParserError(f"Cell {name} not found")
-                return _format(cell.text)
+    async def _fetch_detail(self, code: str, year: int) -> Details:
+        params = {"code": code, "year": str(year)}
+        with self._stage("detail"):
+            response = await self._request("detail", params)
+        details = await self._parse_page(
+            "detail", params, response.text, self._parser.parse_detail, response.text
+        )
+        if self._code_index is not None:
+            self._code_index.add(details.時間割コード, details.共通科目コード)
+        return details
 
-            def get_cell2(index: int) -> str:
-                class_ = f"td{index // 3 + 1}-cell"
-                return _format(soup.find_all(class_=class_)[index % 3].text)
-
-            def get_cards():
-                cards: ResultSet[Tag] = soup.find_all(class_="catalog-page-detail-card")
-                for card in cards:
-                    card_header = card.find(class_="catalog-page-detail-card-header")
-                    if not card_header:
-                        raise ParserError("Card header not found")
-                    title = _format(card_header.text)
-                    card_body = card.find(class_="catalog-page-detail-card-body-pre")
-                    if not card_body:
-                        raise ParserError("card_body not found")
-                    if type(card_body) is not Tag:
-                        raise ParserError("card_body is not Tag")
-                    yield title, card_body
-
-            cards = dict(get_cards())
-
-            def get_card(name: str) -> Tag | None:
-                return cards.get(name, None)
-
-            def get_card_text(name: str) -> str | None:
-                card = get_card(name)
-                if card:
-                    return _format_description(card.text)
-                return None
-
-            code_cell = _ensure_found(cells1_parent.find(class_="code-cell"))
-            code_cell_children = list(code_cell.children)
+    async def fetch_details_many(
+        self,
+        codes: Iterable[str],
+        year: int | None = None,
+        *,
+        max_concurrency: int = 100,
+    ) -> list[Details | Exception]:
+        """Fetch details of many courses.
+        Duplicated codes are fetched once, and requests already in flight
+        (e.g. from concurrent calls of `fetch_detail`) are shared.
 
-            # return the result
-            return Details(
-                時間割コード=code_cell_children[1].text,
-                共通科目コード=CommonCode(code_cell_children[3].text),
-                コース名=get_cell1("name"),
-                教員=get_cell1("lecturer"),
-                学期={
-                    Semester(el.text.replace(" ", "").replace("\n", ""))
-                    for el in cells1_parent.find_all(class_="catalog-semester-icon")
-                },
-                曜限=_parse_weekday_period(get_cell1("period")),
-                教室="N/A",  # get_cell2(0),
-                単位数=Decimal(get_cell2(3)),
-                他学部履修可="不可" not in get_cell2(4),
-                講義使用言語=get_cell2(0),
-                実務経験のある教員による授業科目="YES" in get_cell2(1),
-                開講所属=Faculty.value_of(get_cell2(2)),
-                授業計画=get_card_text("授業計画"),
-                授業の方法=get_card_text("授業の方法"),
-                成績評価方法=get_card_text("成績評価方法"),
-                教科書=get_card_text("教科書"),
-                参考書=get_card_text("参考書"),
-                履修上の注意=get_card_text("履修上の注意"),
-                ねらい=_format(
-                    _ensure_found(
-                        soup.find(class_="catalog-page-detail-lecture-aim")
-                    ).text
-                ),
-            )
+        Parameters
+        ----------
+        codes : Iterable[str]
+            Course (common) codes.
+        year : int, optional
+            Year of the courses, by default current_fiscal_year() at the time of the call.
+        max_concurrency : int, optional
+            Maximum number of concurrent requests, by default 100
+
+        Returns
+        -------
+        list[Union[Details, Exception]]
+            Details of the courses in the order of `codes`,
+            or the exception raised while fetching each of them.
+        """
+        if year is None:
+            year = current_fiscal_year()
+        return await self._fetch_many(
+            lambda code: self.fetch_detail(code, year), codes, max_concurrency
+        )
+
+    async def _fetch_many(
+        self,
+        func: Callable[[str], Awaitable[T]],
+        keys: Iterable[str],
+        max_concurrency: int,
+    ) -> list[T | Exception]:
+        """Call `func` once for each distinct key with bounded concurrency.
+        Returns the results or exceptions in the order of `keys`."""
+        keys = list(keys)
+
+        async def call(key: str) -> tuple[str, T | Exception]:
+            try:
+                return key, await func(key)
+            except Exception as e:
+                return key, e
+
+        results = dict(
+            [
+                x
+                async for x in map_bounded(
+                    call,
+                    dict.fromkeys(keys),
+                    concurrency=max_concurrency,
+                    ordered=False,
+                )
+            ]
+        )
+        return [results[key] for key in keys]
+
+    async def fetch_detail_if_changed(
+        self,
+        code: str,
+        year: int | None = None,
+        fingerprint: Fingerprint | None = None,
+    ) -> tuple[Details | None, Fingerprint]:
+        """Fetch details of a course, bypassing the cache,
+        and parse them only if the page changed since `fingerprint` was taken.
+
+        Parameters
+        ----------
+        code : str
+            Course (common) code.
+        year : int, optional
+            Year of the course, by default current_fiscal_year() at the time of the call.
+        fingerprint : Optional[Fingerprint], optional
+            Fingerprint of the previous page, by default None.
+            Its ETag / Last-Modified are sent as a conditional request.
+
+        Returns
+        -------
+        tuple[Optional[Details], Fingerprint]
+            Details of the course (None if not changed) and the fingerprint of the page.
+        """
+        if year is None:
+            year = current_fiscal_year()
+        params = {"code": code, "year": str(year)}
+        response = await self._request(
+            "detail",
+            params,
+            headers=fingerprint.headers() if fingerprint else None,
+            refresh=True,
+        )
+        if response.status == 304 and fingerprint is not None:
+            return None, fingerprint
+        new_fingerprint = Fingerprint.of(
+            response.text, etag=response.etag, last_modified=response.last_modified
+        )
+        if fingerprint is not None and fingerprint.sha256 == new_fingerprint.sha256:
+            return None, new_fingerprint
+        details = await self._parse_page(
+            "detail", params, response.text, self._parser.parse_detail, response.text
+        )
+        return details, new_fingerprint
 
     async def fetch_common_code(self, 時間割コード: str) -> CommonCode:
         """Fetch common code of a course from its time table code.
+        The code index is looked up first.
 
         Returns
         -------
         CommonCode
             Common code of the course
         """
-        result = await self.fetch_search(SearchParams(keyword=時間割コード))
-        return result.items[0].共通科目コード
+        if self._code_index is not None:
+            common_code = self._code_index.get_common_code(時間割コード)
+            if common_code is not None:
+                return common_code
+
+        async def search() -> CommonCode:
+            result = await self.fetch_search(SearchParams(keyword=時間割コード))
+            for item in result.items:
+                if item.時間割コード == 時間割コード:
+                    return item.共通科目コード
+            return result.items[0].共通科目コード
+
+        return await self._code_flights.do(("common_code", 時間割コード), search)
 
     async def fetch_code(self, 共通科目コード: str) -> str:
         """Fetch time table code of a course from its common code.
+        The code index is looked up first.
 
         Returns
         -------
         str
             Time table code of the course
         """
-        result = await self.fetch_search(SearchParams(keyword=共通科目コード))
-        return result.items[0].時間割コード
+        if self._code_index is not None:
+            code = self._code_index.get_code(共通科目コード)
+            if code is not None:
+                return code
+
+        async def search() -> str:
+            result = await self.fetch_search(SearchParams(keyword=共通科目コード))
+            for item in result.items:
+                if item.共通科目コード == 共通科目コード:
+                    return item.時間割コード
+            return result.items[0].時間割コード
+
+        return await self._code_flights.do(("code", 共通科目コード), search)
+
+    async def fetch_common_codes(
+        self, 時間割コード: Iterable[str], *, max_concurrency: int = 8
+    ) -> list[CommonCode | Exception]:
+        """Fetch common codes of many courses from their time table codes.
+        Only the codes missing from the code index are searched.
+
+        Returns
+        -------
+        list[Union[CommonCode, Exception]]
+            Common codes in the order of `時間割コード`,
+            or the exception raised while fetching each of them.
+        """
+        return await self._fetch_many(self.fetch_common_code, 時間割コード, max_concurrency)
+
+    async def fetch_codes(
+        self, 共通科目コード: Iterable[str], *, max_concurrency: int = 8
+    ) -> list[str | Exception]:
+        """Fetch time table codes of many courses from their common codes.
+        Only the codes missing from the code index are searched.
+
+        Returns
+        -------
+        list[Union[str, Exception]]
+            Time table codes in the order of `共通科目コード`,
+            or the exception raised while fetching each of them.
+        """
+        return await self._fetch_many(self.fetch_code, 共通科目コード, max_concurrency)
 
-    def retry(self, func: WrappedFn) -> WrappedFn:
-        return retry(
-            stop=(stop_after_delay(10) | stop_after_attempt(3)),
-            wait=wait_exponential(multiplier=1, min=4, max=16),
-            before_sleep=before_sleep_log(self._logger, 30),
-        )(func)
+    def _record_failure(
+        self, kind: str, key: str, payload: Any, exception: BaseException
+    ) -> None:
+        """Record a failed fetch to the dead letters, if any."""
+        if self._dead_letters is not None:
+            self._dead_letters.add(
+                kind, key, payload, exception, RetryPolicy.attempts(exception)
+            )
+
+    def _record_success(self, kind: str, key: str) -> None:
+        """Remove a fetched page or course from the dead letters, if any."""
+        if self._dead_letters is not None:
+            self._dead_letters.discard(kind, key)
+
+    def retry(
+        self, func: WrappedAwaitableFn[WrappedFnParam, WrappedFnResult]
+    ) -> WrappedAwaitableFn[WrappedFnParam, WrappedFnResult]:
+        """Decorate `func` to retry it according to `retry_policy`."""
+        name = getattr(func, "__name__", repr(func))
+
+        def before_sleep(attempt: int, exception: BaseException, delay: float) -> None:
+            self._metrics.increment("utcc_retries_total", function=name)
+            self._metrics.set(
+                "utcc_retry_budget_tokens", self._retry_policy.budget.tokens
+            )
+            self._logger.warning(
+                f"Retrying {name} in {delay:.1f}s after attempt {attempt}: "
+                f"{exception!r}",
+                extra={
+                    "event": "retry",
+                    "function": name,
+                    "attempt": attempt,
+                    "seconds": delay,
+                },
+            )
 
-    async def fetch_search_all(
+        return self._retry_policy.wraps(func, before_sleep)
+
+    def fetch_search_all(
         self,
         params: SearchParams,
         *,
         use_tqdm: bool = True,
         on_initial_request: None | (Callable[[SearchResult], Awaitable | None]) = None,
-    ) -> AsyncIterable[SearchResultItem]:
+        ordered: bool = True,
+        max_concurrency: int = 8,
+        limit: int | None = None,
+        journal: CrawlJournal | None = None,
+        refresh: bool = False,
+        years: Iterable[int] | None = None,
+    ) -> CancellableIterator[SearchResultItem]:
         """Fetch all search results by repeatedly calling `fetch_search`.
+        Items are yielded as soon as their page is fetched.
+
+        The pages in flight are cancelled as soon as `limit` items were yielded
+        or the iterator is dropped, e.g. by breaking out of the loop.
+        If the iterator is kept after the loop, close it by `aclose()`
+        or iterate over it in `async with` to cancel them.
 
         Parameters
         ----------
@@ -1045,118 +1843,623 @@ class UTCourseCatalog:
             Whether to use tqdm, by default True
         on_initial_request : Optional[Callable[[SearchResult], Optional[Awaitable]]], optional
             Callback function to be called on the initial request, by default None
+        ordered : bool, optional
+            Whether to yield items in the order of pages, by default True.
+            If False, pages are yielded as soon as they complete.
+        max_concurrency : int, optional
+            Maximum number of pages in flight, by default 8
+        limit : Optional[int], optional
+            Maximum number of items to yield, by default None (all items).
+            Pages which are not needed are not fetched.
+        journal : Optional[CrawlJournal], optional
+            Open journal to record the pages to, by default None.
+            Pages already in the journal are not fetched again.
+        refresh : bool, optional
+            Whether to bypass the cache, by default False
+        years : Optional[Iterable[int]], optional
+            Years of the details fetched from the pages, by default None.
+            A page which could not be fetched is recorded to `dead_letters`
+            once per year, so that `redrive` merges its courses only into
+            the snapshots of those years. If None, it is recorded once for any year.
 
         Returns
         -------
-        AsyncIterable[SearchResultItem]
-            Async iterable of search results
-
-        Yields
-        ------
-        Iterator[AsyncIterable[SearchResultItem]]
-            Async iterable of search results
+        CancellableIterator[SearchResultItem]
+            Async iterator of search results
         """
-        pbar = tqdm(disable=not use_tqdm)
-        result = await self.fetch_search(params)
-        pbar.update()
+        scope = CancelScope()
+        years = None if years is None else tuple(dict.fromkeys(years))
+
+        async def generate() -> AsyncGenerator[SearchResultItem, None]:
+            if limit is not None and limit <= 0:
+                return
+
+            async def fetch_page(page: int) -> SearchResult:
+                if journal is not None and page in journal.pages:
+                    return journal.pages[page]
+                if page == 1:
+                    search = await self.fetch_search(params, page, refresh=refresh)
+                else:
+                    search = await self.retry(self.fetch_search)(
+                        params, page, refresh=refresh
+                    )
+                if journal is not None:
+                    journal.record_page(page, search)
+                return search
 
-        if on_initial_request:
-            await _await_if_future(on_initial_request(result))
+            result = await fetch_page(1)
 
-        for item in result.items:
-            yield item
+            if on_initial_request:
+                await _await_if_future(on_initial_request(result))
 
-        pbar.total = result.total_pages
-        tasks = []
-        for page in range(2, result.total_pages + 1):
+            total_pages = result.total_pages
+            if limit is not None:
+                total_pages = min(total_pages, math.ceil(limit / ITEMS_PER_PAGE))
+            count = 0
 
-            async def inner(page):
+            async def inner(page: int) -> SearchResult | None:
+                self._metrics.add("utcc_in_flight", 1, stage="search")
+                letters = _search_letters(params, page, years)
                 try:
-                    search = await self.retry(self.fetch_search)(params, page)
+                    search = await fetch_page(page)
                 except Exception as e:
+                    for key, payload in letters:
+                        self._record_failure("search", key, payload, e)
+                    self._metrics.increment("utcc_failures_total", endpoint="result")
                     self._logger.exception(e)
-                    self._logger.error(f"Failed to fetch page {page}")
+                    self._logger.error(
+                        f"Failed to fetch page {page}",
+                        extra={"event": "failure", "endpoint": "result", "page": page},
+                    )
                     return None
+                finally:
+                    self._metrics.add("utcc_in_flight", -1, stage="search")
+                for key, _ in letters:
+                    self._record_success("search", key)
                 pbar.update(1)
                 return search
 
-            result_task = create_task(inner(page))
-            tasks.append(result_task)
-        results = await asyncio.gather(*tasks)
-        for result in results:
-            if result:
+            # created only now, so that it is closed by the finally below
+            pbar = tqdm(total=total_pages, initial=1, disable=not use_tqdm)
+            pages = map_bounded(
+                inner,
+                range(2, total_pages + 1),
+                concurrency=max_concurrency,
+                ordered=ordered,
+                scope=scope,
+            )
+            try:
                 for item in result.items:
+                    if limit is not None and count >= limit:
+                        return
+                    count += 1
                     yield item
+                async for search in pages:
+                    if not search:
+                        continue
+                    for item in search.items:
+                        if limit is not None and count >= limit:
+                            return
+                        count += 1
+                        yield item
+            finally:
+                await pages.aclose()
+                pbar.close()
+
+        return CancellableIterator(generate(), scope)
+
+    def iter_search_detail_all_years(
+        self,
+        params: SearchParams,
+        *,
+        years: Iterable[int],
+        use_tqdm: bool = True,
+        on_initial_request: None
+        | (Callable[[SearchResult], Awaitable[None] | None]) = None,
+        on_detail_request: Callable[[Details], Awaitable[None] | None] | None = None,
+        max_concurrency: int = 100,
+        max_search_concurrency: int = 8,
+        ordered: bool = False,
+        journal: CrawlJournal | None = None,
+    ) -> CancellableIterator[tuple[int, Details]]:
+        """Fetch all search results and their details in several years as a pipeline.
+
+        Search results do not depend on the year, so each page is fetched once
+        and the details of each course are fetched for every year.
+        All years share the concurrency limits and the rate limitter.
+        Only the courses in the current search results are found.
+        Courses whose details could not be fetched (e.g. not offered in a year)
+        are logged and skipped.
+        Pages and details in flight are cancelled as in `fetch_search_all`.
+
+        Parameters
+        ----------
+        params : SearchParams
+            Search parameters
+        years : Iterable[int]
+            Years of the courses
+        use_tqdm : bool, optional
+            Whether to use tqdm, by default True
+        on_initial_request : Optional[Callable[[SearchResult], Optional[Awaitable]]], optional
+            Callback function to be called on the initial request, by default None
+        on_detail_request : Optional[Callable[[Details], Optional[Awaitable]]], optional
+            Callback function to be called on each detail, by default None
+        max_concurrency : int, optional
+            Maximum number of details in flight, by default 100
+        max_search_concurrency : int, optional
+            Maximum number of search pages in flight, by default 8
+        ordered : bool, optional
+            Whether to yield details in the order of search results and `years`,
+            by default False
+        journal : Optional[CrawlJournal], optional
+            Open journal to record the pages and details to, by default None.
+            Pages and details already in the journal are not fetched again.
+
+        Returns
+        -------
+        CancellableIterator[tuple[int, Details]]
+            Async iterator of the years and details of the courses
+        """
+        years = list(dict.fromkeys(years))
+        scope = CancelScope()
+
+        async def generate() -> AsyncGenerator[tuple[int, Details], None]:
+            pbar = tqdm(disable=not use_tqdm)
+
+            async def on_initial_request_wrapper(search_result: SearchResult) -> None:
+                pbar.total = search_result.total_items_count * len(years)
+                if on_initial_request:
+                    await _await_if_future(on_initial_request(search_result))
+
+            async def inner(key: tuple[str, int]) -> tuple[int, Details] | None:
+                year = key[1]
+                if journal is not None and key in journal.details:
+                    details = journal.details[key]
+                else:
+                    self._metrics.add("utcc_in_flight", 1, stage="detail")
+                    try:
+                        details = await self.retry(self.fetch_detail)(*key)
+                    except Exception as e:
+                        self._record_failure("detail", f"{key[0]}/{year}", key, e)
+                        self._metrics.increment(
+                            "utcc_failures_total", endpoint="detail"
+                        )
+                        self._logger.error(
+                            e,
+                            extra={
+                                "event": "failure",
+                                "endpoint": "detail",
+                                "code": key[0],
+                                "year": year,
+                            },
+                        )
+                        return None
+                    finally:
+                        self._metrics.add("utcc_in_flight", -1, stage="detail")
+                    self._record_success("detail", f"{key[0]}/{year}")
+                    if journal is not None:
+                        journal.record_detail(details, year)
+                pbar.update()
+                if on_detail_request:
+                    await _await_if_future(on_detail_request(details))
+                return year, details
+
+            items = self.fetch_search_all(
+                params,
+                use_tqdm=use_tqdm,
+                on_initial_request=on_initial_request_wrapper,
+                ordered=ordered,
+                max_concurrency=max_search_concurrency,
+                journal=journal,
+                years=years,
+            )
+            scope.add(items.scope)
+
+            async def keys() -> AsyncIterator[tuple[str, int]]:
+                try:
+                    async for item in items:
+                        for year in years:
+                            yield item.時間割コード, year
+                finally:
+                    await items.aclose()
+
+            results = map_bounded(
+                inner,
+                keys(),
+                concurrency=max_concurrency,
+                ordered=ordered,
+                scope=scope,
+            )
+            try:
+                async for result in results:
+                    if result:
+                        yield result
+            finally:
+                await results.aclose()
+                pbar.close()
+
+        return CancellableIterator(generate(), scope)
+
+    def iter_search_detail_all(
+        self,
+        params: SearchParams,
+        *,
+        year: int | None = None,
+        use_tqdm: bool = True,
+        on_initial_request: None
+        | (Callable[[SearchResult], Awaitable[None] | None]) = None,
+        on_detail_request: Callable[[Details], Awaitable[None] | None] | None = None,
+        max_concurrency: int = 100,
+        max_search_concurrency: int = 8,
+        ordered: bool = False,
+        journal: CrawlJournal | None = None,
+    ) -> CancellableIterator[Details]:
+        """Fetch all search results and their details as a pipeline.
+
+        Details are fetched as soon as the first page of search results arrives,
+        and search results are pulled only when there is room for more details,
+        so at most `max_concurrency` details and `max_search_concurrency` pages
+        are held at any time regardless of the size of the catalog.
+        Courses whose details could not be fetched are logged and skipped.
+        Pages and details in flight are cancelled as in `fetch_search_all`.
+
+        Parameters
+        ----------
+        params : SearchParams
+            Search parameters
+        year : int, optional
+            Year of the course, by default current_fiscal_year() at the time of the call
+        use_tqdm : bool, optional
+            Whether to use tqdm, by default True
+        on_initial_request : Optional[Callable[[SearchResult], Optional[Awaitable]]], optional
+            Callback function to be called on the initial request, by default None
+        on_detail_request : Optional[Callable[[Details], Optional[Awaitable]]], optional
+            Callback function to be called on each detail, by default None
+        max_concurrency : int, optional
+            Maximum number of details in flight, by default 100
+        max_search_concurrency : int, optional
+            Maximum number of search pages in flight, by default 8
+        ordered : bool, optional
+            Whether to yield details in the order of search results, by default False
+        journal : Optional[CrawlJournal], optional
+            Open journal to record the pages and details to, by default None.
+            Pages and details already in the journal are not fetched again.
+
+        Returns
+        -------
+        CancellableIterator[Details]
+            Async iterator of the details of the courses
+        """
+        results = self.iter_search_detail_all_years(
+            params,
+            years=[current_fiscal_year() if year is None else year],
+            use_tqdm=use_tqdm,
+            on_initial_request=on_initial_request,
+            on_detail_request=on_detail_request,
+            max_concurrency=max_concurrency,
+            max_search_concurrency=max_search_concurrency,
+            ordered=ordered,
+            journal=journal,
+        )
+
+        async def generate() -> AsyncGenerator[Details, None]:
+            try:
+                async for _, details in results:
+                    yield details
+            finally:
+                await results.aclose()
+
+        return CancellableIterator(generate(), results.scope)
 
     async def fetch_search_detail_all(
         self,
         params: SearchParams,
         *,
-        year: int = current_fiscal_year(),
+        year: int | None = None,
         use_tqdm: bool = True,
         on_initial_request: None
         | (Callable[[SearchResult], Awaitable[None] | None]) = None,
         on_detail_request: Callable[[Details], Awaitable[None] | None] | None = None,
-    ) -> Iterable[Details]:
+    ) -> list[Details]:
         """Fetch all search results by repeatedly calling `fetch_search` and `fetch_detail`.
+        See `iter_search_detail_all` for a streaming version.
 
         Parameters
         ----------
         params : SearchParams
             Search parameters
         year : int, optional
-            Year of the course, by default current_fiscal_year()
+            Year of the course, by default current_fiscal_year() at the time of the call
         use_tqdm : bool, optional
             Whether to use tqdm, by default True
         on_initial_request : Optional[Callable[[SearchResult], Optional[Awaitable]]], optional
             Callback function to be called on the initial request, by default None
+        on_detail_request : Optional[Callable[[Details], Optional[Awaitable]]], optional
+            Callback function to be called on each detail, by default None
 
         Returns
         -------
-        AsyncIterable[Details]
-            Async iterable of details
+        list[Details]
+            Details of the courses in the order of search results.
+            Courses whose details could not be fetched are logged and left out
+            (they used to be None), so the list can be shorter than the search results.
+            They are recorded to `dead_letters` if specified.
+        """
+        return [
+            details
+            async for details in self.iter_search_detail_all(
+                params,
+                year=year,
+                use_tqdm=use_tqdm,
+                on_initial_request=on_initial_request,
+                on_detail_request=on_detail_request,
+                ordered=True,
+            )
+        ]
 
-        Yields
-        ------
-        Iterator[AsyncIterable[Details]]
-            Async iterable of details
+    async def fetch_search_detail_all_years(
+        self,
+        params: SearchParams,
+        *,
+        years: Iterable[int],
+        use_tqdm: bool = True,
+        max_concurrency: int = 100,
+        journal: CrawlJournal | None = None,
+    ) -> dict[int, list[Details]]:
+        """Fetch all search results and their details in several years.
+        See `iter_search_detail_all_years`.
+
+        Parameters
+        ----------
+        params : SearchParams
+            Search parameters
+        years : Iterable[int]
+            Years of the courses
+        use_tqdm : bool, optional
+            Whether to use tqdm, by default True
+        max_concurrency : int, optional
+            Maximum number of details in flight, by default 100
+        journal : Optional[CrawlJournal], optional
+            Open journal to record the pages and details to, by default None.
+
+        Returns
+        -------
+        dict[int, list[Details]]
+            Details in the order of search results, partitioned by year.
         """
+        years = list(dict.fromkeys(years))
+        result: dict[int, list[Details]] = {year: [] for year in years}
+        async for year, details in self.iter_search_detail_all_years(
+            params,
+            years=years,
+            use_tqdm=use_tqdm,
+            max_concurrency=max_concurrency,
+            ordered=True,
+            journal=journal,
+        ):
+            result[year].append(details)
+        return result
 
-        pbar = tqdm(disable=not use_tqdm)
+    async def fetch_search_detail_all_incremental(
+        self,
+        params: SearchParams,
+        previous: Snapshot,
+        *,
+        use_tqdm: bool = True,
+        max_concurrency: int = 100,
+    ) -> tuple[Snapshot, Delta]:
+        """Fetch all search results and refetch only the details which changed since `previous`.
 
-        async def on_initial_request_wrapper(search_result: SearchResult):
-            pbar.total = search_result.total_items_count
-            if on_initial_request:
-                await _await_if_future(on_initial_request(search_result))
+        Detail pages are requested with the ETag / Last-Modified of `previous`
+        and parsed only if the server reports a change and their content hash differs.
 
-        tasks = []
-        items = [
-            item
-            async for item in self.fetch_search_all(
-                params,
-                use_tqdm=True,
-                on_initial_request=on_initial_request_wrapper,
+        Parameters
+        ----------
+        params : SearchParams
+            Search parameters
+        previous : Snapshot
+            Previous snapshot. Its year is used.
+        use_tqdm : bool, optional
+            Whether to use tqdm, by default True
+        max_concurrency : int, optional
+            Maximum number of details in flight, by default 100
+
+        Returns
+        -------
+        tuple[Snapshot, Delta]
+            Merged snapshot and the difference from `previous`.
+            Courses which failed to be fetched are kept as in `previous`.
+        """
+        year = previous.year
+        snapshot = Snapshot(year=year)
+        added: list[Details] = []
+        changed: list[Details] = []
+        total_items_count = 0
+        pbar = tqdm(disable=not use_tqdm)
+
+        def on_initial_request(search_result: SearchResult) -> None:
+            nonlocal total_items_count
+            total_items_count = search_result.total_items_count
+            pbar.total = total_items_count
+
+        def keep_previous(code: str) -> None:
+            if code in previous.details:
+                snapshot.details[code] = previous.details[code]
+            if code in previous.fingerprints:
+                snapshot.fingerprints[code] = previous.fingerprints[code]
+
+        seen: set[str] = set()
+
+        async def inner(item: SearchResultItem) -> None:
+            code = item.時間割コード
+            seen.add(code)
+            self._metrics.add("utcc_in_flight", 1, stage="detail")
+            # without the previous details an unchanged page cannot be reused,
+            # so fetch and parse it in full
+            fingerprint = (
+                previous.fingerprints.get(code) if code in previous.details else None
             )
+            try:
+                details, fingerprint = await self.retry(self.fetch_detail_if_changed)(
+                    code, year, fingerprint
+                )
+            except Exception as e:
+                self._record_failure("detail", f"{code}/{year}", (code, year), e)
+                self._metrics.increment("utcc_failures_total", endpoint="detail")
+                self._logger.error(
+                    e,
+                    extra={
+                        "event": "failure",
+                        "endpoint": "detail",
+                        "code": code,
+                        "year": year,
+                    },
+                )
+                keep_previous(code)
+                return
+            finally:
+                self._metrics.add("utcc_in_flight", -1, stage="detail")
+            self._record_success("detail", f"{code}/{year}")
+            pbar.update()
+            snapshot.fingerprints[code] = fingerprint
+            if details is None:
+                snapshot.details[code] = previous.details[code]
+                return
+            snapshot.details[code] = details
+            if code not in previous.details:
+                added.append(details)
+            elif previous.details[code] != details:
+                changed.append(details)
+
+        items = self.fetch_search_all(
+            params,
+            use_tqdm=use_tqdm,
+            on_initial_request=on_initial_request,
+            refresh=True,
+            years=[year],
+        )
+        results = map_bounded(inner, items, concurrency=max_concurrency, ordered=False)
+        try:
+            async for _ in results:
+                pass
+        finally:
+            await results.aclose()
+            pbar.close()
+
+        removed = [
+            details for code, details in previous.details.items() if code not in seen
         ]
-        s = asyncio.Semaphore(100)
-        for item in items:
+        if len(seen) < total_items_count:
+            self._logger.warning(
+                "Some search results could not be fetched, "
+                "keeping courses not found instead of removing them"
+            )
+            for details in removed:
+                keep_previous(details.時間割コード)
+            removed = []
+        return snapshot, Delta(added=added, changed=changed, removed=removed)
 
-            async def inner(item):
-                async with s:
-                    try:
-                        details = await self.retry(self.fetch_detail)(item.時間割コード, year)
-                    except Exception as e:
-                        self._logger.error(e)
-                        return None
-                    pbar.update()
-                    if on_detail_request:
-                        await _await_if_future(on_detail_request(details))
-                    return details
+    async def redrive(
+        self,
+        snapshot: Snapshot,
+        *,
+        use_tqdm: bool = True,
+        max_concurrency: int = 100,
+    ) -> Delta:
+        """Fetch the dead letters again and merge them into `snapshot`.
 
-            detail_task = create_task(inner(item))
-            tasks.append(detail_task)
-        results = await asyncio.gather(*tasks)
-        return results
+        Failed search pages of the year of `snapshot` (or of no year) are fetched
+        first, and the courses on them which are not in `snapshot` are fetched
+        together with the failed details of the year of `snapshot`, so that
+        the fingerprints of the snapshot are set as in an incremental crawl.
+        Fetched pages and courses are removed from the dead letters
+        and those which fail again stay with their attempts added up.
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            Snapshot to merge the details into. It is updated in place.
+        use_tqdm : bool, optional
+            Whether to use tqdm, by default True
+        max_concurrency : int, optional
+            Maximum number of details in flight, by default 100
+
+        Returns
+        -------
+        Delta
+            Details added to and changed in `snapshot`. `removed` is always empty.
+
+        Raises
+        ------
+        ValueError
+            Raises when `dead_letters` is not specified.
+        """
+        if self._dead_letters is None:
+            raise ValueError("dead_letters is required to redrive")
+        year = snapshot.year
+        codes = {
+            letter.payload[0]
+            for letter in self._dead_letters.letters("detail")
+            if letter.payload[1] == year
+        }
+        for letter in self._dead_letters.letters("search"):
+            params, page, *letter_year = letter.payload
+            if letter_year and letter_year[0] != year:
+                continue
+            try:
+                search = await self.retry(self.fetch_search)(params, page)
+            except Exception as e:
+                self._record_failure("search", letter.key, letter.payload, e)
+                self._logger.error(e, extra={"event": "failure", "endpoint": "result"})
+                continue
+            self._record_success("search", letter.key)
+            codes.update(
+                item.時間割コード
+                for item in search.items
+                if item.時間割コード not in snapshot.details
+            )
+        added: list[Details] = []
+        changed: list[Details] = []
+        pbar = tqdm(total=len(codes), disable=not use_tqdm)
+
+        async def inner(code: str) -> None:
+            try:
+                details, fingerprint = await self.retry(self.fetch_detail_if_changed)(
+                    code, year
+                )
+            except Exception as e:
+                self._record_failure("detail", f"{code}/{year}", (code, year), e)
+                self._logger.error(
+                    e,
+                    extra={
+                        "event": "failure",
+                        "endpoint": "detail",
+                        "code": code,
+                        "year": year,
+                    },
+                )
+                return
+            self._record_success("detail", f"{code}/{year}")
+            pbar.update()
+            assert details is not None  # nosec
+            previous = snapshot.details.get(code)
+            snapshot.details[code] = details
+            snapshot.fingerprints[code] = fingerprint
+            if previous is None:
+                added.append(details)
+            elif previous != details:
+                changed.append(details)
+
+        results = map_bounded(
+            inner, sorted(codes), concurrency=max_concurrency, ordered=False
+        )
+        try:
+            async for _ in results:
+                pass
+        finally:
+            await results.aclose()
+            pbar.close()
+        return Delta(added=added, changed=changed, removed=[])
 
     def get_filepath(self, params: SearchParams, filename: str | None) -> Path:
         if not filename:
@@ -1171,26 +2474,32 @@ class UTCourseCatalog:
         self,
         params: SearchParams,
         *,
-        year: int = current_fiscal_year(),
+        year: int | None = None,
         filename: str | None = None,
         use_tqdm: bool = True,
         on_initial_request: None | (Callable[[SearchResult], Awaitable | None]) = None,
+        journal: CrawlJournal | str | Path | None = None,
     ) -> Iterable[Details]:
         """Fetch all search results by repeatedly calling `fetch_search` and `fetch_detail` and save them to a PKL file.
         The filename is params.id() + ".pkl" if not specified.
+        If `journal` is specified, progress is recorded to it and an interrupted crawl
+        can be resumed by calling this method again with the same journal.
 
         Parameters
         ----------
         params : SearchParams
             Search parameters
         year : int, optional
-            Year of the course, by default current_fiscal_year()
+            Year of the course, by default current_fiscal_year() at the time of the call
         filename : Optional[str], optional
             Filename to save the results, by default None. If None, the filename is params.id() + ".pkl".
         use_tqdm : bool, optional
             Whether to use tqdm, by default True
         on_initial_request : Optional[Callable[[SearchResult], Optional[Awaitable]]], optional
             Callback function to be called on the initial request, by default None
+        journal : Optional[Union[CrawlJournal, str, Path]], optional
+            Journal (or path to it) to record progress to, by default None.
+            The saved results are assembled from the journal.
 
         Returns
         -------
@@ -1202,17 +2511,35 @@ class UTCourseCatalog:
         Iterator[AsyncIterable[Details]]
             Async iterable of details
         """
+        if year is None:
+            year = current_fiscal_year()
         filepath = self.get_filepath(params, filename)
         self._logger.info(f"Saving to {filepath}")
-        result = await self.fetch_search_detail_all(
-            params,
-            year=year,
-            use_tqdm=use_tqdm,
-            on_initial_request=on_initial_request,
-        )
+        if journal is None:
+            result = await self.fetch_search_detail_all(
+                params,
+                year=year,
+                use_tqdm=use_tqdm,
+                on_initial_request=on_initial_request,
+            )
+        else:
+            if not isinstance(journal, CrawlJournal):
+                journal = CrawlJournal(journal)
+            with journal:
+                journal.start(params, year)
+                async for _ in self.iter_search_detail_all(
+                    params,
+                    year=year,
+                    use_tqdm=use_tqdm,
+                    on_initial_request=on_initial_request,
+                    journal=journal,
+                ):
+                    pass
+                result = journal.get_details()
         try:
-            async with aiofiles.open(filepath, "wb") as f:
-                await f.write(pickle.dumps(result))
+            with self._stage("save"):
+                async with aiofiles.open(filepath, "wb") as f:
+                    await f.write(pickle.dumps(result))
         except Exception as e:
             self._logger.error(e)
             self._logger.error(f"Skipping saving to {filepath}")
@@ -1222,10 +2549,11 @@ class UTCourseCatalog:
         self,
         params: SearchParams,
         *,
-        year: int = current_fiscal_year(),
+        year: int | None = None,
         filename: str | None = None,
         use_tqdm: bool = True,
         on_initial_request: None | (Callable[[SearchResult], Awaitable | None]) = None,
+        journal: CrawlJournal | str | Path | None = None,
     ) -> DataFrame:
         data = await self.fetch_and_save_search_detail_all(
             params,
@@ -1233,6 +2561,7 @@ class UTCourseCatalog:
             use_tqdm=use_tqdm,
             on_initial_request=on_initial_request,
             filename=filename,
+            journal=journal,
         )
         try:
             from .pandas import to_dataframe
@@ -1246,7 +2575,8 @@ class UTCourseCatalog:
             filepath = self.get_filepath(params, filename)
             filepath = filepath.with_suffix(".pandas.pkl")
             self._logger.info(f"Saving to {filepath}")
-            df.to_pickle(filepath.absolute())
+            with self._stage("save"):
+                df.to_pickle(filepath.absolute())
         except Exception as e:
             self._logger.error(e)
             self._logger.error(f"Skipping saving to {filename}")
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import io
+import os
+import pickle  # nosec
+import time
+from datetime import timedelta
+from logging import getLogger
+from pathlib import Path
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    TypeVar,
+)
+
+from typing_extensions import Self
+
+if TYPE_CHECKING:
+    from .ja import Details, SearchParams, SearchResult
+
+LOG = getLogger(__name__)
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Records(Mapping[K, V]):
+    """Keys of the records of a kind with their offsets in the journal.
+    Values are read from the disk on access."""
+
+    def __init__(self, journal: CrawlJournal) -> None:
+        self._journal = journal
+        self._offsets: dict[K, int] = {}
+
+    def __getitem__(self, key: K) -> V:
+        return self._journal._read(self._offsets[key])[-1]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._offsets
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+
+class CrawlJournal:
+    """Append-only journal of the search pages and details fetched in a crawl.
+
+    Records are appended as consecutive pickles and flushed to the disk periodically,
+    so a crawl interrupted at any point can be resumed from the last flush.
+    A partially written record at the end of the file is discarded on open.
+    Only the keys of the records and their offsets in the file are kept in memory,
+    and the records are read from the disk when accessed.
+    """
+
+    path: Path
+    params: SearchParams | None
+    year: int | tuple[int, ...] | None
+    """Year of the crawl, or the years of a multi-year crawl."""
+    pages: Mapping[int, SearchResult]
+    details: Mapping[tuple[str, int], Details]
+    _file: IO[bytes] | None
+    _reader: IO[bytes] | None
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        flush_interval: timedelta | float = 5,
+        flush_every: int = 100,
+        fsync_interval: timedelta | float = 60,
+    ) -> None:
+        """Append-only journal of a crawl.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the journal. Created if it does not exist.
+        flush_interval : Union[timedelta, float], optional
+            Maximum interval between flushes, by default 5 seconds
+        flush_every : int, optional
+            Maximum number of records between flushes, by default 100
+        fsync_interval : Union[timedelta, float], optional
+            Minimum interval between fsyncs, by default 60 seconds.
+            Flushed records survive a crash of the process, and fsync
+            makes them survive a crash of the machine. The journal is always
+            synced on close.
+        """
+        if isinstance(flush_interval, timedelta):
+            flush_interval = flush_interval.total_seconds()
+        if isinstance(fsync_interval, timedelta):
+            fsync_interval = fsync_interval.total_seconds()
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.fsync_interval = fsync_interval
+        self.params = None
+        self.year = None
+        self._pages: _Records[int, SearchResult] = _Records(self)
+        self._details: _Records[tuple[str, int], Details] = _Records(self)
+        self.pages = self._pages
+        self.details = self._details
+        self._file = None
+        self._reader = None
+        self._end = 0
+        self._buffer = bytearray()
+        self._buffered = 0
+        self._last_flush = self._last_fsync = time.monotonic()
+
+    def _apply(self, record: tuple[Any, ...], offset: int) -> None:
+        kind = record[0]
+        if kind == "start":
+            _, self.params, self.year = record
+        elif kind == "page":
+            self._pages._offsets[record[1]] = offset
+        elif kind == "detail":
+            _, year, details = record
+            self._details._offsets[(details.時間割コード, year)] = offset
+        else:
+            raise ValueError(f"Unknown record: {kind}")
+
+    def _read(self, offset: int) -> tuple[Any, ...]:
+        """Read the record at `offset`, which may still be in the buffer."""
+        if self._reader is None:
+            raise RuntimeError("journal is not open")
+        if offset >= self._end:
+            start = offset - self._end
+            return pickle.load(io.BytesIO(self._buffer[start:]))  # nosec
+        self._reader.seek(offset)
+        return pickle.load(self._reader)  # nosec
+
+    def open(self) -> Self:
+        """Load the keys of the existing records and open the journal for appending."""
+        if self._file is not None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        end = 0
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                while True:
+                    try:
+                        record = pickle.load(f)  # nosec
+                    except EOFError:
+                        break
+                    except Exception:
+                        LOG.warning(
+                            f"Discarding a partially written record in {self.path}"
+                        )
+                        break
+                    self._apply(record, end)
+                    end = f.tell()
+        self._file = self.path.open("ab")
+        self._file.truncate(end)
+        self._reader = self.path.open("rb")
+        self._end = end
+        self._last_flush = self._last_fsync = time.monotonic()
+        return self
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self.flush(fsync=True)
+        self._file.close()
+        self._file = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _append(self, record: tuple[Any, ...]) -> None:
+        if self._file is None:
+            raise RuntimeError("journal is not open")
+        self._apply(record, self._end + len(self._buffer))
+        self._buffer += pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._buffered += 1
+        if (
+            self._buffered >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self, *, fsync: bool | None = None) -> None:
+        """Write the buffered records to the disk.
+
+        Parameters
+        ----------
+        fsync : Optional[bool], optional
+            Whether to also fsync the journal, by default None
+            (if `fsync_interval` elapsed since the last fsync)
+        """
+        if self._file is None:
+            raise RuntimeError("journal is not open")
+        now = time.monotonic()
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._end += len(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            if fsync is None:
+                fsync = now - self._last_fsync >= self.fsync_interval
+        if fsync:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+        self._last_flush = now
+
+    @property
+    def years(self) -> tuple[int, ...]:
+        """Years of the crawl."""
+        if self.year is None:
+            return ()
+        if isinstance(self.year, int):
+            return (self.year,)
+        return self.year
+
+    def start(self, params: SearchParams, year: int | Iterable[int]) -> None:
+        """Record the parameters of the crawl, or check them if resuming.
+
+        Parameters
+        ----------
+        params : SearchParams
+            Search parameters.
+        year : Union[int, Iterable[int]]
+            Year of the crawl, or the years of a multi-year crawl.
+
+        Raises
+        ------
+        ValueError
+            Raises when the journal was recorded for different parameters.
+        """
+        if not isinstance(year, int):
+            year = tuple(dict.fromkeys(year))
+        if self.params is None:
+            self._append(("start", params, year))
+            return
+        if self.params.id() != params.id() or self.year != year:
+            raise ValueError(
+                f"{self.path} was recorded for {self.params} in {self.year}, "
+                f"not {params} in {year}"
+            )
+
+    def record_page(self, page: int, result: SearchResult) -> None:
+        self._append(("page", page, result))
+
+    def record_detail(self, details: Details, year: int) -> None:
+        self._append(("detail", year, details))
+
+    def get_details_by_year(self) -> dict[int, list[Details]]:
+        """Details in the journal in the order of search results, partitioned by year."""
+        result: dict[int, list[Details]] = {year: [] for year in self.years}
+        seen = set()
+        for page in sorted(self.pages):
+            for item in self.pages[page].items:
+                for year in self.years:
+                    key = (item.時間割コード, year)
+                    if key in self.details and key not in seen:
+                        seen.add(key)
+                        result[year].append(self.details[key])
+        for key in self.details:
+            if key not in seen:
+                result.setdefault(key[1], []).append(self.details[key])
+        return result
+
+    def get_details(self) -> list[Details]:
+        """Details in the journal in the order of search results, grouped by year."""
+        return [
+            details
+            for details_of_year in self.get_details_by_year().values()
+            for details in details_of_year
+        ]
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from functools import lru_cache
+from typing import Iterable, Union
+
+from .common import Semester
+from .ja import (
+    CommonCode,
+    Details,
+    Faculty,
+    Parser,
+    ParserError,
+    SearchResult,
+    SearchResultItem,
+    _format,
+    _format_description,
+    _parse_weekday_period,
+    _search_result,
+)
+
+try:
+    from lxml import etree
+    from lxml.html import HtmlElement, document_fromstring
+except ImportError as e:  # pragma: no cover
+    raise ImportError(
+        "lxml is required for the lxml parser. "
+        "Install it with `pip install ut-course-catalog[lxml]`."
+    ) from e
+
+_CR = "\ue000"
+"""libxml2 normalizes CR LF to LF, so CRs are escaped to keep the text identical to html.parser."""
+
+Node = Union[HtmlElement, str]
+
+
+@lru_cache(maxsize=None)
+def _xpath(tag: str, class_: str, first: bool) -> etree.XPath:
+    path = (
+        f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')]"
+    )
+    if first:
+        path = f"({path})[1]"
+    return etree.XPath(path)
+
+
+def _find_all(element: HtmlElement, class_: str, tag: str = "*") -> list[HtmlElement]:
+    """Equivalent to `Tag.find_all(tag, class_=class_)` of BeautifulSoup."""
+    return _xpath(tag, class_, False)(element)
+
+
+def _find(element: HtmlElement, class_: str, tag: str = "*") -> HtmlElement | None:
+    """Equivalent to `Tag.find(tag, class_=class_)` of BeautifulSoup."""
+    found = _xpath(tag, class_, True)(element)
+    return found[0] if found else None
+
+
+def _ensure_found(element: HtmlElement | None, name: str) -> HtmlElement:
+    if element is None:
+        raise ParserError(f"{name} not found")
+    return element
+
+
+def _text(node: Node) -> str:
+    if isinstance(node, str):
+        return node.replace(_CR, "\r")
+    return node.text_content().replace(_CR, "\r")
+
+
+def _children(element: HtmlElement) -> list[Node]:
+    """Equivalent to `list(Tag.children)` of BeautifulSoup, which includes text nodes."""
+    children: list[Node] = []
+    if element.text:
+        children.append(element.text)
+    for child in element:
+        children.append(child)
+        if child.tail:
+            children.append(child.tail)
+    return children
+
+
+def _parse(text: str) -> HtmlElement:
+    text = text.replace("\r", _CR)
+    if not text.strip():
+        text = "<html></html>"
+    try:
+        return document_fromstring(text)
+    except ValueError:
+        # str with an encoding declaration
+        return document_fromstring(text.encode())
+    except etree.ParserError as e:
+        raise ParserError(str(e)) from e
+
+
+class LxmlParser(Parser):
+    """Parser using lxml and XPath directly, several times faster than BeautifulSoup."""
+
+    name = "lxml"
+
+    def parse_search(self, text: str, page: int | None = None) -> SearchResult:
+        doc = _parse(text)
+        page_info_element = _find(doc, "catalog-total-search-result")
+        if page_info_element is None:
+            return _search_result(None, [], page)
+
+        def get_items() -> Iterable[SearchResultItem]:
+            container = _find(doc, "catalog-search-result-card-container", "div")
+            if container is None:
+                return
+            for card in _find_all(container, "catalog-search-result-card", "div"):
+                cells_parent = _find_all(card, "catalog-search-result-table-row")[1]
+
+                def get_cell(name: str) -> HtmlElement:
+                    return _ensure_found(
+                        _find(cells_parent, f"{name}-cell", "div"), f"cell {name}"
+                    )
+
+                def get_cell_text(name: str) -> str:
+                    return _format(_text(get_cell(name)))
+
+                code_cell = _ensure_found(_find(cells_parent, "code-cell"), "code-cell")
+                code_cell_children = _children(code_cell)
+                body = _ensure_found(
+                    _find(card, "catalog-search-result-card-body-text"), "body-text"
+                )
+                yield SearchResultItem(
+                    ねらい=_format_description(_text(body)),
+                    時間割コード=_text(code_cell_children[1]),
+                    共通科目コード=CommonCode(_text(code_cell_children[3])),
+                    コース名=get_cell_text("name"),
+                    教員=get_cell_text("lecturer"),
+                    学期={
+                        Semester(_text(el).replace(" ", "").replace("\n", ""))
+                        for el in _find_all(
+                            get_cell("semester"), "catalog-semester-icon"
+                        )
+                    },
+                    曜限=set(_parse_weekday_period(get_cell_text("period"))),
+                )
+
+        return _search_result(
+            _format(_text(page_info_element)), list(get_items()), page
+        )
+
+    def parse_detail(self, text: str) -> Details:
+        doc = _parse(text)
+        cells1_parent = _find_all(doc, "catalog-row")[1]
+
+        def get_cell1(name: str) -> str:
+            cell = _find(cells1_parent, f"{name}-cell", "div")
+            if cell is None:
+                raise ParserError(f"Cell {name} not found")
+            return _format(_text(cell))
+
+        def get_cell2(index: int) -> str:
+            class_ = f"td{index // 3 + 1}-cell"
+            return _format(_text(_find_all(doc, class_)[index % 3]))
+
+        cards: dict[str, HtmlElement] = {}
+        for card in _find_all(doc, "catalog-page-detail-card"):
+            card_header = _find(card, "catalog-page-detail-card-header")
+            if card_header is None:
+                raise ParserError("Card header not found")
+            card_body = _find(card, "catalog-page-detail-card-body-pre")
+            if card_body is None:
+                raise ParserError("card_body not found")
+            cards[_format(_text(card_header))] = card_body
+
+        def get_card_text(name: str) -> str | None:
+            card = cards.get(name, None)
+            if card is not None:
+                return _format_description(_text(card))
+            return None
+
+        code_cell = _ensure_found(_find(cells1_parent, "code-cell"), "code-cell")
+        code_cell_children = _children(code_cell)
+
+        return Details(
+            時間割コード=_text(code_cell_children[1]),
+            共通科目コード=CommonCode(_text(code_cell_children[3])),
+            コース名=get_cell1("name"),
+            教員=get_cell1("lecturer"),
+            学期={
+                Semester(_text(el).replace(" ", "").replace("\n", ""))
+                for el in _find_all(cells1_parent, "catalog-semester-icon")
+            },
+            曜限=_parse_weekday_period(get_cell1("period")),
+            教室="N/A",
+            単位数=Decimal(get_cell2(3)),
+            他学部履修可="不可" not in get_cell2(4),
+            講義使用言語=get_cell2(0),
+            実務経験のある教員による授業科目="YES" in get_cell2(1),
+            開講所属=Faculty.value_of(get_cell2(2)),
+            授業計画=get_card_text("授業計画"),
+            授業の方法=get_card_text("授業の方法"),
+            成績評価方法=get_card_text("成績評価方法"),
+            教科書=get_card_text("教科書"),
+            参考書=get_card_text("参考書"),
+            履修上の注意=get_card_text("履修上の注意"),
+            ねらい=_format(
+                _text(
+                    _ensure_found(
+                        _find(doc, "catalog-page-detail-lecture-aim"), "lecture-aim"
+                    )
+                )
+            ),
+        )
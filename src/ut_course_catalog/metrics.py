@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import IO, Any, AsyncIterator, Iterable, Iterator
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+"""Upper bounds of the buckets of histograms in seconds."""
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Counts of observations in buckets, with their sum."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the `q` quantile."""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative:
+                return bound
+        return 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Registry of counters, gauges and histograms with labels.
+
+    Values are kept in memory and written to the sinks on `flush`.
+    Names follow the conventions of Prometheus: counters end with "_total"
+    and durations are in seconds.
+    """
+
+    def __init__(
+        self,
+        sinks: Iterable[MetricsSink] = (),
+        *,
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Registry of metrics.
+
+        Parameters
+        ----------
+        sinks : Iterable[MetricsSink], optional
+            Sinks to write the metrics to on `flush`, by default ()
+        buckets : Iterable[float], optional
+            Upper bounds of the buckets of histograms, by default DEFAULT_BUCKETS
+        """
+        self.sinks = list(sinks)
+        self.buckets = tuple(buckets)
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.gauges: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+
+    @staticmethod
+    def _labels(labels: dict[str, Any]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add `value` to a counter."""
+        counter = self.counters.setdefault(name, {})
+        key = self._labels(labels)
+        counter[key] = counter.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge."""
+        self.gauges.setdefault(name, {})[self._labels(labels)] = value
+
+    def add(self, name: str, value: float, **labels: Any) -> None:
+        """Add `value` to a gauge, e.g. -1 when an item leaves a queue."""
+        gauge = self.gauges.setdefault(name, {})
+        key = self._labels(labels)
+        gauge[key] = gauge.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Add an observation to a histogram."""
+        histograms = self.histograms.setdefault(name, {})
+        key = self._labels(labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Observe the seconds spent in the block in a histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get(self, name: str, **labels: Any) -> float:
+        """Value of a counter or a gauge, or the count of a histogram. 0 if not found."""
+        key = self._labels(labels)
+        if name in self.histograms:
+            histogram = self.histograms[name].get(key)
+            return histogram.count if histogram is not None else 0
+        return self.counters.get(name, self.gauges.get(name, {})).get(key, 0)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Metrics as a JSON-serializable dict of names to lists of samples."""
+
+        def samples(values: dict[Labels, Any]) -> list[dict[str, Any]]:
+            return [
+                {
+                    "labels": dict(labels),
+                    "value": value.to_dict() if isinstance(value, Histogram) else value,
+                }
+                for labels, value in values.items()
+            ]
+
+        return {
+            name: samples(values)
+            for metrics in (self.counters, self.gauges, self.histograms)
+            for name, values in metrics.items()
+        }
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+
+        def format_labels(labels: Iterable[tuple[str, str]]) -> str:
+            labels = list(labels)
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+        lines = []
+        for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, values in metrics.items():
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        for name, histograms in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in histograms.items():
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    le = format_labels((*labels, ("le", str(bound))))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        """Write the metrics to the sinks."""
+        for sink in self.sinks:
+            sink.emit(self)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+
+class MetricsSink:
+    """Destination of `Metrics.flush`."""
+
+    def emit(self, metrics: Metrics) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JSONLinesSink(MetricsSink):
+    """Appends the metrics as one JSON object per flush."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._file: IO[str] | None = None
+
+    def emit(self, metrics: Metrics) -> None:
+        if self._file is None:
+            self._file = self.path.open("a", encoding="utf-8")
+        record = {"time": time.time(), "metrics": metrics.to_dict()}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class PrometheusTextSink(MetricsSink):
+    """Replaces a file with the metrics in the Prometheus text format,
+    e.g. for the textfile collector of node_exporter."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def emit(self, metrics: Metrics) -> None:
+        temp = self.path.with_name(self.path.name + ".tmp")
+        temp.write_text(metrics.to_prometheus(), encoding="utf-8")
+        os.replace(temp, self.path)
+
+
+@asynccontextmanager
+async def serve_prometheus(
+    metrics: Metrics, *, host: str = "127.0.0.1", port: int = 9100
+) -> AsyncIterator[str]:
+    """Serve the metrics at /metrics in the Prometheus text format.
+
+    Yields
+    ------
+    str
+        URL of the endpoint.
+    """
+    from aiohttp import web
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(
+            text=metrics.to_prometheus(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        yield f"http://{host}:{runner.addresses[0][1]}/metrics"
+    finally:
+        await runner.cleanup()
+
+
+@asynccontextmanager
+async def reporting(
+    metrics: Metrics,
+    *,
+    interval: float = 10,
+    port: int | None = None,
+    host: str = "127.0.0.1",
+) -> AsyncIterator[Metrics]:
+    """Flush the metrics every `interval` seconds and on exit,
+    and serve them at /metrics on `port` if specified."""
+
+    async def flush_periodically() -> None:
+        while True:
+            await asyncio.sleep(interval)
+            metrics.flush()
+
+    task = asyncio.create_task(flush_periodically())
+    try:
+        if port is None:
+            yield metrics
+        else:
+            async with serve_prometheus(metrics, host=host, port=port):
+                yield metrics
+    finally:
+        task.cancel()
+        metrics.flush()
+
+
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats log records as JSON objects including the fields passed as `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(
+            (k, v) for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
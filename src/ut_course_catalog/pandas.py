@@ -1,4 +1,4 @@
-from typing import Iterable, NamedTuple
+from typing import Iterable, Mapping, NamedTuple
 
 import pandas as pd
 
@@ -9,3 +9,10 @@ def to_series(item: NamedTuple) -> pd.Series:
 
 def to_dataframe(items: Iterable[NamedTuple]) -> pd.DataFrame:
     return pd.DataFrame([x._asdict() for x in items if x])
+
+
+def to_dataframe_by_year(items: Mapping[int, Iterable[NamedTuple]]) -> pd.DataFrame:
+    """DataFrame of items partitioned by year, with the year in the "year" column."""
+    return pd.DataFrame(
+        [{"year": year, **x._asdict()} for year, xs in items.items() for x in xs if x]
+    )
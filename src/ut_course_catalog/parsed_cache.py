@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import pickle  # nosec
+import sqlite3
+import zlib
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from typing_extensions import Self
+
+if TYPE_CHECKING:
+    from .ja import Parser
+
+LOG = getLogger(__name__)
+
+
+def _schema() -> str:
+    """Fields of the parsed objects, so that the cache is invalidated when they change."""
+    from .ja import Details, SearchResult, SearchResultItem
+
+    return repr((Details._fields, SearchResult._fields, SearchResultItem._fields))
+
+
+class ParsedCache:
+    """Cache of parsed `Details` and `SearchResult` stored in SQLite.
+
+    Entries are keyed by the endpoint, the query parameters, the hash of the page
+    and the parser, so a hit is returned only for the same page parsed by the same
+    version of the parser. Values are pickled and compressed with zlib.
+    """
+
+    path: Path
+    _connection: sqlite3.Connection | None
+
+    def __init__(self, path: str | Path, *, commit_every: int = 100) -> None:
+        """Cache of parsed objects.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the SQLite database. Created if it does not exist.
+        commit_every : int, optional
+            Number of entries to write before committing, by default 100.
+            Uncommitted entries are committed on close.
+        """
+        self.path = Path(path).expanduser()
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._connection = None
+        self._schema = _schema()
+        self.hits = 0
+        self.misses = 0
+
+    def open(self) -> Self:
+        if self._connection is not None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS parsed (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+        )
+        return self
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        assert self._connection is not None  # nosec
+        return self._connection
+
+    def key(
+        self, endpoint: str, params: dict[str, Any], text: str, parser: Parser
+    ) -> str:
+        """Key of a parsed page."""
+        h = hashlib.sha256()
+        for part in (
+            endpoint,
+            repr(sorted((k, str(v)) for k, v in params.items())),
+            hashlib.sha256(text.encode()).hexdigest(),
+            parser.name,
+            parser.version,
+            self._schema,
+        ):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        """Get a parsed object, or None if not cached."""
+        row = self.connection.execute(
+            "SELECT value FROM parsed WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            value = pickle.loads(zlib.decompress(row[0]))  # nosec
+        except Exception as e:
+            LOG.warning(f"Discarding a broken entry in {self.path}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO parsed VALUES (?, ?)",
+            (key, zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1)),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.connection.commit()
+            self._uncommitted = 0
+
+    def clear(self) -> None:
+        self.connection.execute("DELETE FROM parsed")
+        self.connection.commit()
+        self._uncommitted = 0
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from typing_extensions import Self
+
+from .metrics import Histogram
+
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+"""Upper bounds of the buckets of the event loop lag in seconds."""
+
+
+@dataclass
+class StageProfile:
+    """Time, memory and event loop lag spent in a stage.
+
+    Stages of a crawl overlap, e.g. many details are fetched at once, so
+    `seconds` is the sum over the calls and can exceed the duration of the run.
+    """
+
+    calls: int = 0
+    seconds: float = 0
+    max_seconds: float = 0
+    allocated: int = 0
+    """Net bytes allocated while the stage ran, as traced by tracemalloc."""
+    loop_lag: float = 0
+    """Seconds the event loop was late while the stage was in progress."""
+    max_loop_lag: float = 0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+class Profiler:
+    """Records a CPU profile, memory snapshots and the event loop lag of a run,
+    broken down into stages.
+
+    Use it as a context manager around the run, mark the stages with `stage`
+    (`UTCourseCatalog` marks "search", "detail", "parse" and "save" when it is
+    passed as `profiler`) and monitor the loop with `monitor_loop`. On exit,
+    the following files are written to `directory`:
+
+    - profile.prof: cProfile stats of the whole run, readable by `pstats` and snakeviz.
+      Parsing in a process pool is not included.
+    - memory.snapshot: a tracemalloc snapshot at the end of the run, readable by
+      `tracemalloc.Snapshot.load`, and memory-<stage>.snapshot: the latest
+      snapshot at the end of a stage, taken at most every `snapshot_interval`
+      seconds since taking one blocks the event loop.
+    - stages.json and summary.txt: the per-stage summary.
+    """
+
+    stages: dict[str, StageProfile]
+    loop_lag: Histogram
+    """Observed lags of the event loop in seconds."""
+    max_loop_lag: float
+
+    def __init__(
+        self,
+        directory: str | Path,
+        *,
+        cpu: bool = True,
+        memory: bool = True,
+        frames: int = 1,
+        loop_lag_interval: float = 0.05,
+        snapshot_interval: float = 30,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Profiler of a run.
+
+        Parameters
+        ----------
+        directory : Union[str, Path]
+            Directory to write the artifacts to.
+        cpu : bool, optional
+            Whether to record a cProfile profile, by default True
+        memory : bool, optional
+            Whether to trace memory allocations with tracemalloc, by default True.
+            Tracing slows down the run considerably.
+        frames : int, optional
+            Number of frames stored for each allocation, by default 1
+        loop_lag_interval : float, optional
+            Seconds between checks of the event loop lag, by default 0.05
+        snapshot_interval : float, optional
+            Minimum seconds between memory snapshots of a stage, by default 30
+        clock : Callable[[], float], optional
+            Clock to measure the stages with, by default time.perf_counter
+        """
+        self.directory = Path(directory)
+        self.cpu = cpu
+        self.memory = memory
+        self.frames = frames
+        self.loop_lag_interval = loop_lag_interval
+        self.snapshot_interval = snapshot_interval
+        self.clock = clock
+        self.stages = {}
+        self.loop_lag = Histogram(LOOP_LAG_BUCKETS)
+        self.max_loop_lag = 0.0
+        self._active: dict[str, int] = {}
+        self._snapshot_times: dict[str, float] = {}
+        self._profile: cProfile.Profile | None = None
+        self._started_tracemalloc = False
+        self._start = 0.0
+        self._seconds = 0.0
+
+    @property
+    def tracing(self) -> bool:
+        return self.memory and tracemalloc.is_tracing()
+
+    def start(self) -> Self:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._start = self.clock()
+        return self
+
+    def stop(self) -> None:
+        """Stop profiling and write the artifacts."""
+        self._seconds = self.clock() - self._start
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.directory / "profile.prof")
+        if self.tracing:
+            tracemalloc.take_snapshot().dump(str(self.directory / "memory.snapshot"))
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self.save()
+
+    def __enter__(self) -> Self:
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Attribute the time, allocations and loop lag of the block to a stage."""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageProfile()
+        self._active[name] = self._active.get(name, 0) + 1
+        tracing = self.tracing
+        memory = tracemalloc.get_traced_memory()[0] if tracing else 0
+        start = self.clock()
+        try:
+            yield
+        finally:
+            seconds = self.clock() - start
+            self._active[name] -= 1
+            stage.calls += 1
+            stage.seconds += seconds
+            stage.max_seconds = max(stage.max_seconds, seconds)
+            if tracing and self.tracing:
+                stage.allocated += tracemalloc.get_traced_memory()[0] - memory
+                self._snapshot(name)
+
+    def _snapshot(self, name: str) -> None:
+        now = self.clock()
+        if now - self._snapshot_times.get(name, self._start) < self.snapshot_interval:
+            return
+        self._snapshot_times[name] = now
+        path = self.directory / f"memory-{name}.snapshot"
+        tracemalloc.take_snapshot().dump(str(path))
+
+    def observe_loop_lag(self, lag: float) -> None:
+        """Record a lag of the event loop and attribute it to the active stages."""
+        self.loop_lag.observe(lag)
+        self.max_loop_lag = max(self.max_loop_lag, lag)
+        for name, active in self._active.items():
+            if active:
+                stage = self.stages[name]
+                stage.loop_lag += lag
+                stage.max_loop_lag = max(stage.max_loop_lag, lag)
+
+    @asynccontextmanager
+    async def monitor_loop(self) -> AsyncIterator[None]:
+        """Measure how late the running event loop wakes up a sleeping task
+        while in the block. A blocked loop, e.g. by parsing, delays every request."""
+
+        async def monitor() -> None:
+            while True:
+                start = self.clock()
+                await asyncio.sleep(self.loop_lag_interval)
+                lag = self.clock() - start - self.loop_lag_interval
+                self.observe_loop_lag(max(lag, 0))
+
+        task = asyncio.create_task(monitor())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "seconds": self._seconds,
+            "loop_lag": self.loop_lag.to_dict() | {"max": self.max_loop_lag},
+            "stages": {
+                name: asdict(stage) | {"mean_seconds": stage.mean_seconds}
+                for name, stage in self.stages.items()
+            },
+        }
+
+    def summary(self, top: int = 10) -> str:
+        """Per-stage summary, followed by the `top` functions with the most own time
+        and the `top` lines with the most allocated memory. 0 for only the stages."""
+        lines = [
+            f"{'stage':<10}{'calls':>8}{'total s':>10}{'mean ms':>10}"
+            f"{'max ms':>10}{'alloc MiB':>11}{'lag s':>8}{'max lag ms':>12}"
+        ]
+        for name, stage in self.stages.items():
+            lines.append(
+                f"{name:<10}{stage.calls:>8}{stage.seconds:>10.2f}"
+                f"{stage.mean_seconds * 1000:>10.1f}{stage.max_seconds * 1000:>10.1f}"
+                f"{stage.allocated / 2**20:>11.1f}{stage.loop_lag:>8.2f}"
+                f"{stage.max_loop_lag * 1000:>12.1f}"
+            )
+        run = f"Run: {self._seconds:.2f} s"
+        if self.loop_lag.count:
+            run += (
+                f", event loop lag p50 {self.loop_lag.quantile(0.5) * 1000:g} ms, "
+                f"p99 {self.loop_lag.quantile(0.99) * 1000:g} ms, "
+                f"max {self.max_loop_lag * 1000:.1f} ms ({self.loop_lag.count} checks)"
+            )
+        lines.append(run)
+        profile_path = self.directory / "profile.prof"
+        if top and self.cpu and profile_path.exists():
+            stream = io.StringIO()
+            stats = pstats.Stats(str(profile_path), stream=stream)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+            lines.append(stream.getvalue().strip())
+        snapshot_path = self.directory / "memory.snapshot"
+        if top and self.memory and snapshot_path.exists():
+            snapshot = tracemalloc.Snapshot.load(str(snapshot_path))
+            lines.append("Top allocations:")
+            lines.extend(str(stat) for stat in snapshot.statistics("lineno")[:top])
+        return "\n".join(lines)
+
+    def save(self) -> None:
+        """Write stages.json and summary.txt."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with (self.directory / "stages.json").open("w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        (self.directory / "summary.txt").write_text(self.summary(), encoding="utf-8")
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+from typing import Any, Iterable, Iterator, NamedTuple
+
+from .archive import ArchivedPage, PageArchive, _decompress
+from .ja import Details, Parser, SearchResult, get_parser
+from .snapshot import Fingerprint, Snapshot
+
+
+class ReparseError(NamedTuple):
+    """A page which failed to be parsed."""
+
+    page: ArchivedPage
+    error: str
+
+
+class ReparseResult(NamedTuple):
+    """Result of `reparse_archive`."""
+
+    snapshot: Snapshot
+    search_results: dict[str, SearchResult]
+    """Search results keyed by the query string of the page.
+    Empty unless `search` is True."""
+    errors: list[ReparseError]
+    pages: int
+    seconds: float
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else float("inf")
+
+
+def _parse_chunk(
+    parser: str | Parser, chunk: list[tuple[str, bytes, str]]
+) -> list[Details | SearchResult | str]:
+    """Decompress and parse a chunk of pages. Runs in a worker.
+    Errors are returned as strings so that one bad page does not fail the chunk."""
+    parser = get_parser(parser)
+    results: list[Details | SearchResult | str] = []
+    for endpoint, data, codec in chunk:
+        try:
+            text = _decompress(data, codec).decode()
+            if endpoint == "detail":
+                results.append(parser.parse_detail(text))
+            else:
+                results.append(parser.parse_search(text))
+        except Exception as e:
+            results.append(f"{type(e).__name__}: {e}")
+    return results
+
+
+def _chunked(pages: Iterable[ArchivedPage], size: int) -> Iterator[list[ArchivedPage]]:
+    it = iter(pages)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def reparse_archive(
+    archive: PageArchive,
+    *,
+    year: int | None = None,
+    parser: str | Parser = "html.parser",
+    search: bool = False,
+    workers: int | None = None,
+    chunk_size: int = 64,
+    executor: Executor | None = None,
+) -> ReparseResult:
+    """Parse the archived pages again into a snapshot without accessing the network.
+
+    Compressed pages are read from the archive in the calling process
+    and sent to the workers in chunks, where they are decompressed and parsed.
+
+    Parameters
+    ----------
+    archive : PageArchive
+        Archive to read the pages from.
+    year : Optional[int], optional
+        Year of the detail pages to parse, by default the latest year in the archive.
+    parser : Union[str, Parser], optional
+        Parser backend, by default "html.parser". See `get_parser`.
+    search : bool, optional
+        Whether to parse the search pages as well, by default False
+    workers : Optional[int], optional
+        Number of worker processes, by default the number of CPUs.
+        0 to parse in the calling process. If `executor` is specified,
+        its number of workers, which bounds the chunks in flight.
+    chunk_size : int, optional
+        Number of pages sent to a worker at once, by default 64
+    executor : Optional[Executor], optional
+        Executor to parse the pages in, by default None.
+        The executor is not shut down by this function.
+
+    Returns
+    -------
+    ReparseResult
+        Snapshot of the details, errors and throughput.
+
+    Raises
+    ------
+    ValueError
+        If the archive has no detail pages of the year.
+    """
+    start = time.perf_counter()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    detail_pages = list(archive.iter_pages("detail"))
+    if year is None:
+        if not detail_pages:
+            raise ValueError("No detail pages in the archive")
+        year = max(int(page.params["year"]) for page in detail_pages)
+    pages = [page for page in detail_pages if int(page.params["year"]) == year]
+    if not pages:
+        raise ValueError(f"No detail pages of {year} in the archive")
+    if search:
+        pages += list(archive.iter_pages("result"))
+
+    def read(chunk: list[ArchivedPage]) -> list[tuple[str, bytes, str]]:
+        return [
+            (page.endpoint, *archive.read_compressed(page.digest)) for page in chunk
+        ]
+
+    snapshot = Snapshot(year=year)
+    search_results: dict[str, SearchResult] = {}
+    errors: list[ReparseError] = []
+
+    def collect(
+        chunk: list[ArchivedPage], results: list[Details | SearchResult | str]
+    ) -> None:
+        for page, result in zip(chunk, results):
+            if isinstance(result, str):
+                errors.append(ReparseError(page, result))
+            elif isinstance(result, SearchResult):
+                search_results[
+                    "&".join(f"{k}={v}" for k, v in sorted(page.params.items()))
+                ] = result
+            else:
+                snapshot.details[result.時間割コード] = result
+                snapshot.fingerprints[result.時間割コード] = Fingerprint(page.digest)
+
+    with ExitStack() as stack:
+        if executor is None and workers != 0:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        if executor is None:
+            for chunk in _chunked(pages, chunk_size):
+                collect(chunk, _parse_chunk(parser, read(chunk)))
+        else:
+            # bound the number of chunks in flight to bound the memory usage
+            max_pending = 2 * max(workers, 1)
+            pending: deque[tuple[list[ArchivedPage], Future[Any]]] = deque()
+            for chunk in _chunked(pages, chunk_size):
+                if len(pending) >= max_pending:
+                    done_chunk, future = pending.popleft()
+                    collect(done_chunk, future.result())
+                pending.append(
+                    (chunk, executor.submit(_parse_chunk, parser, read(chunk)))
+                )
+            while pending:
+                done_chunk, future = pending.popleft()
+                collect(done_chunk, future.result())
+
+    return ReparseResult(
+        snapshot=snapshot,
+        search_results=search_results,
+        errors=errors,
+        pages=len(pages),
+        seconds=time.perf_counter() - start,
+    )
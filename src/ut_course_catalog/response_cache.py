@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+from typing_extensions import Self
+
+from .archive import archive_key
+
+if TYPE_CHECKING:
+    from .ja import Page
+
+DEFAULT_CACHE_PATH = "~/.cache/ut_course_catalog/responses.sqlite"
+
+
+@dataclass
+class CacheStats:
+    """Statistics of a `ResponseCache`."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    """Entries found but older than their TTL. Also counted as misses."""
+    stores: int = 0
+    evictions: int = 0
+    """Entries removed from the disk to keep it under the size cap."""
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hits ({self.memory_hits} memory, {self.disk_hits} disk), "
+            f"{self.misses} misses ({self.expired} expired), {self.stores} stores, "
+            f"{self.evictions} evictions"
+        )
+
+
+def _seconds(ttl: timedelta | float | None) -> float | None:
+    if isinstance(ttl, timedelta):
+        return ttl.total_seconds()
+    return ttl
+
+
+class ResponseCache:
+    """Cache of responses of the website with an in-memory LRU tier in front of SQLite.
+
+    Entries expire after a TTL which depends on the endpoint, and the least recently
+    used entries are evicted from the disk when the total size exceeds a cap.
+    """
+
+    path: Path
+    stats: CacheStats
+    _connection: sqlite3.Connection | None
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_CACHE_PATH,
+        *,
+        search_ttl: timedelta | float | None = timedelta(days=1),
+        detail_ttl: timedelta | float | None = timedelta(days=7),
+        max_bytes: int | None = 256 * 1024 * 1024,
+        memory_size: int = 256,
+        commit_every: int = 100,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Tiered cache of responses.
+
+        Parameters
+        ----------
+        path : Union[str, Path], optional
+            Path to the SQLite database, by default "~/.cache/ut_course_catalog/responses.sqlite".
+            Created if it does not exist.
+        search_ttl : Union[timedelta, float, None], optional
+            Time to live of search pages, by default 1 day. None to never expire.
+        detail_ttl : Union[timedelta, float, None], optional
+            Time to live of detail pages, by default 7 days. None to never expire.
+        max_bytes : Optional[int], optional
+            Maximum size of the compressed responses on the disk, by default 256 MiB.
+            None for no limit.
+        memory_size : int, optional
+            Number of responses kept in memory, by default 256
+        commit_every : int, optional
+            Number of writes before committing, by default 100.
+            Uncommitted writes are committed on close.
+        clock : Callable[[], float], optional
+            Wall clock in seconds, by default time.time
+        """
+        self.path = Path(path).expanduser()
+        self.ttl = {"result": _seconds(search_ttl), "detail": _seconds(detail_ttl)}
+        self.max_bytes = max_bytes
+        self.memory_size = memory_size
+        self.commit_every = commit_every
+        self.stats = CacheStats()
+        self._clock = clock
+        self._memory: OrderedDict[str, tuple[Page, float]] = OrderedDict()
+        # access times of memory hits not written to the disk yet
+        self._accessed: dict[str, float] = {}
+        self._connection = None
+        self._size = 0
+        self._uncommitted = 0
+
+    def open(self) -> Self:
+        if self._connection is not None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at
+                ON responses (accessed_at);
+            """
+        )
+        self._size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        return self
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._write_accessed()
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+            self._uncommitted = 0
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        assert self._connection is not None  # nosec
+        return self._connection
+
+    @property
+    def size(self) -> int:
+        """Total size of the compressed responses on the disk in bytes."""
+        if self._connection is None:
+            self.open()
+        return self._size
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _written(self) -> None:
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.connection.commit()
+            self._uncommitted = 0
+
+    def _write_accessed(self) -> None:
+        """Write the access times of memory hits, which `_evict` relies on."""
+        if not self._accessed:
+            return
+        self.connection.executemany(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+            ((accessed_at, key) for key, accessed_at in self._accessed.items()),
+        )
+        self._accessed.clear()
+        self._written()
+
+    def _is_fresh(self, endpoint: str, stored_at: float) -> bool:
+        ttl = self.ttl.get(endpoint)
+        return ttl is None or self._clock() - stored_at < ttl
+
+    def _remember(self, key: str, page: Page, stored_at: float) -> None:
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = (page, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _delete(self, key: str) -> None:
+        self._memory.pop(key, None)
+        self._accessed.pop(key, None)
+        row = self.connection.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= row[0]
+            self._written()
+
+    def get(self, endpoint: str, params: dict[str, Any]) -> Page | None:
+        """Get a fresh cached response, or None if not cached or expired."""
+        from .ja import Page
+
+        key = archive_key(endpoint, params)
+        entry = self._memory.get(key)
+        if entry is not None:
+            page, stored_at = entry
+            if self._is_fresh(endpoint, stored_at):
+                self._memory.move_to_end(key)
+                self._accessed[key] = self._clock()
+                self.stats.memory_hits += 1
+                return page
+        row = self.connection.execute(
+            "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return None
+        body, etag, last_modified, stored_at = row
+        if not self._is_fresh(endpoint, stored_at):
+            self._delete(key)
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+        page = Page(
+            text=zlib.decompress(body).decode(),
+            status=200,
+            etag=etag,
+            last_modified=last_modified,
+            from_cache=True,
+        )
+        self.connection.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (self._clock(), key)
+        )
+        self._written()
+        self._remember(key, page, stored_at)
+        self.stats.disk_hits += 1
+        return page
+
+    def contains(self, endpoint: str, params: dict[str, Any]) -> bool:
+        """Whether a fresh response is cached. Does not affect the statistics."""
+        key = archive_key(endpoint, params)
+        entry = self._memory.get(key)
+        if entry is not None and self._is_fresh(endpoint, entry[1]):
+            return True
+        row = self.connection.execute(
+            "SELECT stored_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None and self._is_fresh(endpoint, row[0])
+
+    def put(self, endpoint: str, params: dict[str, Any], page: Page) -> None:
+        """Cache a response."""
+        key = archive_key(endpoint, params)
+        now = self._clock()
+        body = zlib.compress(page.text.encode(), 1)
+        self._delete(key)
+        self.connection.execute(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, endpoint, body, len(body), page.etag, page.last_modified, now, now),
+        )
+        self._size += len(body)
+        self._written()
+        self._remember(key, page._replace(from_cache=True), now)
+        self.stats.stores += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.max_bytes is None or self._size <= self.max_bytes:
+            return
+        self._write_accessed()
+        rows = self.connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        )
+        evicted = []
+        size = self._size
+        for key, entry_size in rows:
+            if size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            size -= entry_size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        for (key,) in evicted:
+            self._memory.pop(key, None)
+        self._size = size
+        self.stats.evictions += len(evicted)
+        self._written()
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self._accessed.clear()
+        self.connection.execute("DELETE FROM responses")
+        self.connection.commit()
+        self._size = 0
+        self._uncommitted = 0
@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from functools import wraps
+from logging import getLogger
+from typing import Any, Awaitable, Callable, TypeVar
+
+import aiohttp
+
+from .common import WrappedAwaitableFn, WrappedFnParam, WrappedFnResult
+
+T = TypeVar("T")
+
+_logger = getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class HTTPStatusError(Exception):
+    """Raised when the website responds with an error status."""
+
+    def __init__(
+        self, endpoint: str, status: int, retry_after: float | None = None
+    ) -> None:
+        super().__init__(f"GET {endpoint} returned {status}")
+        self.endpoint = endpoint
+        self.status = status
+        self.retry_after = retry_after
+        """Seconds to wait as requested by the Retry-After header, if any."""
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(
+    value: str | None, now: Callable[[], float] = time.time
+) -> float | None:
+    """Seconds to wait from a Retry-After header, either in seconds or an HTTP date.
+    None if missing or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, date.timestamp() - now())
+
+
+class RetryBudget:
+    """Limits retries to a fraction of the successful requests.
+
+    Each successful request deposits `ratio` tokens up to `max_tokens` and
+    each retry withdraws one. When the site is unhealthy, the tokens run out and
+    failed calls fail fast instead of multiplying the load.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 20) -> None:
+        """Budget of retries.
+
+        Parameters
+        ----------
+        ratio : float, optional
+            Retries allowed per successful request, by default 0.1
+        max_tokens : float, optional
+            Maximum number of retries which can be saved up, by default 20.
+            The budget starts full.
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Consume a token for a retry. False if the budget is exhausted."""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitState(Enum):
+    closed = "closed"
+    """Requests are sent."""
+    open = "open"
+    """Requests wait until the reset timeout elapses."""
+    half_open = "half-open"
+    """One probe request is sent, the others wait for its result."""
+
+
+class CircuitBreaker:
+    """Pauses all requests when the error rate of the recent requests spikes.
+
+    The circuit opens when at least `failure_ratio` of the last `window` requests
+    failed. After `reset_timeout` seconds, one probe request is let through:
+    the circuit closes if it succeeds and opens again for twice as long otherwise.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: int = 20,
+        min_calls: int = 10,
+        failure_ratio: float = 0.5,
+        reset_timeout: float = 30,
+        max_reset_timeout: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Circuit breaker.
+
+        Parameters
+        ----------
+        window : int, optional
+            Number of recent requests to compute the error rate of, by default 20
+        min_calls : int, optional
+            Minimum number of requests in the window to open the circuit, by default 10
+        failure_ratio : float, optional
+            Error rate at which the circuit opens, by default 0.5
+        reset_timeout : float, optional
+            Seconds to wait before probing, by default 30
+        max_reset_timeout : float, optional
+            Maximum seconds to wait before probing after failed probes, by default 300
+        clock : Callable[[], float], optional
+            Monotonic clock in seconds, by default time.monotonic
+        """
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._clock = clock
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._state = CircuitState.closed
+        self._open_until = 0.0
+        self._timeout = reset_timeout
+        self._probing = False
+        self._changed: asyncio.Event | None = None
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.open and self._clock() >= self._open_until:
+            return CircuitState.half_open
+        return self._state
+
+    @property
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def _open(self, seconds: float) -> None:
+        if self._state is not CircuitState.open:
+            _logger.warning(
+                f"Circuit opened for {seconds:.1f}s "
+                f"(error rate {self.failure_rate:.0%})",
+                extra={"event": "circuit_open", "seconds": seconds},
+            )
+        self._state = CircuitState.open
+        self._open_until = max(self._open_until, self._clock() + seconds)
+        self._probing = False
+        self._notify()
+
+    def _close(self) -> None:
+        _logger.warning("Circuit closed", extra={"event": "circuit_closed"})
+        self._state = CircuitState.closed
+        self._timeout = self.reset_timeout
+        self._outcomes.clear()
+        self._probing = False
+        self._notify()
+
+    def trip(self, seconds: float) -> None:
+        """Open the circuit for at least `seconds`, e.g. as requested by Retry-After."""
+        self._open(seconds)
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        while True:
+            if self._state is CircuitState.closed:
+                return
+            if self._state is CircuitState.open:
+                delay = self._open_until - self._clock()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                self._state = CircuitState.half_open
+            if not self._probing:
+                self._probing = True
+                return
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            await self._changed.wait()
+
+    def release(self) -> None:
+        """Let another request probe if the probe ended without a result,
+        e.g. when it was cancelled."""
+        if self._state is CircuitState.half_open and self._probing:
+            self._probing = False
+            self._notify()
+
+    def record(self, success: bool) -> None:
+        """Record the result of a request."""
+        if self._state is CircuitState.half_open:
+            if success:
+                self._close()
+            else:
+                self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+                self._open(self._timeout)
+            return
+        if self._state is CircuitState.open:
+            # requests sent before the circuit opened
+            return
+        self._outcomes.append(success)
+        if (
+            len(self._outcomes) >= self.min_calls
+            and self.failure_rate >= self.failure_ratio
+        ):
+            self._open(self._timeout)
+
+
+class RetryPolicy:
+    """Retries failed calls with jittered exponential backoff, shared by all calls
+    of a crawl so that they draw from one `RetryBudget` and one `CircuitBreaker`.
+
+    Only network errors, timeouts and retryable `HTTPStatusError` are retried.
+    The wait before a retry is at least the Retry-After of the response.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = 3,
+        max_delay: float = 120,
+        initial: float = 4,
+        maximum: float = 16,
+        jitter: bool = True,
+        max_retry_after: float = 300,
+        budget: RetryBudget | None = None,
+        breaker: CircuitBreaker | bool = True,
+        retry_on: tuple[type[BaseException], ...] = (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            HTTPStatusError,
+        ),
+        seed: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Policy of retries.
+
+        Parameters
+        ----------
+        max_attempts : int, optional
+            Maximum number of attempts of a call, by default 3
+        max_delay : float, optional
+            Seconds after the first attempt after which a call is not retried,
+            by default 120
+        initial : float, optional
+            Upper bound of the first wait in seconds, by default 4
+        maximum : float, optional
+            Upper bound of any wait in seconds except Retry-After, by default 16
+        jitter : bool, optional
+            Whether to wait a random time between 0 and the exponential backoff
+            ("full jitter") instead of the backoff itself, by default True
+        max_retry_after : float, optional
+            Maximum seconds of Retry-After to honor, by default 300
+        budget : Optional[RetryBudget], optional
+            Budget of retries, by default RetryBudget()
+        breaker : Union[CircuitBreaker, bool], optional
+            Circuit breaker, by default True (a `CircuitBreaker` with the default
+            settings). False to disable.
+        retry_on : tuple[type[BaseException], ...], optional
+            Exceptions to retry, by default network errors, timeouts and
+            `HTTPStatusError` with a retryable status
+        seed : Optional[int], optional
+            Seed of the jitter, by default None
+        clock : Callable[[], float], optional
+            Monotonic clock in seconds, by default time.monotonic
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.max_delay = max_delay
+        self.initial = initial
+        self.maximum = maximum
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.budget = RetryBudget() if budget is None else budget
+        if breaker is True:
+            breaker = CircuitBreaker(clock=clock)
+        self.breaker = None if breaker is False else breaker
+        self.retry_on = retry_on
+        self._rng = random.Random(seed)  # nosec
+        self._clock = clock
+
+    def should_retry(self, exception: BaseException) -> bool:
+        if isinstance(exception, HTTPStatusError) and not exception.retryable:
+            return False
+        return isinstance(exception, self.retry_on)
+
+    def backoff(self, attempt: int, exception: BaseException | None = None) -> float:
+        """Seconds to wait after the `attempt`-th attempt failed with `exception`."""
+        delay = min(self.maximum, self.initial * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = self._rng.uniform(0, delay)
+        retry_after = getattr(exception, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+    @staticmethod
+    def attempts(exception: BaseException) -> int:
+        """Number of attempts which ended with `exception`, 1 if not set by `call`."""
+        return getattr(exception, "attempts", 1)
+
+    async def before_request(self) -> None:
+        """Wait until the circuit breaker lets a request through."""
+        if self.breaker is not None:
+            await self.breaker.acquire()
+
+    def record(self, success: bool | None, retry_after: float | None = None) -> None:
+        """Record the result of a request. None if it ended without a response
+        (e.g. cancelled). Retry-After pauses all requests for that long."""
+        if success:
+            self.budget.deposit()
+        if self.breaker is None:
+            return
+        if success is None:
+            self.breaker.release()
+            return
+        self.breaker.record(success)
+        if retry_after is not None:
+            self.breaker.trip(min(retry_after, self.max_retry_after))
+
+    async def call(
+        self,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+        before_sleep: Callable[[int, BaseException, float], None] | None = None,
+        **kwargs: Any,
+    ) -> T:
+        """Call `func`, retrying it according to this policy.
+
+        Parameters
+        ----------
+        func : Callable[..., Awaitable[T]]
+            Coroutine function to call.
+        before_sleep : Optional[Callable[[int, BaseException, float], None]], optional
+            Called with the attempt, the exception and the seconds to wait
+            before each retry, by default None
+
+        Raises
+        ------
+        Exception
+            The exception of the last attempt, with the number of attempts
+            as its `attempts` attribute.
+        """
+        start = self._clock()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self.backoff(attempt, e)
+                if (
+                    attempt >= self.max_attempts
+                    or not self.should_retry(e)
+                    or self._clock() - start + delay > self.max_delay
+                    or not self.budget.withdraw()
+                ):
+                    e.attempts = attempt  # type: ignore
+                    raise
+                if before_sleep is not None:
+                    before_sleep(attempt, e, delay)
+                await asyncio.sleep(delay)
+
+    def wraps(
+        self,
+        func: WrappedAwaitableFn[WrappedFnParam, WrappedFnResult],
+        before_sleep: Callable[[int, BaseException, float], None] | None = None,
+    ) -> WrappedAwaitableFn[WrappedFnParam, WrappedFnResult]:
+        """Decorate `func` to retry it according to this policy. See `call`."""
+
+        @wraps(func)
+        async def wrapper(
+            *args: WrappedFnParam.args, **kwargs: WrappedFnParam.kwargs
+        ) -> WrappedFnResult:
+            return await self.call(func, *args, before_sleep=before_sleep, **kwargs)
+
+        return wrapper
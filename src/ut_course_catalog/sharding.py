@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import heapq
+import math
+from dataclasses import dataclass, field, replace
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, NamedTuple, Sequence
+
+from .common import Semester, Weekday, map_bounded
+from .ja import (
+    ITEMS_PER_PAGE,
+    Faculty,
+    Institution,
+    SearchParams,
+    SearchResult,
+    SearchResultItem,
+)
+
+if TYPE_CHECKING:
+    from .ja import UTCourseCatalog
+
+LOG = getLogger(__name__)
+
+
+class Dimension(NamedTuple):
+    """Facet of `SearchParams` to split a query by."""
+
+    field: str
+    """Name of the field of `SearchParams`."""
+    values: tuple[Any, ...]
+    unset: Any = None
+    """Value of the field which means that the facet is not specified."""
+    exclusive: bool = True
+    """Whether each course has exactly one of the values. Otherwise the counts of
+    the candidates adding up to the query do not prove that they are disjoint."""
+
+
+DEFAULT_DIMENSIONS: tuple[Dimension, ...] = (
+    Dimension(
+        "課程",
+        (Institution.学部前期課程, Institution.学部後期課程, Institution.大学院),
+        Institution.All,
+    ),
+    Dimension("開講所属", tuple(Faculty)),
+    Dimension("学期", tuple(Semester), exclusive=False),
+    Dimension("曜日", tuple(Weekday)[:6], exclusive=False),
+    Dimension("時限", tuple(range(1, 8)), exclusive=False),
+)
+"""Dimensions tried in order. 課程 and 開講所属 are single-valued, while a course
+can be held in several 学期, 曜日 and 時限, so that splits by them are only
+verified by `check_coverage`."""
+
+
+class Shard(NamedTuple):
+    """Part of a query which can be crawled independently."""
+
+    params: SearchParams
+    total_items_count: int
+
+    @property
+    def pages(self) -> int:
+        return math.ceil(self.total_items_count / ITEMS_PER_PAGE)
+
+    def id(self) -> str:
+        return self.params.id()
+
+
+@dataclass
+class ShardPlan:
+    """Shards of a query."""
+
+    params: SearchParams
+    total_items_count: int
+    shards: list[Shard] = field(default_factory=list)
+    probes: int = 0
+    """Number of search requests sent to plan the shards."""
+    disjoint: bool = True
+    """Whether the probes prove that the shards are disjoint and cover the query.
+    False if a shard was split by a dimension which is not exclusive, in which case
+    `check_coverage` must be run on the crawled shards."""
+
+    @property
+    def covered_items_count(self) -> int:
+        return sum(shard.total_items_count for shard in self.shards)
+
+    @property
+    def exact(self) -> bool:
+        """Whether the shards partition the query according to the probes."""
+        return self.disjoint and self.covered_items_count == self.total_items_count
+
+    def assign(self, workers: int) -> list[list[Shard]]:
+        """Assign the shards to workers so that their numbers of pages are balanced,
+        largest shards first."""
+        bins: list[tuple[int, int, list[Shard]]] = [(0, i, []) for i in range(workers)]
+        for shard in sorted(self.shards, key=lambda x: -x.pages):
+            pages, i, assigned = heapq.heappop(bins)
+            assigned.append(shard)
+            heapq.heappush(bins, (pages + shard.pages, i, assigned))
+        return [assigned for _, _, assigned in sorted(bins, key=lambda x: x[1])]
+
+
+class Coverage(NamedTuple):
+    """Result of checking that crawled shards cover the original query."""
+
+    expected: int
+    """total_items_count of the original query."""
+    found: int
+    """Number of distinct courses found in the shards."""
+    duplicates: int
+    """Number of courses found in more than one shard."""
+    failed: list[Shard]
+    """Shards which could not be crawled."""
+
+    @property
+    def complete(self) -> bool:
+        return not self.failed and self.found >= self.expected
+
+
+async def _probe(catalog: UTCourseCatalog, params: SearchParams) -> int:
+    result = await catalog.retry(catalog.fetch_search)(params)
+    return result.total_items_count
+
+
+async def plan_shards(
+    catalog: UTCourseCatalog,
+    params: SearchParams | None = None,
+    *,
+    max_items: int = 500,
+    dimensions: Sequence[Dimension] = DEFAULT_DIMENSIONS,
+    max_concurrency: int = 8,
+) -> ShardPlan:
+    """Split a query into shards of at most `max_items` items if possible.
+
+    The first page of the query and of each candidate shard is fetched to read
+    `total_items_count`. A query is split by the first dimension whose candidates
+    add up exactly to the query. For an exclusive dimension this shows that they
+    neither overlap nor miss courses. For the others, overlaps may cancel out
+    missed courses, so the plan is marked as not `disjoint` and `check_coverage`
+    must be run on the crawled shards. Candidates are split recursively by the
+    remaining dimensions. A query which cannot be split this way is kept as one
+    shard.
+
+    Parameters
+    ----------
+    catalog : UTCourseCatalog
+        Catalog to probe with.
+    params : Optional[SearchParams], optional
+        Query to split, by default SearchParams()
+    max_items : int, optional
+        Number of items above which a shard is split, by default 500
+    dimensions : Sequence[Dimension], optional
+        Dimensions to try in order, by default DEFAULT_DIMENSIONS
+    max_concurrency : int, optional
+        Maximum number of probes in flight, by default 8
+
+    Returns
+    -------
+    ShardPlan
+        Plan of the shards.
+    """
+    if params is None:
+        params = SearchParams()
+    plan = ShardPlan(params=params, total_items_count=0)
+
+    async def probe(child: SearchParams) -> tuple[SearchParams, int]:
+        plan.probes += 1
+        return child, await _probe(catalog, child)
+
+    async def split(
+        params: SearchParams, total: int, dimensions: Sequence[Dimension]
+    ) -> list[Shard]:
+        if total <= max_items:
+            return [Shard(params, total)]
+        for i, dimension in enumerate(dimensions):
+            if getattr(params, dimension.field) != dimension.unset:
+                continue
+            candidates = [
+                replace(params, **{dimension.field: value})
+                for value in dimension.values
+            ]
+            children = [
+                x
+                async for x in map_bounded(
+                    probe, candidates, concurrency=max_concurrency
+                )
+            ]
+            covered = sum(count for _, count in children)
+            if covered != total:
+                LOG.debug(
+                    f"Not splitting by {dimension.field}: {covered} items "
+                    f"in the candidates, {total} in the query"
+                )
+                continue
+            if not dimension.exclusive:
+                plan.disjoint = False
+            shards = []
+            rest = i + 1
+            for child, count in children:
+                if count:
+                    shards.extend(await split(child, count, dimensions[rest:]))
+            return shards
+        LOG.info(f"Could not split a query with {total} items: {params}")
+        return [Shard(params, total)]
+
+    plan.total_items_count = (await probe(params))[1]
+    plan.shards = await split(params, plan.total_items_count, dimensions)
+    return plan
+
+
+async def iter_shards(
+    catalog: UTCourseCatalog,
+    shards: Iterable[Shard],
+    *,
+    max_concurrency: int = 4,
+    attempts: int = 3,
+) -> AsyncIterator[tuple[Shard, list[SearchResultItem] | Exception]]:
+    """Crawl the search results of shards independently.
+
+    Parameters
+    ----------
+    catalog : UTCourseCatalog
+        Catalog to crawl with.
+    shards : Iterable[Shard]
+        Shards to crawl.
+    max_concurrency : int, optional
+        Maximum number of shards in flight, by default 4
+    attempts : int, optional
+        Number of times to try each shard, by default 3
+
+    Yields
+    ------
+    tuple[Shard, Union[list[SearchResultItem], Exception]]
+        Each shard and its items, or the last exception if all attempts failed,
+        in the order of completion.
+    """
+
+    async def crawl(shard: Shard) -> tuple[Shard, list[SearchResultItem] | Exception]:
+        error: Exception = RuntimeError("no attempts")
+        for attempt in range(attempts):
+            total = 0
+
+            def on_initial_request(result: SearchResult) -> None:
+                nonlocal total
+                total = result.total_items_count
+
+            try:
+                items = [
+                    item
+                    async for item in catalog.fetch_search_all(
+                        shard.params,
+                        use_tqdm=False,
+                        on_initial_request=on_initial_request,
+                    )
+                ]
+                # pages which failed are skipped by fetch_search_all
+                if len(items) < total:
+                    raise RuntimeError(f"Only {len(items)} of {total} items fetched")
+            except Exception as e:
+                LOG.warning(f"Attempt {attempt + 1} of shard {shard.id()} failed: {e}")
+                error = e
+                continue
+            return shard, items
+        return shard, error
+
+    async for result in map_bounded(
+        crawl, shards, concurrency=max_concurrency, ordered=False
+    ):
+        yield result
+
+
+def check_coverage(
+    plan: ShardPlan,
+    results: Iterable[tuple[Shard, list[SearchResultItem] | Exception]],
+) -> Coverage:
+    """Check that the crawled shards cover the original query of the plan.
+
+    Parameters
+    ----------
+    plan : ShardPlan
+        Plan of the shards.
+    results : Iterable[tuple[Shard, Union[list[SearchResultItem], Exception]]]
+        Results of `iter_shards`.
+
+    Returns
+    -------
+    Coverage
+        Coverage of the original query.
+    """
+    seen: set[str] = set()
+    duplicates = 0
+    failed = []
+    for shard, items in results:
+        if isinstance(items, Exception):
+            failed.append(shard)
+            continue
+        for item in items:
+            if item.時間割コード in seen:
+                duplicates += 1
+            seen.add(item.時間割コード)
+    return Coverage(
+        expected=plan.total_items_count,
+        found=len(seen),
+        duplicates=duplicates,
+        failed=failed,
+    )
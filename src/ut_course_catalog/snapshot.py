@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import pickle  # nosec
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Mapping, NamedTuple
+
+if TYPE_CHECKING:
+    from .ja import Details
+
+
+class Fingerprint(NamedTuple):
+    """Fingerprint of a page used to detect changes."""
+
+    sha256: str
+    """SHA-256 of the response text."""
+    etag: str | None = None
+    last_modified: str | None = None
+
+    @classmethod
+    def of(
+        cls, text: str, *, etag: str | None = None, last_modified: str | None = None
+    ) -> Fingerprint:
+        return cls(
+            sha256=hashlib.sha256(text.encode()).hexdigest(),
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def headers(self) -> dict[str, str]:
+        """Headers for a conditional request."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class Delta(NamedTuple):
+    """Difference between two snapshots."""
+
+    added: list[Details]
+    changed: list[Details]
+    """New details of the courses which changed."""
+    removed: list[Details]
+    """Previous details of the courses which no longer exist."""
+
+
+@dataclass
+class Snapshot:
+    """Details of the courses in a year together with the fingerprints of their pages."""
+
+    year: int
+    details: dict[str, Details] = field(default_factory=dict)
+    """Details keyed by 時間割コード."""
+    fingerprints: dict[str, Fingerprint] = field(default_factory=dict)
+    """Fingerprints of the detail pages keyed by 時間割コード."""
+
+    @classmethod
+    def from_details(cls, details: Iterable[Details | None], year: int) -> Snapshot:
+        """Create a snapshot without fingerprints, e.g. from the result of a full download.
+
+        Raises
+        ------
+        TypeError
+            If `details` is the result of a multi-year download
+            (a dict of year to details). Select the year first.
+        """
+        if isinstance(details, Mapping):
+            raise TypeError(
+                "details of several years cannot be a snapshot, select a year first"
+            )
+        return cls(year=year, details={x.時間割コード: x for x in details if x is not None})
+
+    @classmethod
+    def load(cls, path: str | Path, year: int | None = None) -> Snapshot:
+        """Load a snapshot. A pickled list of details is also accepted,
+        and so is a dict of year to details saved by a multi-year download.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the snapshot.
+        year : Optional[int], optional
+            Year of the details if `path` is a list of details,
+            by default current_fiscal_year().
+            Year to take if `path` is a dict of year to details,
+            by default its only year.
+
+        Raises
+        ------
+        ValueError
+            If `path` is a dict of year to details which does not have `year`,
+            or has several years and `year` is not specified.
+        """
+        with Path(path).open("rb") as f:
+            obj = pickle.load(f)  # nosec
+        return cls.from_pickled(obj, year)
+
+    @classmethod
+    def from_pickled(cls, obj: Any, year: int | None = None) -> Snapshot:
+        """Create a snapshot from an object unpickled from a file `load` accepts,
+        e.g. to write the file back in the same format.
+
+        Raises
+        ------
+        ValueError
+            If `obj` is a dict of year to details which does not have `year`,
+            or has several years and `year` is not specified.
+        """
+        if isinstance(obj, cls):
+            return obj
+        if isinstance(obj, Mapping):
+            if year is None and len(obj) == 1:
+                (year,) = obj
+            if year not in obj:
+                raise ValueError(
+                    f"the details of {sorted(obj)} are saved, specify one of the years"
+                )
+            return cls.from_details(obj[year], year)
+        if year is None:
+            from .ja import current_fiscal_year
+
+            year = current_fiscal_year()
+        return cls.from_details(obj, year)
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def to_list(self) -> list[Details]:
+        return list(self.details.values())
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import asyncio
+import html
+import json
+import random
+from collections import Counter
+from typing import Any, NamedTuple, Sequence
+
+from aiohttp import web
+from typing_extensions import Self
+
+from .archive import PageArchive
+from .common import Semester, Weekday
+from .ja import ITEMS_PER_PAGE, Faculty, Institution
+
+_FACULTIES = (
+    (Faculty.教養学部前期課程, "CAS", "教養学部（前期課程）"),
+    (Faculty.理学部, "FSC", "理学部"),
+    (Faculty.工学部, "FEN", "工学部"),
+    (Faculty.文学部, "FLE", "文学部"),
+    (Faculty.経済学部, "FEC", "経済学部"),
+    (Faculty.理学系研究科, "GSC", "理学系研究科"),
+    (Faculty.工学系研究科, "GEN", "工学系研究科"),
+    (Faculty.情報理工学系研究科, "GIF", "情報理工学系研究科"),
+)
+_INSTITUTIONS = {
+    "C": Institution.学部前期課程,
+    "F": Institution.学部後期課程,
+    "G": Institution.大学院,
+}
+_SEMESTERS = (
+    (Semester.S1, Semester.S2),
+    (Semester.A1, Semester.A2),
+    (Semester.S1,),
+    (Semester.S2,),
+    (Semester.A1,),
+    (Semester.A2,),
+    (Semester.W,),
+)
+_WEEKDAYS = "月火水木金土日"
+
+
+class StandInCourse(NamedTuple):
+    """Course served by a `StandInServer`."""
+
+    時間割コード: str
+    共通科目コード: str
+    コース名: str
+    教員: str
+    学期: tuple[Semester, ...]
+    曜限: tuple[tuple[Weekday, int], ...]
+    """Empty for intensive courses."""
+    開講所属: Faculty
+    開講所属名: str
+    """Name of the faculty as shown on the website."""
+    課程: Institution
+    ねらい: str
+
+
+def generate_courses(n: int, *, seed: int = 0) -> list[StandInCourse]:
+    """Generate `n` courses which look like those on the website."""
+    rng = random.Random(seed)  # nosec
+    courses = []
+    for i in range(n):
+        faculty, prefix, faculty_name = rng.choice(_FACULTIES)
+        periods = {
+            (Weekday(rng.randrange(6)), rng.randrange(1, 7))
+            for _ in range(rng.choice((0, 1, 1, 1, 2)))
+        }
+        courses.append(
+            StandInCourse(
+                時間割コード=f"{rng.randrange(10**4):04d}{i:06d}",
+                共通科目コード=f"{prefix}-{rng.choice(('MA', 'PH', 'CS'))}"
+                f"{rng.randrange(1, 7)}{rng.randrange(1000):03d}"
+                f"{rng.choice('LLLSEP')}{rng.choice('1113')}",
+                コース名=f"講義{i}",
+                教員=f"教員 {rng.randrange(200)}",
+                学期=rng.choice(_SEMESTERS),
+                曜限=tuple(sorted(periods)),
+                開講所属=faculty,
+                開講所属名=faculty_name,
+                課程=_INSTITUTIONS[prefix[0]],
+                ねらい=f"講義{i}のねらい。" * rng.randrange(1, 20),
+            )
+        )
+    return courses
+
+
+def _semesters_html(course: StandInCourse) -> str:
+    return "".join(
+        f'<span class="catalog-semester-icon">{s.value}</span>' for s in course.学期
+    )
+
+
+def _periods_text(course: StandInCourse) -> str:
+    if not course.曜限:
+        return "集中"
+    return "、".join(f"{_WEEKDAYS[w]}曜{p}限" for w, p in course.曜限)
+
+
+def _code_cell(course: StandInCourse) -> str:
+    return f"""<div class="code-cell">
+      <div>{course.時間割コード}</div>
+      <div>{course.共通科目コード}</div>
+    </div>
+    <div class="name-cell">{html.escape(course.コース名)}</div>
+    <div class="lecturer-cell">{html.escape(course.教員)}</div>
+    <div class="semester-cell">{_semesters_html(course)}</div>
+    <div class="period-cell">{_periods_text(course)}</div>"""
+
+
+def render_search(courses: Sequence[StandInCourse], page: int) -> str:
+    """HTML of a page of search results."""
+    if not courses:
+        return "<html><body>該当する授業はありません</body></html>"
+    first = (page - 1) * ITEMS_PER_PAGE
+    last = first + ITEMS_PER_PAGE
+    items = courses[first:last]
+    cards = "".join(
+        f"""
+<div class="catalog-search-result-card">
+  <div class="catalog-search-result-table-row">header</div>
+  <div class="catalog-search-result-table-row">
+    {_code_cell(course)}
+  </div>
+  <div class="catalog-search-result-card-body-text">
+    {html.escape(course.ねらい)}
+  </div>
+</div>"""
+        for course in items
+    )
+    return f"""<html><body>
+<div class="catalog-total-search-result">{first + 1} - {first + len(items)} 件 / 全 {len(courses)} 件</div>
+<div class="catalog-search-result-card-container">{cards}
+</div>
+</body></html>"""
+
+
+def render_detail(course: StandInCourse, year: int) -> str:
+    """HTML of the details of a course."""
+    cards = "".join(
+        f"""
+<div class="catalog-page-detail-card">
+  <div class="catalog-page-detail-card-header">{title}</div>
+  <div class="catalog-page-detail-card-body-pre">
+{html.escape(body)}
+  </div>
+</div>"""
+        for title, body in (
+            ("授業計画", f"第1回 {course.コース名} ({year})"),
+            ("成績評価方法", "期末試験 50%、レポート 50%"),
+        )
+    )
+    return f"""<html><body>
+<div class="catalog-row">header</div>
+<div class="catalog-row">
+    {_code_cell(course)}
+</div>
+<div class="catalog-page-detail-lecture-aim">{html.escape(course.ねらい)}</div>
+<div class="td1-cell">日本語</div><div class="td1-cell">NO</div>
+<div class="td1-cell">{course.開講所属名}</div>
+<div class="td2-cell">2</div><div class="td2-cell">可</div><div class="td2-cell">-</div>
+{cards}
+</body></html>"""
+
+
+def _matches(course: StandInCourse, query: Any) -> bool:
+    keyword = query.get("q")
+    if keyword and keyword not in (
+        course.時間割コード,
+        course.共通科目コード,
+        course.コース名,
+    ):
+        return False
+    institution = query.get("type", Institution.All.value)
+    if institution != Institution.All.value and course.課程.value != institution:
+        return False
+    faculty_id = query.get("faculty_id")
+    if faculty_id and course.開講所属.value != int(faculty_id):
+        return False
+    facet = json.loads(query.get("facet", "{}"))
+    semesters = {s.value for s in course.学期}
+    weekdays = {str(w * 100 + 1000) for w, _ in course.曜限}
+    periods = {str(p - 1) for _, p in course.曜限}
+    # facets are AND searches
+    return (
+        semesters.issuperset(facet.get("semester_codes", ()))
+        and weekdays.issuperset(facet.get("wday_codes", ()))
+        and periods.issuperset(facet.get("period_codes", ()))
+    )
+
+
+class StandInServer:
+    """Local aiohttp server which stands in for the catalog website.
+
+    It serves generated courses, or replays the pages recorded in a `PageArchive`,
+    with configurable latency and injected errors. Pass `base_url` to
+    `UTCourseCatalog` to use it.
+    """
+
+    counts: Counter[str]
+    """Number of requests by endpoint, and of injected errors as "error"."""
+
+    def __init__(
+        self,
+        courses: int | Sequence[StandInCourse] = 1000,
+        *,
+        archive: PageArchive | None = None,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        error_status: int = 503,
+        retry_after: int | None = None,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """Stand-in for the catalog website.
+
+        Parameters
+        ----------
+        courses : Union[int, Sequence[StandInCourse]], optional
+            Courses to serve, or the number of courses to generate, by default 1000
+        archive : Optional[PageArchive], optional
+            Archive to replay instead of the courses, by default None.
+            Pages not in the archive are answered with 404.
+        latency : float, optional
+            Seconds to wait before each response, by default 0
+        jitter : float, optional
+            Maximum random seconds added to `latency`, by default 0
+        error_rate : float, optional
+            Probability of answering with `error_status`, by default 0
+        error_status : int, optional
+            Status of injected errors, by default 503
+        retry_after : Optional[int], optional
+            Retry-After of injected errors in seconds, by default None
+        seed : int, optional
+            Seed of the generated courses, the jitter and the errors, by default 0
+        host : str, optional
+            Host to listen on, by default "127.0.0.1"
+        port : int, optional
+            Port to listen on, by default 0 (a free port)
+        """
+        if isinstance(courses, int):
+            courses = generate_courses(courses, seed=seed)
+        self.courses = list(courses)
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.counts = Counter()
+        self._rng = random.Random(seed)  # nosec
+        self._by_code = {course.時間割コード: course for course in self.courses}
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        if self._runner is None:
+            raise RuntimeError("The server is not started")
+        return f"http://{self.host}:{self.port}/"
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/result", self._result)
+        app.router.add_get("/detail", self._detail)
+        return app
+
+    async def start(self) -> str:
+        """Start the server and return its base URL."""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def _respond(
+        self, endpoint: str, request: web.Request
+    ) -> web.Response | None:
+        """Count the request, wait and inject errors. None to respond normally."""
+        self.counts[endpoint] += 1
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._rng.random() < self.error_rate:
+            self.counts["error"] += 1
+            headers = {}
+            if self.retry_after is not None:
+                headers["Retry-After"] = str(self.retry_after)
+            return web.Response(
+                status=self.error_status, text="injected error", headers=headers
+            )
+        if self.archive is not None:
+            text = self.archive.get(endpoint, dict(request.query))
+            if text is None:
+                return web.Response(status=404, text="not in the archive")
+            return web.Response(text=text, content_type="text/html")
+        return None
+
+    async def _result(self, request: web.Request) -> web.Response:
+        response = await self._respond("result", request)
+        if response is not None:
+            return response
+        courses = [course for course in self.courses if _matches(course, request.query)]
+        page = int(request.query.get("page", 1))
+        return web.Response(text=render_search(courses, page), content_type="text/html")
+
+    async def _detail(self, request: web.Request) -> web.Response:
+        response = await self._respond("detail", request)
+        if response is not None:
+            return response
+        course = self._by_code.get(request.query.get("code", ""))
+        if course is None:
+            return web.Response(status=404, text="not found")
+        year = int(request.query.get("year", 0))
+        return web.Response(text=render_detail(course, year), content_type="text/html")
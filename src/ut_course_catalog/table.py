@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import sys
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Mapping, Sequence
+
+import numpy as np
+
+from .bitmask import decode_periods, decode_semesters, encode_periods, encode_semesters
+from .ja import CommonCode, Details, Faculty
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DICTIONARY_COLUMNS = (
+    "時間割コード",
+    "共通科目コード",
+    "コース名",
+    "教員",
+    "ねらい",
+    "教室",
+    "単位数",
+    "講義使用言語",
+    "授業計画",
+    "授業の方法",
+    "成績評価方法",
+    "教科書",
+    "参考書",
+    "履修上の注意",
+)
+"""Columns stored as int32 codes into a list of distinct values. -1 is None."""
+BOOL_COLUMNS = ("他学部履修可", "実務経験のある教員による授業科目")
+
+
+class _DictionaryBuilder:
+    """Assigns codes to distinct values, interning strings."""
+
+    def __init__(self) -> None:
+        self.values: list[Any] = []
+        self.index: dict[Any, int] = {}
+        self.codes: list[int] = []
+
+    def append(self, value: Any) -> None:
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            if type(value) is str:
+                value = sys.intern(value)
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+
+class CatalogTable:
+    """Details of many courses stored in columns.
+
+    Strings and credits are dictionary-encoded, so a text which appears in
+    many rows (e.g. the same course in several years) is stored once.
+    Booleans are numpy arrays, 開講所属 is stored as the values of `Faculty`,
+    and the sets 学期 and 曜限 are packed into bitmasks.
+    Rows are decoded into `Details` only when accessed.
+    """
+
+    columns: dict[str, np.ndarray]
+    """Arrays of the columns. Codes for the dictionary-encoded columns."""
+    dictionaries: dict[str, list[Any]]
+    """Distinct values of the dictionary-encoded columns."""
+
+    def __init__(
+        self, columns: dict[str, np.ndarray], dictionaries: dict[str, list[Any]]
+    ) -> None:
+        lengths = {len(array) for array in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Columns have different lengths")
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    @classmethod
+    def from_details(
+        cls, details: Iterable[Details | None], year: int | None = None
+    ) -> CatalogTable:
+        """Table of details. None is skipped.
+
+        Parameters
+        ----------
+        details : Iterable[Optional[Details]]
+            Details of the courses.
+        year : Optional[int], optional
+            Year of the details, stored in the "year" column if specified,
+            by default None
+        """
+        if year is None:
+            return cls._build((None, x) for x in details)
+        return cls._build((year, x) for x in details)
+
+    @classmethod
+    def from_details_by_year(
+        cls, details: Mapping[int, Iterable[Details | None]]
+    ) -> CatalogTable:
+        """Table of details partitioned by year, e.g. of a multi-year download,
+        with the year in the "year" column."""
+        return cls._build((year, x) for year, xs in details.items() for x in xs)
+
+    @classmethod
+    def _build(cls, rows: Iterable[tuple[int | None, Details | None]]) -> CatalogTable:
+        builders = {name: _DictionaryBuilder() for name in DICTIONARY_COLUMNS}
+        bools: dict[str, list[bool]] = {name: [] for name in BOOL_COLUMNS}
+        years: list[int] = []
+        faculties: list[int] = []
+        semesters: list[int] = []
+        periods: list[int] = []
+        for year, details in rows:
+            if details is None:
+                continue
+            if year is not None:
+                years.append(year)
+            for name, builder in builders.items():
+                builder.append(getattr(details, name))
+            for name, values in bools.items():
+                values.append(getattr(details, name))
+            faculties.append(details.開講所属.value)
+            semesters.append(encode_semesters(details.学期))
+            periods.append(encode_periods(details.曜限))
+        columns = {
+            name: np.array(builder.codes, dtype=np.int32)
+            for name, builder in builders.items()
+        }
+        columns.update(
+            (name, np.array(values, dtype=np.bool_)) for name, values in bools.items()
+        )
+        columns["開講所属"] = np.array(faculties, dtype=np.uint8)
+        columns["学期"] = np.array(semesters, dtype=np.uint8)
+        columns["曜限"] = np.array(periods, dtype=np.uint64)
+        if years:
+            if len(years) != len(faculties):
+                raise ValueError("year must be specified for all or none of the rows")
+            columns["year"] = np.array(years, dtype=np.uint16)
+        return cls(
+            columns, {name: builder.values for name, builder in builders.items()}
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns["開講所属"])
+
+    @property
+    def years(self) -> np.ndarray | None:
+        """Years of the rows, or None if the table has no year."""
+        return self.columns.get("year")
+
+    def _value(self, name: str, i: int) -> Any:
+        code = self.columns[name][i]
+        return None if code < 0 else self.dictionaries[name][code]
+
+    def row(self, i: int) -> Details:
+        """Details of the `i`-th row."""
+        if not -len(self) <= i < len(self):
+            raise IndexError("row index out of range")
+        return Details(
+            時間割コード=self._value("時間割コード", i),
+            共通科目コード=CommonCode(self._value("共通科目コード", i)),
+            コース名=self._value("コース名", i),
+            教員=self._value("教員", i),
+            学期=decode_semesters(int(self.columns["学期"][i])),
+            曜限=decode_periods(int(self.columns["曜限"][i])),  # type: ignore
+            ねらい=self._value("ねらい", i),
+            教室=self._value("教室", i),
+            単位数=self._value("単位数", i),
+            他学部履修可=bool(self.columns["他学部履修可"][i]),
+            講義使用言語=self._value("講義使用言語", i),
+            実務経験のある教員による授業科目=bool(self.columns["実務経験のある教員による授業科目"][i]),
+            開講所属=Faculty(int(self.columns["開講所属"][i])),
+            授業計画=self._value("授業計画", i),
+            授業の方法=self._value("授業の方法", i),
+            成績評価方法=self._value("成績評価方法", i),
+            教科書=self._value("教科書", i),
+            参考書=self._value("参考書", i),
+            履修上の注意=self._value("履修上の注意", i),
+        )
+
+    def __getitem__(self, i: int) -> Details:
+        return self.row(i)
+
+    def __iter__(self) -> Iterator[Details]:
+        return (self.row(i) for i in range(len(self)))
+
+    def take(self, indices: Sequence[int] | np.ndarray) -> CatalogTable:
+        """Table of the rows at `indices`, or where a boolean mask is True.
+        The dictionaries are shared with this table."""
+        return CatalogTable(
+            {name: array[indices] for name, array in self.columns.items()},
+            self.dictionaries,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes of the arrays and the distinct values."""
+        return sum(array.nbytes for array in self.columns.values()) + sum(
+            sys.getsizeof(values) + sum(sys.getsizeof(x) for x in values)
+            for values in self.dictionaries.values()
+        )
+
+    def to_pandas(self, *, decode_sets: bool = False) -> pd.DataFrame:
+        """DataFrame of the table.
+
+        Dictionary-encoded strings become categoricals built on the codes,
+        and the other columns wrap the arrays without copying.
+        開講所属 is the values of `Faculty` and 単位数 is float.
+
+        Parameters
+        ----------
+        decode_sets : bool, optional
+            Whether to decode 学期 and 曜限 into sets, by default False
+            (the bitmasks as unsigned integers)
+        """
+        import pandas as pd
+
+        data: dict[str, Any] = {}
+        if "year" in self.columns:
+            data["year"] = self.columns["year"]
+        for name in self.columns:
+            if name == "year":
+                continue
+            array = self.columns[name]
+            if name == "単位数":
+                credits = np.array(
+                    [float(x) for x in self.dictionaries[name]] + [np.nan]
+                )
+                data[name] = credits[array]
+            elif name in self.dictionaries:
+                data[name] = pd.Categorical.from_codes(
+                    array, pd.Index(self.dictionaries[name], dtype=object)
+                )
+            elif decode_sets and name == "学期":
+                data[name] = [decode_semesters(int(x)) for x in array]
+            elif decode_sets and name == "曜限":
+                data[name] = [decode_periods(int(x)) for x in array]
+            else:
+                data[name] = array
+        return pd.DataFrame(data, copy=False)
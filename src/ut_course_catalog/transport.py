@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Iterable
+
+import aiohttp
+
+
+@dataclass
+class TransportConfig:
+    """Settings of the HTTP connection pool, DNS cache and timeouts.
+
+    The defaults are those of aiohttp except `limit_per_host`, since all requests
+    go to one host.
+    """
+
+    limit: int = 100
+    """Maximum number of connections. 0 for no limit."""
+    limit_per_host: int = 16
+    """Maximum number of connections to one host. 0 for no limit."""
+    keepalive_timeout: float | None = 15
+    """Seconds to keep idle connections open. None to close them after each request."""
+    use_dns_cache: bool = True
+    ttl_dns_cache: float | None = 10
+    """Seconds to cache DNS entries. None to cache them forever."""
+    total_timeout: float | None = 300
+    """Seconds for a whole request including reading the body. None for no limit."""
+    connect_timeout: float | None = None
+    """Seconds to acquire a connection from the pool and connect. None for no limit."""
+    read_timeout: float | None = None
+    """Seconds between reads of the socket. None for no limit."""
+    accept_encoding: str | None = None
+    """Accept-Encoding header, e.g. "identity" to disable compression.
+    None for the default of aiohttp."""
+
+    def connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            force_close=self.keepalive_timeout is None,
+            keepalive_timeout=self.keepalive_timeout,  # type: ignore
+            use_dns_cache=self.use_dns_cache,
+            ttl_dns_cache=self.ttl_dns_cache,  # type: ignore
+        )
+
+    def timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout,
+            connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+
+    def create_session(
+        self, trace_configs: Iterable[aiohttp.TraceConfig] = ()
+    ) -> aiohttp.ClientSession:
+        """Create a session with these settings. It must be created in a running loop."""
+        headers = {}
+        if self.accept_encoding is not None:
+            headers["Accept-Encoding"] = self.accept_encoding
+        return aiohttp.ClientSession(
+            connector=self.connector(),
+            timeout=self.timeout(),
+            headers=headers,
+            trace_configs=list(trace_configs),
+        )
+
+
+def _headers_size(headers: Any) -> int:
+    return sum(len(k) + len(v) + 4 for k, v in headers.items()) + 2
+
+
+@dataclass
+class TransportStats:
+    """Counters of the connections and bytes of a session.
+
+    Byte counts are those of HTTP/1.1 messages estimated from the request line,
+    the headers and the body, so they are close to but not exactly the bytes on
+    the wire. Compressed bodies are counted by their Content-Length if present.
+    """
+
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+    bytes_out: int = 0
+    bytes_in: int = 0
+    decoded_bytes_in: int = 0
+    """Bytes of the response bodies after decompression."""
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Fraction of requests which reused a pooled connection."""
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} requests, {self.connections_created} connections "
+            f"opened, {self.connections_reused} reused ({self.reuse_ratio:.1%}), "
+            f"{self.bytes_out} bytes out, {self.bytes_in} bytes in "
+            f"({self.decoded_bytes_in} decoded)"
+        )
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """TraceConfig which updates these counters. Pass it to a ClientSession."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(
+            session: Any, context: SimpleNamespace, params: Any
+        ) -> None:
+            self.requests += 1
+            context.content_length = None
+
+        async def on_connection_create_end(
+            session: Any, context: SimpleNamespace, params: Any
+        ) -> None:
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(
+            session: Any, context: SimpleNamespace, params: Any
+        ) -> None:
+            self.connections_reused += 1
+
+        async def on_dns_cache_hit(
+            session: Any, context: SimpleNamespace, params: Any
+        ) -> None:
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(
+            session: Any, context: SimpleNamespace, params: Any
+        ) -> None:
+            self.dns_cache_misses += 1
+
+        async def on_request_headers_sent(
+            session: Any,
+            context: SimpleNamespace,
+            params: aiohttp.TraceRequestHeadersSentParams,
+        ) -> None:
+            request_line = f"{params.method} {params.url.raw_path_qs} HTTP/1.1\r\n"
+            self.bytes_out += len(request_line) + _headers_size(params.headers)
+
+        async def on_request_chunk_sent(
+            session: Any,
+            context: SimpleNamespace,
+            params: aiohttp.TraceRequestChunkSentParams,
+        ) -> None:
+            self.bytes_out += len(params.chunk)
+
+        async def on_request_end(
+            session: Any,
+            context: SimpleNamespace,
+            params: aiohttp.TraceRequestEndParams,
+        ) -> None:
+            response = params.response
+            self.bytes_in += len(f"HTTP/1.1 {response.status} {response.reason}\r\n")
+            self.bytes_in += _headers_size(response.headers)
+            context.content_length = response.content_length
+            if context.content_length is not None:
+                self.bytes_in += context.content_length
+
+        async def on_response_chunk_received(
+            session: Any,
+            context: SimpleNamespace,
+            params: aiohttp.TraceResponseChunkReceivedParams,
+        ) -> None:
+            self.decoded_bytes_in += len(params.chunk)
+            if getattr(context, "content_length", None) is None:
+                self.bytes_in += len(params.chunk)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        trace_config.on_request_headers_sent.append(on_request_headers_sent)
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        return trace_config
@@ -0,0 +1,545 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import pickle  # nosec
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, NamedTuple
+
+from typing_extensions import Self
+
+from .common import RateLimitter
+
+if TYPE_CHECKING:
+    from .ja import Details, SearchParams, UTCourseCatalog
+    from .sharding import ShardPlan
+
+LOG = getLogger(__name__)
+
+
+class Job(NamedTuple):
+    """Unit of work claimed from a `WorkQueue`."""
+
+    id: int
+    kind: str
+    key: str
+    payload: Any
+    attempts: int
+    """Number of times the job has been claimed, including this one."""
+    lease: str
+    """Token of the claim. Completing or failing a job requires the current token."""
+
+
+def _dumps(value: Any) -> bytes:
+    return zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1)
+
+
+def _loads(value: bytes) -> Any:
+    return pickle.loads(zlib.decompress(value))  # nosec
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease TEXT,
+    leased_until REAL,
+    error TEXT,
+    UNIQUE (kind, key)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, leased_until);
+CREATE TABLE IF NOT EXISTS results (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE TABLE IF NOT EXISTS budget (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    next_at REAL NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """Job table with leases and a result store shared by processes through SQLite.
+
+    The database is in WAL mode, which relies on shared memory, so the processes
+    must run on the same machine and the file must be on a local disk,
+    not on a network filesystem.
+
+    A claimed job is invisible to the other workers until its lease expires,
+    so the jobs of a worker which died are claimed again after the lease.
+    Completing a job stores its result and enqueues its follow-up jobs atomically.
+    The database also holds the next request slot, so that all workers can share
+    one request budget (see `QueueRateLimitter`).
+
+    `claim`, `extend`, `complete`, `fail`, `counts` and `reserve` may wait up to
+    `timeout` for the other processes. They share a connection which can be used
+    from any thread, so that workers can call them off the event loop,
+    e.g. with `asyncio.to_thread`.
+    """
+
+    path: Path
+    _connection: sqlite3.Connection | None
+    _shared_connection: sqlite3.Connection | None
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        lease: timedelta | float = timedelta(minutes=5),
+        max_attempts: int = 3,
+        timeout: float = 30,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Job queue stored in SQLite.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the SQLite database. Created if it does not exist.
+        lease : Union[timedelta, float], optional
+            Time for which a claimed job is hidden from the other workers,
+            by default 5 minutes
+        max_attempts : int, optional
+            Number of claims after which a job is marked as failed, by default 3
+        timeout : float, optional
+            Seconds to wait for the other processes to release the database, by default 30
+        clock : Callable[[], float], optional
+            Wall clock in seconds shared by the workers, by default time.time
+        """
+        if isinstance(lease, timedelta):
+            lease = lease.total_seconds()
+        self.path = Path(path).expanduser()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._clock = clock
+        self._connection = None
+        self._shared_connection = None
+        self._shared_lock = threading.Lock()
+
+    def _connect(self, **kwargs: Any) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # transactions are started explicitly
+        connection = sqlite3.connect(
+            self.path, timeout=self.timeout, isolation_level=None, **kwargs
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def open(self) -> Self:
+        if self._connection is None:
+            self._connection = self._connect()
+        return self
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        with self._shared_lock:
+            if self._shared_connection is not None:
+                self._shared_connection.close()
+                self._shared_connection = None
+
+    def __enter__(self) -> Self:
+        return self.open()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        assert self._connection is not None  # nosec
+        return self._connection
+
+    @contextmanager
+    def _transaction(
+        self, connection: sqlite3.Connection | None = None
+    ) -> Iterator[sqlite3.Connection]:
+        """Write transaction which locks out the other processes until it ends."""
+        if connection is None:
+            connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @contextmanager
+    def _shared(self) -> Iterator[sqlite3.Connection]:
+        """Connection which can be used from any thread, one thread at a time."""
+        with self._shared_lock:
+            if self._shared_connection is None:
+                self._shared_connection = self._connect(check_same_thread=False)
+            yield self._shared_connection
+
+    @contextmanager
+    def _shared_transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._shared() as connection, self._transaction(connection):
+            yield connection
+
+    def put(self, kind: str, key: str, payload: Any) -> bool:
+        """Enqueue a job. Returns False if a job of the same kind and key exists."""
+        return self.put_many([(kind, key, payload)]) == 1
+
+    def put_many(self, jobs: Iterable[tuple[str, str, Any]]) -> int:
+        """Enqueue jobs of (kind, key, payload), skipping existing ones.
+        Returns the number of jobs enqueued."""
+        with self._transaction() as connection:
+            return self._put_many(connection, jobs)
+
+    @staticmethod
+    def _put_many(
+        connection: sqlite3.Connection, jobs: Iterable[tuple[str, str, Any]]
+    ) -> int:
+        before = connection.total_changes
+        connection.executemany(
+            "INSERT OR IGNORE INTO jobs (kind, key, payload) VALUES (?, ?, ?)",
+            ((kind, key, _dumps(payload)) for kind, key, payload in jobs),
+        )
+        return connection.total_changes - before
+
+    def claim(self, worker: str, n: int = 1) -> list[Job]:
+        """Lease up to `n` pending jobs or jobs whose lease expired."""
+        now = self._clock()
+        lease = uuid.uuid4().hex
+        with self._shared_transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = 'failed', error = 'lease expired' "
+                "WHERE state = 'leased' AND leased_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            rows = connection.execute(
+                "SELECT id, kind, key, payload, attempts FROM jobs "
+                "WHERE state = 'pending' OR (state = 'leased' AND leased_until < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, n),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE jobs SET state = 'leased', attempts = attempts + 1, "
+                "worker = ?, lease = ?, leased_until = ? WHERE id = ?",
+                ((worker, lease, now + self.lease, row[0]) for row in rows),
+            )
+        return [
+            Job(id, kind, key, _loads(payload), attempts + 1, lease)
+            for id, kind, key, payload, attempts in rows
+        ]
+
+    def extend(self, jobs: Iterable[Job]) -> int:
+        """Renew the leases of jobs still in progress. Returns the number renewed."""
+        leased_until = self._clock() + self.lease
+        with self._shared_transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "UPDATE jobs SET leased_until = ? "
+                "WHERE id = ? AND lease = ? AND state = 'leased'",
+                ((leased_until, job.id, job.lease) for job in jobs),
+            )
+            return connection.total_changes - before
+
+    def complete(
+        self,
+        job: Job,
+        result: Any,
+        children: Iterable[tuple[str, str, Any]] = (),
+    ) -> bool:
+        """Store the result of a job and enqueue its follow-up jobs.
+
+        Returns False and stores nothing if the lease was lost,
+        in which case another worker has claimed the job.
+        """
+        with self._shared_transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = 'done', leased_until = NULL, error = NULL "
+                "WHERE id = ? AND lease = ? AND state = 'leased'",
+                (job.id, job.lease),
+            )
+            if cursor.rowcount == 0:
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (job.kind, job.key, _dumps(result)),
+            )
+            self._put_many(connection, children)
+        return True
+
+    def fail(self, job: Job, error: BaseException | str) -> bool:
+        """Give a job back to the queue, or mark it as failed after `max_attempts`.
+        Returns False if the lease was lost."""
+        state = "failed" if job.attempts >= self.max_attempts else "pending"
+        with self._shared_transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, leased_until = NULL, error = ? "
+                "WHERE id = ? AND lease = ? AND state = 'leased'",
+                (state, repr(error), job.id, job.lease),
+            )
+            return cursor.rowcount > 0
+
+    def retry_failed(self) -> int:
+        """Move failed jobs back to pending with their attempts reset."""
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0 WHERE state = 'failed'"
+            ).rowcount
+
+    def counts(self) -> dict[str, int]:
+        """Number of jobs in each state: pending, leased, done and failed."""
+        counts = dict.fromkeys(("pending", "leased", "done", "failed"), 0)
+        with self._shared() as connection:
+            counts.update(
+                connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            )
+        return counts
+
+    def failures(self) -> Iterator[tuple[str, str, str]]:
+        """Kind, key and last error of the failed jobs."""
+        yield from self.connection.execute(
+            "SELECT kind, key, error FROM jobs WHERE state = 'failed' ORDER BY id"
+        )
+
+    def results(self, kind: str) -> Iterator[tuple[str, Any]]:
+        """Keys and results of the completed jobs of a kind."""
+        for key, value in self.connection.execute(
+            "SELECT key, value FROM results WHERE kind = ? ORDER BY rowid", (kind,)
+        ):
+            yield key, _loads(value)
+
+    def reserve(self, interval: float) -> float:
+        """Reserve the next request slot of the shared budget.
+
+        It may wait up to `timeout` for the other processes, so call it off
+        the event loop, e.g. with `asyncio.to_thread`.
+
+        Returns
+        -------
+        float
+            Seconds to wait until the reserved slot.
+        """
+        now = self._clock()
+        with self._shared_transaction() as connection:
+            row = connection.execute("SELECT next_at FROM budget").fetchone()
+            slot = now if row is None else max(now, row[0])
+            connection.execute(
+                "INSERT OR REPLACE INTO budget VALUES (0, ?)", (slot + interval,)
+            )
+        return slot - now
+
+
+class QueueRateLimitter(RateLimitter):
+    """`RateLimitter` which also takes a slot of the budget shared through a `WorkQueue`,
+    so that all the workers of the queue together respect `min_interval`."""
+
+    def __init__(
+        self, queue: WorkQueue, min_interval: timedelta | float, **kwargs: Any
+    ) -> None:
+        super().__init__(min_interval, **kwargs)
+        self.queue = queue
+
+    async def wait(self) -> float:
+        waited = await super().wait()
+        # the adapted rate of this worker is shared by all the workers
+        interval = 0 if math.isinf(self.rate) else 1 / self.rate
+        # taking the slot may wait for the lock of the database
+        delay = await asyncio.to_thread(self.queue.reserve, interval)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return waited + delay
+
+
+def search_job(
+    params: SearchParams, page: int, years: Iterable[int]
+) -> tuple[str, str, Any]:
+    """Job to fetch a search page and enqueue the details of its courses in `years`."""
+    return "search", f"{params.id()}/{page}", (params, page, tuple(years))
+
+
+def detail_job(code: str, year: int) -> tuple[str, str, Any]:
+    """Job to fetch the details of a course."""
+    return "detail", f"{code}/{year}", (code, year)
+
+
+def enqueue_crawl(
+    queue: WorkQueue,
+    params: SearchParams | ShardPlan,
+    years: Iterable[int],
+) -> int:
+    """Enqueue the first search page of a query, or of each shard of a plan.
+    The other pages and the details are enqueued by the workers."""
+    from .sharding import ShardPlan
+
+    years = tuple(years)
+    if isinstance(params, ShardPlan):
+        return queue.put_many(
+            search_job(shard.params, 1, years) for shard in params.shards
+        )
+    return queue.put_many([search_job(params, 1, years)])
+
+
+def collect_details(queue: WorkQueue) -> dict[int, list[Details]]:
+    """Details fetched by the workers by year."""
+    result: dict[int, list[Details]] = {}
+    for key, details in queue.results("detail"):
+        year = int(key.rpartition("/")[2])
+        result.setdefault(year, []).append(details)
+    return result
+
+
+@dataclass
+class WorkerStats:
+    """Statistics of a `run_worker` call."""
+
+    completed: int = 0
+    retried: int = 0
+    failed: int = 0
+    lost: int = 0
+    """Jobs whose lease expired before they were completed."""
+
+    def __str__(self) -> str:
+        return (
+            f"{self.completed} completed, {self.retried} retried, "
+            f"{self.failed} failed, {self.lost} lost"
+        )
+
+
+async def _run_job(
+    catalog: UTCourseCatalog, job: Job
+) -> tuple[Any, list[tuple[str, str, Any]]]:
+    from .ja import ITEMS_PER_PAGE
+
+    if job.kind == "search":
+        params, page, years = job.payload
+        result = await catalog.fetch_search(params, page)
+        children = [
+            detail_job(item.時間割コード, year) for item in result.items for year in years
+        ]
+        if page == 1:
+            pages = math.ceil(result.total_items_count / ITEMS_PER_PAGE)
+            children.extend(search_job(params, p, years) for p in range(2, pages + 1))
+        return result, children
+    if job.kind == "detail":
+        code, year = job.payload
+        return await catalog.fetch_detail(code, year), []
+    raise ValueError(f"Unknown job: {job.kind}")
+
+
+async def run_worker(
+    catalog: UTCourseCatalog,
+    queue: WorkQueue,
+    *,
+    name: str | None = None,
+    concurrency: int = 8,
+    poll_interval: float = 1,
+    wait: bool = False,
+) -> WorkerStats:
+    """Claim and run jobs from a queue until it is drained.
+
+    Several workers in different processes on the same machine can share a queue.
+    Results are stored in the queue, so a worker can be stopped at any time;
+    its jobs are claimed again after their leases expire.
+
+    Parameters
+    ----------
+    catalog : UTCourseCatalog
+        Catalog to fetch with. Use `QueueRateLimitter` to share the request budget.
+    queue : WorkQueue
+        Queue to claim jobs from.
+    name : Optional[str], optional
+        Name of the worker, by default "{hostname}:{pid}"
+    concurrency : int, optional
+        Maximum number of jobs in progress, by default 8
+    poll_interval : float, optional
+        Seconds between polls of the queue when no job is available, by default 1
+    wait : bool, optional
+        Whether to keep polling when the queue is drained, by default False
+
+    Returns
+    -------
+    WorkerStats
+        Statistics of the jobs run by this worker.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    stats = WorkerStats()
+    in_flight: dict[asyncio.Task[Any], Job] = {}
+    heartbeat = time.monotonic()
+    try:
+        while True:
+            if len(in_flight) < concurrency:
+                jobs = await asyncio.to_thread(
+                    queue.claim, name, concurrency - len(in_flight)
+                )
+                for job in jobs:
+                    in_flight[asyncio.create_task(_run_job(catalog, job))] = job
+            catalog.metrics.set("utcc_in_flight", len(in_flight), stage="worker")
+            if not in_flight:
+                counts = await asyncio.to_thread(queue.counts)
+                for state, count in counts.items():
+                    catalog.metrics.set("utcc_queue_jobs", count, state=state)
+                if not wait and counts["pending"] == 0 and counts["leased"] == 0:
+                    return stats
+                await asyncio.sleep(poll_interval)
+                continue
+            done, _ = await asyncio.wait(
+                in_flight, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                job = in_flight.pop(task)
+                error = task.exception()
+                if error is not None and not isinstance(error, Exception):
+                    raise error
+                if error is None:
+                    result, children = task.result()
+                    ok = await asyncio.to_thread(queue.complete, job, result, children)
+                else:
+                    LOG.warning(f"{job.kind} {job.key} failed: {error!r}")
+                    ok = await asyncio.to_thread(queue.fail, job, error)
+                if not ok:
+                    LOG.warning(f"Lost the lease of {job.kind} {job.key}")
+                    stats.lost += 1
+                    result = "lost"
+                elif error is None:
+                    stats.completed += 1
+                    result = "completed"
+                elif job.attempts >= queue.max_attempts:
+                    stats.failed += 1
+                    result = "failed"
+                else:
+                    stats.retried += 1
+                    result = "retried"
+                catalog.metrics.increment(
+                    "utcc_jobs_total", kind=job.kind, result=result
+                )
+            if time.monotonic() - heartbeat > queue.lease / 3:
+                await asyncio.to_thread(queue.extend, list(in_flight.values()))
+                heartbeat = time.monotonic()
+                counts = await asyncio.to_thread(queue.counts)
+                for state, count in counts.items():
+                    catalog.metrics.set("utcc_queue_jobs", count, state=state)
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.wait(in_flight)
@@ -0,0 +1,100 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from typing import Optional
+from unittest import IsolatedAsyncioTestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog import ArchiveMissError, PageArchive
+from ut_course_catalog.stand_in import StandInServer
+
+from .test_parser import DETAIL, SEARCH
+from .test_stand_in import create_catalog
+
+
+class TestPageArchive(IsolatedAsyncioTestCase):
+    def test_put_get(self) -> None:
+        with TemporaryDirectory() as d:
+            with PageArchive(d, codec="zlib", segment_size=1) as archive:
+                digest = archive.put(
+                    "detail", {"code": "0505001", "year": 2023}, DETAIL
+                )
+                # same content is stored once
+                self.assertEqual(
+                    archive.put("detail", {"year": "2024", "code": "0505001"}, DETAIL),
+                    digest,
+                )
+                archive.put("result", {"type": "all", "page": 1}, SEARCH)
+            with PageArchive(d) as archive:
+                self.assertEqual(len(archive), 3)
+                self.assertEqual(
+                    archive.get("detail", {"year": "2023", "code": "0505001"}), DETAIL
+                )
+                self.assertEqual(
+                    archive.get("result", {"page": "1", "type": "all"}), SEARCH
+                )
+                self.assertIsNone(archive.get("detail", {"code": "0", "year": 2023}))
+                self.assertEqual(
+                    [page.params for page in archive.iter_pages("detail")],
+                    [
+                        {"code": "0505001", "year": "2023"},
+                        {"code": "0505001", "year": "2024"},
+                    ],
+                )
+                # a new segment is started once the size is exceeded
+                self.assertEqual(
+                    archive.connection.execute(
+                        "SELECT COUNT(DISTINCT segment) FROM blobs"
+                    ).fetchone()[0],
+                    2,
+                )
+
+    async def test_offline(self) -> None:
+        with TemporaryDirectory() as d:
+            with PageArchive(d) as archive:
+                archive.put("detail", {"code": "0505001", "year": "2023"}, DETAIL)
+            async with utcc.UTCourseCatalog(
+                archive=d, offline=True, cache=False
+            ) as catalog:
+                # no index in the home directory unless asked for
+                self.assertIsNone(catalog.code_index)
+                details = await catalog.fetch_detail("0505001", 2023)
+                self.assertEqual(details.時間割コード, "0505001")
+                with self.assertRaises(ArchiveMissError):
+                    await catalog.fetch_detail("0505002", 2023)
+
+    async def test_fetch_details_many(self) -> None:
+        with TemporaryDirectory() as d:
+            with PageArchive(d) as archive:
+                archive.put("detail", {"code": "0505001", "year": "2023"}, DETAIL)
+            async with utcc.UTCourseCatalog(
+                archive=d, offline=True, cache=False
+            ) as catalog:
+                results = await catalog.fetch_details_many(
+                    ["0505001", "0505002", "0505001"], 2023
+                )
+                self.assertIsInstance(results[0], utcc.Details)
+                self.assertIsInstance(results[1], ArchiveMissError)
+                self.assertIs(results[0], results[2])
+
+    async def test_executor(self) -> None:
+        async def crawl(executor: Optional[Executor]) -> list[utcc.Details]:
+            async with utcc.UTCourseCatalog(
+                archive=d, offline=True, cache=False, executor=executor
+            ) as catalog:
+                return await catalog.fetch_search_detail_all(
+                    utcc.SearchParams(), year=2023, use_tqdm=False
+                )
+
+        with TemporaryDirectory() as d:
+            async with StandInServer(15) as server, create_catalog(
+                server, archive=d
+            ) as catalog:
+                await catalog.fetch_search_detail_all(
+                    utcc.SearchParams(), year=2023, use_tqdm=False
+                )
+            expected = await crawl(None)
+            self.assertEqual(len(expected), 15)
+            with ThreadPoolExecutor(2) as executor:
+                self.assertEqual(await crawl(executor), expected)
+            with ProcessPoolExecutor(2) as executor:
+                self.assertEqual(await crawl(executor), expected)
@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+import numpy as np
+
+from ut_course_catalog.bitmask import (
+    decode_periods,
+    decode_semesters,
+    encode_periods,
+    encode_periods_array,
+    encode_semesters,
+    encode_semesters_array,
+    fits,
+    has_semester,
+    occupies,
+    overlaps,
+    slot_bit,
+    slot_matrix,
+)
+from ut_course_catalog.common import Semester, Weekday
+
+PERIODS = [
+    {(Weekday.Mon, 1)},
+    {(Weekday.Mon, 1), (Weekday.Wed, 3)},
+    {(Weekday.Sun, 8)},
+    set(),
+    {(Weekday.Tue, 2), None},
+]
+
+
+class TestBitmask(TestCase):
+    def test_round_trip(self) -> None:
+        for semesters in [set(), {Semester.S1}, set(Semester)]:
+            self.assertEqual(decode_semesters(encode_semesters(semesters)), semesters)
+        for periods in PERIODS:
+            self.assertEqual(decode_periods(encode_periods(periods)), periods)
+        masks = encode_periods_array(PERIODS)
+        self.assertEqual(masks.dtype, np.uint64)
+        self.assertEqual([decode_periods(x) for x in masks], PERIODS)
+        self.assertEqual(encode_periods({(Weekday.Mon, 1)}), 1)
+        with self.assertRaises(ValueError):
+            slot_bit(Weekday.Mon, 0)
+        with self.assertRaises(ValueError):
+            encode_periods({(Weekday.Mon, 9)})
+
+    def test_vectorized(self) -> None:
+        masks = encode_periods_array(PERIODS)
+        np.testing.assert_array_equal(
+            occupies(masks, Weekday.Mon, 1), [True, True, False, False, False]
+        )
+        timetable = encode_periods({(Weekday.Wed, 3), (Weekday.Tue, 2), None})
+        np.testing.assert_array_equal(
+            overlaps(masks, timetable), [False, True, False, False, True]
+        )
+        free = encode_periods({(Weekday.Mon, 1), (Weekday.Sun, 8), (Weekday.Tue, 2)})
+        np.testing.assert_array_equal(
+            fits(masks, free), [True, False, True, True, False]
+        )
+        np.testing.assert_array_equal(fits(list(masks), free), fits(masks, free))
+        semesters = encode_semesters_array([{Semester.S1}, {Semester.A1, Semester.W}])
+        np.testing.assert_array_equal(
+            has_semester(semesters, [Semester.W, Semester.S2]), [False, True]
+        )
+
+    def test_slot_matrix(self) -> None:
+        matrix = slot_matrix(encode_periods_array(PERIODS))
+        self.assertEqual(matrix.shape, (5, 7, 8))
+        counts = matrix.sum(axis=0)
+        self.assertEqual(counts[Weekday.Mon, 0], 2)
+        self.assertEqual(counts[Weekday.Sun, 7], 1)
+        self.assertEqual(counts.sum(), 5)
@@ -0,0 +1,77 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog import ArchiveMissError, CodeIndex, PageArchive
+
+from .test_parser import DETAIL
+
+
+class TestCodeIndex(IsolatedAsyncioTestCase):
+    def test_index(self) -> None:
+        with TemporaryDirectory() as d:
+            path = Path(d) / "codes.sqlite"
+            with CodeIndex(path) as index:
+                index.add("0505001", "FSC-MA2301L1")
+                index.add("0505002", "FSC-MA2301L1")
+                index.add("0505003", "FSC-MA2302L1")
+            with CodeIndex(path) as index:
+                self.assertEqual(len(index), 3)
+                self.assertEqual(index.get_common_code("0505002"), "FSC-MA2301L1")
+                self.assertIsInstance(index.get_common_code("0505002"), utcc.CommonCode)
+                self.assertEqual(index.get_code("FSC-MA2301L1"), "0505001")
+                self.assertIsNone(index.get_code("FSC-MA2303L1"))
+                self.assertEqual(
+                    index.get_codes(["FSC-MA2302L1", "FSC-MA2303L1"]),
+                    {"FSC-MA2302L1": "0505003"},
+                )
+
+    def test_changed_common_code(self) -> None:
+        with TemporaryDirectory() as d:
+            path = Path(d) / "codes.sqlite"
+            with CodeIndex(path) as index:
+                index.add("0505001", "FSC-MA2301L1")
+                index.add("0505002", "FSC-MA2301L1")
+                index.add("0505003", "FSC-MA2302L1")
+                index.add("0505001", "FSC-MA2303L1")
+                index.add("0505003", "FSC-MA2304L1")
+                self.assertEqual(index.get_code("FSC-MA2301L1"), "0505002")
+                self.assertEqual(index.get_code("FSC-MA2303L1"), "0505001")
+                self.assertIsNone(index.get_code("FSC-MA2302L1"))
+            with CodeIndex(path) as index:
+                self.assertEqual(index.get_code("FSC-MA2301L1"), "0505002")
+                self.assertIsNone(index.get_code("FSC-MA2302L1"))
+                self.assertEqual(index.get_code("FSC-MA2304L1"), "0505003")
+
+    def test_first_indexed(self) -> None:
+        with TemporaryDirectory() as d:
+            path = Path(d) / "codes.sqlite"
+            with CodeIndex(path) as index:
+                index.add("0505001", "FSC-MA2301L1")
+                index.add("0505002", "FSC-MA2301L1")
+                index.add("0505001", "FSC-MA2302L1")
+                self.assertEqual(index.get_code("FSC-MA2301L1"), "0505002")
+                # indexed before 0505002
+                index.add("0505001", "FSC-MA2301L1")
+                self.assertEqual(index.get_code("FSC-MA2301L1"), "0505001")
+                self.assertIsNone(index.get_code("FSC-MA2302L1"))
+            with CodeIndex(path) as index:
+                self.assertEqual(index.get_code("FSC-MA2301L1"), "0505001")
+
+    async def test_catalog(self) -> None:
+        with TemporaryDirectory() as d:
+            with PageArchive(d) as archive:
+                archive.put("detail", {"code": "0505001", "year": "2023"}, DETAIL)
+            async with utcc.UTCourseCatalog(
+                archive=d, offline=True, code_index=Path(d) / "codes.sqlite"
+            ) as catalog:
+                await catalog.fetch_detail("0505001", 2023)
+                # served from the index filled by fetch_detail
+                self.assertEqual(
+                    await catalog.fetch_common_code("0505001"), "FSC-MA2301L1"
+                )
+                self.assertEqual(await catalog.fetch_code("FSC-MA2301L1"), "0505001")
+                results = await catalog.fetch_common_codes(["0505001", "0505002"])
+                self.assertEqual(results[0], "FSC-MA2301L1")
+                self.assertIsInstance(results[1], ArchiveMissError)
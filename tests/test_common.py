@@ -0,0 +1,221 @@
+import asyncio
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+
+from ut_course_catalog.common import (
+    CancellableIterator,
+    CancelScope,
+    RateLimitter,
+    SharedRateLimitter,
+    SingleFlight,
+    _try_lock,
+    _unlock,
+    map_bounded,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimitter(IsolatedAsyncioTestCase):
+    async def test_burst(self) -> None:
+        clock = FakeClock()
+        limitter = RateLimitter(1, burst=3, clock=clock)
+        for _ in range(3):
+            self.assertTrue(limitter.callable)
+            self.assertEqual(await limitter.wait(), 0)
+        self.assertFalse(limitter.callable)
+        clock.now += 1
+        self.assertTrue(limitter.callable)
+
+    async def test_wait(self) -> None:
+        limitter = RateLimitter(0.05)
+        await limitter.wait()
+        self.assertGreater(await limitter.wait(), 0.03)
+
+    async def test_refund_and_charge(self) -> None:
+        clock = FakeClock()
+        limitter = RateLimitter(1, burst=2, clock=clock)
+        await limitter.wait()
+        limitter.refund()
+        self.assertEqual(limitter.tokens, 2)
+        limitter.charge()
+        limitter.charge()
+        limitter.charge()
+        self.assertEqual(limitter.tokens, -1)
+
+    async def test_adaptive(self) -> None:
+        limitter = RateLimitter(0.5, adaptive=True, min_rate=0.5)
+        self.assertEqual(limitter.rate, 2)
+        limitter.record(0.1, 429)
+        self.assertEqual(limitter.rate, 1)
+        limitter.record(0.1, 503)
+        limitter.record(0.1, 503)
+        self.assertEqual(limitter.rate, 0.5)
+        for _ in range(100):
+            limitter.record(0.1, 200)
+        self.assertEqual(limitter.rate, 2)
+
+    async def test_not_adaptive(self) -> None:
+        limitter = RateLimitter(0.5)
+        limitter.record(0.1, 429)
+        self.assertEqual(limitter.rate, 2)
+
+
+class TestSharedRateLimitter(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "rate"
+        self.clock = FakeClock()
+
+    async def asyncTearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def create(self, **kwargs: object) -> SharedRateLimitter:
+        limitter = SharedRateLimitter(self.path, 1, clock=self.clock, **kwargs)
+        self.addCleanup(limitter.close)
+        return limitter
+
+    async def test_shared(self) -> None:
+        a = self.create(burst=2)
+        b = self.create(burst=2)
+        await a.wait()
+        self.assertEqual(b.tokens, 1)
+        await b.wait()
+        self.assertFalse(a.callable)
+        a.refund()
+        self.assertTrue(b.callable)
+        self.clock.now += 1
+        self.assertEqual(a.tokens, 2)
+
+    async def test_adaptive(self) -> None:
+        a = self.create(adaptive=True)
+        b = self.create(adaptive=True)
+        a.record(0.1, 429)
+        b.record(0.1, 429)
+        self.assertEqual(a.rate, 0.25)
+        self.assertEqual(b.tokens, 0)
+
+    async def test_locked(self) -> None:
+        a = self.create(burst=2, lock_timeout=0.1)
+        b = self.create(burst=2)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, fd)
+        self.assertTrue(_try_lock(fd))
+        # another process holds the lock: the loop keeps running
+        waiting = asyncio.create_task(b.wait())
+        await asyncio.sleep(0.02)
+        self.assertFalse(waiting.done())
+        with self.assertRaises(TimeoutError):
+            await a.wait()
+        # deferred until the lock is released
+        a.charge()
+        _unlock(fd)
+        await asyncio.wait_for(waiting, 1)
+        self.assertEqual(a.tokens, 0)
+        a.refund()
+        self.assertEqual(b.tokens, 1)
+
+
+class TestMapBounded(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started: list[int] = []
+
+    async def double(self, x: int) -> int:
+        self.started.append(x)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01 * (5 - x % 5))
+        finally:
+            self.in_flight -= 1
+        return x * 2
+
+    async def test_ordered(self) -> None:
+        results = [x async for x in map_bounded(self.double, range(10), concurrency=3)]
+        self.assertEqual(results, [x * 2 for x in range(10)])
+        self.assertEqual(self.max_in_flight, 3)
+
+    async def test_unordered(self) -> None:
+        results = [
+            x
+            async for x in map_bounded(
+                self.double, range(10), concurrency=5, ordered=False
+            )
+        ]
+        self.assertEqual(sorted(results), [x * 2 for x in range(10)])
+        self.assertNotEqual(results, [x * 2 for x in range(10)])
+
+    async def test_aclose(self) -> None:
+        results = map_bounded(self.double, range(100), concurrency=4)
+        async for _ in results:
+            break
+        await results.aclose()
+        self.assertEqual(self.in_flight, 0)
+        self.assertLess(len(self.started), 10)
+
+    async def test_cancel_on_drop(self) -> None:
+        scope = CancelScope()
+        results = map_bounded(self.double, range(100), concurrency=4, scope=scope)
+        async for _ in CancellableIterator(results, scope):
+            break
+        # cancelled when the iterator is dropped, not when the generator is finalized
+        await asyncio.sleep(0)
+        self.assertEqual(self.in_flight, 0)
+        self.assertLess(len(self.started), 10)
+
+
+class TestSingleFlight(IsolatedAsyncioTestCase):
+    async def test_coalesce(self) -> None:
+        flights: SingleFlight[int, int] = SingleFlight()
+        calls: list[int] = []
+
+        async def call(x: int) -> int:
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            return x * 2
+
+        results = await asyncio.gather(
+            *(flights.do(x % 2, lambda x=x: call(x % 2)) for x in range(6))
+        )
+        self.assertEqual(results, [0, 2] * 3)
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual((flights.calls, flights.coalesced), (2, 4))
+        self.assertEqual(len(flights), 0)
+
+    async def test_cancel(self) -> None:
+        flights: SingleFlight[int, int] = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def call() -> int:
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return 1
+
+        first = asyncio.ensure_future(flights.do(0, call))
+        second = asyncio.ensure_future(flights.do(0, call))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 1)
+        self.assertFalse(cancelled.is_set())
+
+        third = asyncio.ensure_future(flights.do(0, call))
+        await asyncio.sleep(0)
+        third.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        self.assertTrue(cancelled.is_set())
+        self.assertNotIn(0, flights)
@@ -0,0 +1,102 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.dead_letter import DeadLetterStore
+from ut_course_catalog.retry_policy import HTTPStatusError, RetryPolicy
+from ut_course_catalog.snapshot import Snapshot
+from ut_course_catalog.stand_in import StandInServer
+
+from .test_common import FakeClock
+from .test_stand_in import create_catalog
+
+
+class TestDeadLetterStore(TestCase):
+    def test_store(self) -> None:
+        clock = FakeClock()
+        with TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "dead_letters.sqlite"
+            with DeadLetterStore(path, clock=clock) as store:
+                store.add("detail", "0001/2023", ("0001", 2023), ValueError("a"), 3)
+                clock.now = 1
+                store.add("detail", "0001/2023", ("0001", 2023), IndexError("b"))
+                store.add("search", "x/2", (utcc.SearchParams(), 2), ValueError())
+                self.assertTrue(store.discard("search", "x/2"))
+                self.assertFalse(store.discard("search", "x/2"))
+            with DeadLetterStore(path) as store:
+                (letter,) = store
+                self.assertEqual(
+                    letter[2:],
+                    (("0001", 2023), "IndexError", "b", 4, 0, 1),
+                )
+                self.assertIn(("detail", "0001/2023"), store)
+                self.assertEqual(store.letters("search"), [])
+
+
+class TestRedrive(IsolatedAsyncioTestCase):
+    async def test_redrive(self) -> None:
+        with TemporaryDirectory() as tempdir, DeadLetterStore(
+            Path(tempdir) / "dead_letters.sqlite"
+        ) as store:
+            # page 1 succeeds with this seed
+            async with StandInServer(40, error_rate=0.2, seed=2) as server:
+                async with create_catalog(
+                    server,
+                    dead_letters=store,
+                    retry_policy=RetryPolicy(max_attempts=1),
+                ) as catalog:
+                    details = await catalog.fetch_search_detail_all(
+                        utcc.SearchParams(), year=2023, use_tqdm=False
+                    )
+                    # every course is either fetched or in a dead letter
+                    self.assertEqual(
+                        len(details)
+                        + len(store.letters("search")) * utcc.ITEMS_PER_PAGE
+                        + len(store.letters("detail")),
+                        40,
+                    )
+                    self.assertLess(len(details), 40)
+                    self.assertTrue(store.letters("search"))
+                    for letter in store:
+                        self.assertEqual(letter.error, HTTPStatusError.__name__)
+                        self.assertEqual(letter.payload[-1], 2023)
+                    snapshot = Snapshot.from_details(details, 2023)
+                    server.error_rate = 0
+                    delta = await catalog.redrive(snapshot, use_tqdm=False)
+            self.assertEqual(len(store), 0)
+            self.assertEqual(len(delta.added), 40 - len(details))
+            self.assertEqual(
+                sorted(snapshot.details), sorted(x.時間割コード for x in server.courses)
+            )
+            # fingerprinted as in an incremental crawl
+            self.assertEqual(
+                set(snapshot.fingerprints), {x.時間割コード for x in delta.added}
+            )
+
+    async def test_redrive_year(self) -> None:
+        params = utcc.SearchParams()
+        with TemporaryDirectory() as tempdir, DeadLetterStore(
+            Path(tempdir) / "dead_letters.sqlite"
+        ) as store:
+            store.add(
+                "search", f"{params.id()}/2/2022", (params, 2, 2022), ValueError()
+            )
+            async with StandInServer(15) as server, create_catalog(
+                server, dead_letters=store
+            ) as catalog:
+                # the page failed in a crawl of another year
+                delta = await catalog.redrive(Snapshot(2023), use_tqdm=False)
+                self.assertEqual(delta.added, [])
+                self.assertEqual(server.counts["result"], 0)
+                self.assertEqual(len(store), 1)
+                snapshot = Snapshot(2022)
+                delta = await catalog.redrive(snapshot, use_tqdm=False)
+            self.assertEqual(len(delta.added), 5)
+            self.assertEqual(len(store), 0)
+            self.assertEqual(len(snapshot.fingerprints), 5)
+
+    async def test_redrive_without_store(self) -> None:
+        async with StandInServer(0) as server, create_catalog(server) as catalog:
+            with self.assertRaises(ValueError):
+                await catalog.redrive(Snapshot(2023))
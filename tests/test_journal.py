@@ -0,0 +1,131 @@
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog import CrawlJournal, Semester, Weekday
+
+
+def create_details(code: str) -> utcc.Details:
+    return utcc.Details(
+        時間割コード=code,
+        共通科目コード=utcc.CommonCode("FSC-MA2301L1"),
+        コース名="コース",
+        教員="教員",
+        学期={Semester.S1},
+        曜限={(Weekday.Mon, 1)},
+        ねらい="ねらい",
+        教室="N/A",
+        単位数=Decimal(2),
+        他学部履修可=True,
+        講義使用言語="日本語",
+        実務経験のある教員による授業科目=False,
+        開講所属=utcc.Faculty.理学部,
+        授業計画=None,
+        授業の方法=None,
+        成績評価方法=None,
+        教科書=None,
+        参考書=None,
+        履修上の注意=None,
+    )
+
+
+def create_search_result(codes: list[str], page: int) -> utcc.SearchResult:
+    items = [
+        utcc.SearchResultItem(
+            時間割コード=code,
+            共通科目コード=utcc.CommonCode("FSC-MA2301L1"),
+            コース名="コース",
+            教員="教員",
+            学期={Semester.S1},
+            曜限=set(),
+            ねらい="ねらい",
+        )
+        for code in codes
+    ]
+    return utcc.SearchResult(
+        items=items,
+        current_items_first_index=(page - 1) * 10 + 1,
+        current_items_last_index=(page - 1) * 10 + len(items),
+        current_items_count=len(items),
+        total_items_count=20,
+        current_page=page,
+        total_pages=2,
+    )
+
+
+class TestCrawlJournal(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "all.journal"
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_resume(self) -> None:
+        params = utcc.SearchParams()
+        with CrawlJournal(self.path) as journal:
+            journal.start(params, 2023)
+            journal.record_page(2, create_search_result(["3", "4"], 2))
+            journal.record_page(1, create_search_result(["1", "2"], 1))
+            journal.record_detail(create_details("4"), 2023)
+            journal.record_detail(create_details("1"), 2023)
+
+        # simulate a crash while writing
+        with self.path.open("ab") as f:
+            f.write(b"\x80\x05\x95garbage")
+
+        with CrawlJournal(self.path) as journal:
+            self.assertEqual(journal.year, 2023)
+            self.assertEqual(set(journal.pages), {1, 2})
+            journal.start(params, 2023)
+            with self.assertRaises(ValueError):
+                journal.start(utcc.SearchParams(keyword="x"), 2023)
+            journal.record_detail(create_details("2"), 2023)
+
+        with CrawlJournal(self.path) as journal:
+            codes = [details.時間割コード for details in journal.get_details()]
+            self.assertEqual(codes, ["1", "2", "4"])
+
+    def test_years(self) -> None:
+        params = utcc.SearchParams()
+        with CrawlJournal(self.path) as journal:
+            journal.start(params, [2022, 2023])
+            journal.record_page(1, create_search_result(["1", "2"], 1))
+            journal.record_detail(create_details("2"), 2022)
+            journal.record_detail(create_details("2"), 2023)
+            journal.record_detail(create_details("1"), 2023)
+
+        with CrawlJournal(self.path) as journal:
+            self.assertEqual(journal.years, (2022, 2023))
+            journal.start(params, (2022, 2023))
+            with self.assertRaises(ValueError):
+                journal.start(params, 2023)
+            by_year = journal.get_details_by_year()
+            self.assertEqual(
+                {year: [x.時間割コード for x in xs] for year, xs in by_year.items()},
+                {2022: ["2"], 2023: ["1", "2"]},
+            )
+
+    def test_records_on_disk(self) -> None:
+        params = utcc.SearchParams()
+        with patch("ut_course_catalog.journal.os.fsync") as fsync:
+            with CrawlJournal(self.path, flush_every=2) as journal:
+                journal.start(params, 2023)
+                for code in ("1", "2", "3"):
+                    journal.record_detail(create_details(code), 2023)
+                # the last one is still buffered
+                self.assertEqual(journal.details["3", 2023], create_details("3"))
+                self.assertEqual(journal.details["1", 2023], create_details("1"))
+                # read from the disk, not kept in memory
+                self.assertIsNot(journal.details["1", 2023], journal.details["1", 2023])
+                # fsynced only on close
+                self.assertEqual(fsync.call_count, 0)
+            self.assertEqual(fsync.call_count, 1)
+        with CrawlJournal(self.path) as journal:
+            self.assertEqual(
+                list(journal.details), [("1", 2023), ("2", 2023), ("3", 2023)]
+            )
+            self.assertEqual(journal.details["2", 2023], create_details("2"))
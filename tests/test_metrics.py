@@ -0,0 +1,106 @@
+import json
+import logging
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import aiohttp
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.metrics import (
+    Histogram,
+    JSONFormatter,
+    JSONLinesSink,
+    Metrics,
+    PrometheusTextSink,
+    serve_prometheus,
+)
+from ut_course_catalog.stand_in import StandInServer
+
+from .test_stand_in import create_catalog
+
+
+class TestMetrics(TestCase):
+    def test_histogram(self) -> None:
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.5, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1])
+        self.assertEqual(histogram.mean, 0.7625)
+        self.assertEqual(histogram.quantile(0.5), 1)
+        self.assertEqual(histogram.quantile(1), float("inf"))
+
+    def test_prometheus(self) -> None:
+        metrics = Metrics(buckets=(1,))
+        metrics.increment("utcc_requests_total", endpoint="detail", status=200)
+        metrics.increment("utcc_requests_total", endpoint="detail", status=200)
+        metrics.add("utcc_in_flight", 1, stage="detail")
+        metrics.observe("utcc_request_seconds", 0.5, endpoint='a"b')
+        self.assertEqual(
+            metrics.get("utcc_requests_total", status=200, endpoint="detail"), 2
+        )
+        self.assertEqual(
+            metrics.to_prometheus().splitlines(),
+            [
+                "# TYPE utcc_requests_total counter",
+                'utcc_requests_total{endpoint="detail",status="200"} 2',
+                "# TYPE utcc_in_flight gauge",
+                'utcc_in_flight{stage="detail"} 1',
+                "# TYPE utcc_request_seconds histogram",
+                'utcc_request_seconds_bucket{endpoint="a\\"b",le="1"} 1',
+                'utcc_request_seconds_bucket{endpoint="a\\"b",le="+Inf"} 1',
+                'utcc_request_seconds_sum{endpoint="a\\"b"} 0.5',
+                'utcc_request_seconds_count{endpoint="a\\"b"} 1',
+            ],
+        )
+
+    def test_sinks(self) -> None:
+        with TemporaryDirectory() as tempdir:
+            jsonl = Path(tempdir) / "metrics.jsonl"
+            prom = Path(tempdir) / "metrics.prom"
+            metrics = Metrics([JSONLinesSink(jsonl), PrometheusTextSink(prom)])
+            metrics.increment("utcc_retries_total")
+            metrics.flush()
+            metrics.increment("utcc_retries_total")
+            metrics.flush()
+            metrics.close()
+            records = [json.loads(line) for line in jsonl.read_text().splitlines()]
+            self.assertEqual(
+                [x["metrics"]["utcc_retries_total"][0]["value"] for x in records],
+                [1, 2],
+            )
+            self.assertIn("utcc_retries_total 2", prom.read_text())
+
+    def test_json_formatter(self) -> None:
+        record = logging.makeLogRecord(
+            {"msg": "failed %s", "args": ("0001",), "levelname": "WARNING"}
+        )
+        record.code = "0001"
+        data = json.loads(JSONFormatter().format(record))
+        self.assertEqual(data["message"], "failed 0001")
+        self.assertEqual(data["code"], "0001")
+        self.assertNotIn("args", data)
+
+
+class TestInstrumentation(IsolatedAsyncioTestCase):
+    async def test_crawl(self) -> None:
+        metrics = Metrics()
+        async with StandInServer(15) as server, create_catalog(
+            server, metrics=metrics
+        ) as catalog:
+            await catalog.fetch_search_detail_all(
+                utcc.SearchParams(), year=2023, use_tqdm=False
+            )
+        self.assertEqual(
+            metrics.get("utcc_requests_total", endpoint="detail", status=200), 15
+        )
+        self.assertEqual(metrics.get("utcc_parse_seconds", endpoint="detail"), 15)
+        self.assertEqual(metrics.get("utcc_in_flight", stage="detail"), 0)
+
+    async def test_serve(self) -> None:
+        metrics = Metrics()
+        metrics.increment("utcc_retries_total")
+        async with serve_prometheus(
+            metrics, port=0
+        ) as url, aiohttp.ClientSession() as session, session.get(url) as response:
+            self.assertIn("utcc_retries_total 1", await response.text())
@@ -0,0 +1,32 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.parsed_cache import ParsedCache
+
+from .test_parser import DETAIL
+
+
+class TestParsedCache(TestCase):
+    def test_get_put(self) -> None:
+        parser = utcc.get_parser("html.parser")
+        details = parser.parse_detail(DETAIL)
+        params = {"code": "0505001", "year": "2023"}
+        with TemporaryDirectory() as d:
+            path = Path(d) / "parsed.sqlite"
+            with ParsedCache(path) as cache:
+                key = cache.key("detail", params, DETAIL, parser)
+                self.assertIsNone(cache.get(key))
+                cache.put(key, details)
+            with ParsedCache(path) as cache:
+                self.assertEqual(cache.get(key), details)
+                self.assertEqual((cache.hits, cache.misses), (1, 0))
+                # different page or parser version
+                self.assertNotEqual(
+                    cache.key("detail", params, DETAIL + " ", parser), key
+                )
+                parser.version = "2"
+                self.assertNotEqual(cache.key("detail", params, DETAIL, parser), key)
+                cache.connection.execute("UPDATE parsed SET value = x'00'")
+                self.assertIsNone(cache.get(key))
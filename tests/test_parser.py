@@ -0,0 +1,81 @@
+from importlib.util import find_spec
+from unittest import TestCase, skipUnless
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog import Semester, Weekday
+
+SEARCH = """<html><body>
+<div class="catalog-total-search-result">1 - 1 件 / 全 1 件</div>
+<div class="catalog-search-result-card-container">
+  <div class="catalog-search-result-card">
+    <div class="catalog-search-result-table-row">header</div>
+    <div class="catalog-search-result-table-row">
+      <div class="code-cell">
+        <div>0505001</div>
+        <div>FSC-MA2301L1</div>
+      </div>
+      <div class="name-cell">集合と位相</div>
+      <div class="lecturer-cell">東大 太郎</div>
+      <div class="semester-cell">
+        <span class="catalog-semester-icon">S1</span>
+        <span class="catalog-semester-icon">S2</span>
+      </div>
+      <div class="period-cell">月曜2限、水曜2限</div>
+    </div>
+    <div class="catalog-search-result-card-body-text">
+      集合と位相の基礎を学ぶ。\r\n
+    </div>
+  </div>
+</div>
+</body></html>"""
+
+DETAIL = """<html><body>
+<div class="catalog-row">header</div>
+<div class="catalog-row">
+  <div class="code-cell">
+    <div>0505001</div>
+    <div>FSC-MA2301L1</div>
+  </div>
+  <div class="name-cell">集合と位相</div>
+  <div class="lecturer-cell">東大 太郎</div>
+  <div class="semester-cell"><span class="catalog-semester-icon">S1</span></div>
+  <div class="period-cell">月曜2限</div>
+</div>
+<div class="catalog-page-detail-lecture-aim">集合と位相の基礎を学ぶ。</div>
+<div class="td1-cell">日本語</div>
+<div class="td1-cell">NO</div>
+<div class="td1-cell">理学部</div>
+<div class="td2-cell">2</div>
+<div class="td2-cell">不可</div>
+<div class="td2-cell">-</div>
+<div class="catalog-page-detail-card">
+  <div class="catalog-page-detail-card-header">授業計画</div>
+  <div class="catalog-page-detail-card-body-pre">
+第1回 集合\r\n第2回 位相
+  </div>
+</div>
+</body></html>"""
+
+
+class TestParser(TestCase):
+    def test_search(self) -> None:
+        result = utcc.get_parser("html.parser").parse_search(SEARCH, 1)
+        self.assertEqual(result.total_items_count, 1)
+        item = result.items[0]
+        self.assertEqual(item.時間割コード, "0505001")
+        self.assertEqual(item.学期, {Semester.S1, Semester.S2})
+        self.assertEqual(item.曜限, {(Weekday.Mon, 2), (Weekday.Wed, 2)})
+
+    def test_detail(self) -> None:
+        details = utcc.get_parser("html.parser").parse_detail(DETAIL)
+        self.assertEqual(details.共通科目コード, "FSC-MA2301L1")
+        self.assertEqual(details.開講所属, utcc.Faculty.理学部)
+        self.assertFalse(details.他学部履修可)
+        self.assertEqual(details.授業計画, "第1回 集合\r\n第2回 位相")
+
+    @skipUnless(find_spec("lxml"), "lxml is not installed")
+    def test_identical(self) -> None:
+        reference = utcc.get_parser("html.parser")
+        parser = utcc.get_parser("lxml")
+        self.assertEqual(parser.parse_search(SEARCH), reference.parse_search(SEARCH))
+        self.assertEqual(parser.parse_detail(DETAIL), reference.parse_detail(DETAIL))
@@ -0,0 +1,68 @@
+import json
+import pstats
+import tracemalloc
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.profiling import Profiler
+from ut_course_catalog.stand_in import StandInServer
+
+from .test_common import FakeClock
+from .test_stand_in import create_catalog
+
+
+class TestProfiler(TestCase):
+    def test_stage(self) -> None:
+        clock = FakeClock()
+        with TemporaryDirectory() as tempdir:
+            profiler = Profiler(tempdir, cpu=False, memory=False, clock=clock)
+            with profiler:
+                with profiler.stage("detail"):
+                    clock.now = 2
+                    with profiler.stage("parse"):
+                        clock.now = 3
+                        profiler.observe_loop_lag(0.5)
+                    profiler.observe_loop_lag(0.25)
+                with profiler.stage("detail"):
+                    clock.now = 4
+            detail, parse = profiler.stages["detail"], profiler.stages["parse"]
+            self.assertEqual(
+                (detail.calls, detail.seconds, detail.max_seconds), (2, 4, 3)
+            )
+            self.assertEqual((parse.calls, parse.loop_lag), (1, 0.5))
+            self.assertEqual((detail.loop_lag, detail.max_loop_lag), (0.75, 0.5))
+            data = json.loads((Path(tempdir) / "stages.json").read_text())
+            self.assertEqual(data["seconds"], 4)
+            self.assertEqual(data["stages"]["detail"]["mean_seconds"], 2)
+            self.assertFalse((Path(tempdir) / "profile.prof").exists())
+
+    def test_artifacts(self) -> None:
+        with TemporaryDirectory() as tempdir:
+            with Profiler(tempdir, snapshot_interval=0) as profiler:
+                with profiler.stage("convert"):
+                    data = [str(i) for i in range(1000)]
+            self.assertGreater(profiler.stages["convert"].allocated, 0)
+            self.assertFalse(tracemalloc.is_tracing())
+            self.assertEqual(len(data), 1000)
+            pstats.Stats(str(Path(tempdir) / "profile.prof"))
+            for name in ("memory.snapshot", "memory-convert.snapshot"):
+                tracemalloc.Snapshot.load(str(Path(tempdir) / name))
+            self.assertIn("Top allocations:", profiler.summary())
+
+
+class TestCatalogProfiling(IsolatedAsyncioTestCase):
+    async def test_crawl(self) -> None:
+        with TemporaryDirectory() as tempdir:
+            profiler = Profiler(tempdir, cpu=False, memory=False)
+            async with StandInServer(15) as server, create_catalog(
+                server, profiler=profiler
+            ) as catalog:
+                await catalog.fetch_search_detail_all(
+                    utcc.SearchParams(), year=2023, use_tqdm=False
+                )
+            self.assertEqual(
+                {k: v.calls for k, v in profiler.stages.items()},
+                {"search": 2, "detail": 15, "parse": 17},
+            )
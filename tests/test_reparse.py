@@ -0,0 +1,44 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from ut_course_catalog import PageArchive
+from ut_course_catalog.reparse import reparse_archive
+
+from .test_parser import DETAIL, SEARCH
+
+
+class TestReparse(TestCase):
+    def test_reparse(self) -> None:
+        with TemporaryDirectory() as d:
+            with PageArchive(d) as archive:
+                digest = archive.put(
+                    "detail", {"code": "0505001", "year": "2023"}, DETAIL
+                )
+                archive.put("detail", {"code": "0505001", "year": "2022"}, DETAIL)
+                archive.put("detail", {"code": "0505002", "year": "2023"}, "")
+                archive.put("result", {"type": "all", "page": "1"}, SEARCH)
+                for workers in (0, 2):
+                    result = reparse_archive(archive, workers=workers, search=True)
+                    self.assertEqual(result.snapshot.year, 2023)
+                    self.assertEqual(list(result.snapshot.details), ["0505001"])
+                    self.assertEqual(
+                        result.snapshot.fingerprints["0505001"].sha256, digest
+                    )
+                    self.assertEqual(
+                        [error.page.params["code"] for error in result.errors],
+                        ["0505002"],
+                    )
+                    self.assertEqual(
+                        result.search_results["page=1&type=all"].items[0].時間割コード,
+                        "0505001",
+                    )
+                    self.assertEqual(result.pages, 3)
+
+    def test_no_pages(self) -> None:
+        with TemporaryDirectory() as d:
+            with PageArchive(d) as archive:
+                with self.assertRaises(ValueError):
+                    reparse_archive(archive, workers=0)
+                archive.put("detail", {"code": "0505001", "year": "2023"}, DETAIL)
+                with self.assertRaises(ValueError):
+                    reparse_archive(archive, year=2022, workers=0)
@@ -0,0 +1,87 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.response_cache import ResponseCache
+
+from .test_common import FakeClock
+
+
+def create_page(text: str) -> utcc.Page:
+    return utcc.Page(
+        text=text, status=200, etag=None, last_modified=None, from_cache=False
+    )
+
+
+class TestResponseCache(TestCase):
+    def test_ttl(self) -> None:
+        clock = FakeClock()
+        with TemporaryDirectory() as d:
+            path = Path(d) / "cache.sqlite"
+            with ResponseCache(
+                path, search_ttl=10, detail_ttl=100, clock=clock
+            ) as cache:
+                cache.put("result", {"page": 1}, create_page("search"))
+                cache.put("detail", {"code": "0505001"}, create_page("detail"))
+                page = cache.get("result", {"page": "1"})
+                assert page is not None
+                self.assertEqual(page.text, "search")
+                self.assertTrue(page.from_cache)
+            clock.now += 50
+            with ResponseCache(
+                path, search_ttl=10, detail_ttl=100, clock=clock
+            ) as cache:
+                self.assertIsNone(cache.get("result", {"page": 1}))
+                page = cache.get("detail", {"code": "0505001"})
+                assert page is not None
+                self.assertEqual(page.text, "detail")
+                self.assertIsNotNone(cache.get("detail", {"code": "0505001"}))
+                self.assertEqual(
+                    (
+                        cache.stats.memory_hits,
+                        cache.stats.disk_hits,
+                        cache.stats.misses,
+                        cache.stats.expired,
+                    ),
+                    (1, 1, 1, 1),
+                )
+                self.assertEqual(len(cache), 1)
+
+    def test_eviction(self) -> None:
+        clock = FakeClock()
+        with TemporaryDirectory() as d:
+            with ResponseCache(
+                Path(d) / "cache.sqlite", max_bytes=None, memory_size=0, clock=clock
+            ) as cache:
+                for i in range(3):
+                    cache.put("detail", {"code": i}, create_page("x" * 1000))
+                    clock.now += 1
+                cache.get("detail", {"code": 0})
+                cache.max_bytes = cache.size * 2 // 3
+                cache.put("detail", {"code": 3}, create_page("x" * 1000))
+                # least recently used first
+                self.assertIsNone(cache.get("detail", {"code": 1}))
+                self.assertIsNone(cache.get("detail", {"code": 2}))
+                self.assertIsNotNone(cache.get("detail", {"code": 0}))
+                self.assertIsNotNone(cache.get("detail", {"code": 3}))
+                self.assertEqual(cache.stats.evictions, 2)
+                self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_eviction_memory_hit(self) -> None:
+        clock = FakeClock()
+        with TemporaryDirectory() as d:
+            with ResponseCache(
+                Path(d) / "cache.sqlite", max_bytes=None, memory_size=3, clock=clock
+            ) as cache:
+                for i in range(3):
+                    cache.put("detail", {"code": i}, create_page("x" * 1000))
+                    clock.now += 1
+                cache.get("detail", {"code": 0})
+                self.assertEqual(cache.stats.memory_hits, 1)
+                cache.max_bytes = cache.size * 2 // 3
+                cache.put("detail", {"code": 3}, create_page("x" * 1000))
+                # the memory hit counts as a use on the disk
+                self.assertIsNone(cache.get("detail", {"code": 1}))
+                self.assertIsNone(cache.get("detail", {"code": 2}))
+                self.assertIsNotNone(cache.get("detail", {"code": 0}))
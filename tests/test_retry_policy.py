@@ -0,0 +1,204 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+from unittest import IsolatedAsyncioTestCase
+
+from ut_course_catalog.common import RateLimitter
+from ut_course_catalog.retry_policy import (
+    CircuitBreaker,
+    CircuitState,
+    HTTPStatusError,
+    RetryBudget,
+    RetryPolicy,
+    parse_retry_after,
+)
+from ut_course_catalog.stand_in import StandInServer
+
+from .test_common import FakeClock
+from .test_stand_in import create_catalog
+
+
+class Flaky:
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.calls
+
+
+class CachedSession:
+    """Serve every response as if it came from the cache."""
+
+    def __init__(self, session: Any) -> None:
+        self._session = session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+    @asynccontextmanager
+    async def get(self, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        async with self._session.get(*args, **kwargs) as response:
+            yield CachedResponse(response)
+
+
+class CachedResponse:
+    from_cache = True
+
+    def __init__(self, response: Any) -> None:
+        self._response = response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._response, name)
+
+
+class TestRetryPolicy(IsolatedAsyncioTestCase):
+    def test_parse_retry_after(self) -> None:
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertEqual(
+            parse_retry_after("Thu, 01 Jan 1970 00:01:00 GMT", now=lambda: 30), 30
+        )
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_backoff(self) -> None:
+        policy = RetryPolicy(jitter=False)
+        self.assertEqual([policy.backoff(i) for i in range(1, 5)], [4, 8, 16, 16])
+        error = HTTPStatusError("detail", 429, retry_after=60)
+        self.assertEqual(policy.backoff(1, error), 60)
+        policy = RetryPolicy(seed=0)
+        self.assertTrue(all(0 <= policy.backoff(3) <= 16 for _ in range(100)))
+
+    async def test_call(self) -> None:
+        policy = RetryPolicy(initial=0.001, breaker=False)
+        sleeps = []
+        func = Flaky(HTTPStatusError("detail", 503), asyncio.TimeoutError())
+        result = await policy.call(
+            func, before_sleep=lambda attempt, e, delay: sleeps.append(attempt)
+        )
+        self.assertEqual((result, sleeps), (3, [1, 2]))
+        # not retryable
+        for error in (HTTPStatusError("detail", 404), ValueError()):
+            func = Flaky(error)
+            with self.assertRaises(type(error)):
+                await policy.call(func)
+            self.assertEqual(func.calls, 1)
+        # too many attempts
+        func = Flaky(*[HTTPStatusError("detail", 503)] * 3)
+        with self.assertRaises(HTTPStatusError):
+            await policy.call(func)
+        self.assertEqual(func.calls, 3)
+
+    async def test_budget(self) -> None:
+        policy = RetryPolicy(
+            initial=0.001, budget=RetryBudget(ratio=0.5, max_tokens=1), breaker=False
+        )
+        func = Flaky(*[HTTPStatusError("detail", 503)] * 2)
+        with self.assertRaises(HTTPStatusError):
+            await policy.call(func)
+        self.assertEqual(func.calls, 2)
+        # two successful requests earn a retry
+        policy.record(True)
+        policy.record(True)
+        self.assertEqual(await policy.call(Flaky(asyncio.TimeoutError())), 2)
+        func = Flaky(asyncio.TimeoutError())
+        with self.assertRaises(asyncio.TimeoutError):
+            await policy.call(func)
+        self.assertEqual(func.calls, 1)
+
+
+class TestCircuitBreaker(IsolatedAsyncioTestCase):
+    async def test_breaker(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            window=4, min_calls=4, failure_ratio=0.5, reset_timeout=10, clock=clock
+        )
+        for success in (True, False, True):
+            breaker.record(success)
+        self.assertIs(breaker.state, CircuitState.closed)
+        breaker.record(False)
+        self.assertIs(breaker.state, CircuitState.open)
+        clock.now = 10
+        self.assertIs(breaker.state, CircuitState.half_open)
+        await breaker.acquire()
+        # the others wait for the probe
+        waiting = asyncio.create_task(breaker.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiting.done())
+        # the probe failed, the timeout doubles
+        breaker.record(False)
+        self.assertIs(breaker.state, CircuitState.open)
+        clock.now = 29
+        self.assertIs(breaker.state, CircuitState.open)
+        clock.now = 30
+        await asyncio.wait_for(waiting, 1)
+        breaker.record(True)
+        self.assertIs(breaker.state, CircuitState.closed)
+        await breaker.acquire()
+
+    def test_trip(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(clock=clock)
+        breaker.trip(5)
+        self.assertIs(breaker.state, CircuitState.open)
+        clock.now = 5
+        self.assertIs(breaker.state, CircuitState.half_open)
+
+
+class TestCatalogRetry(IsolatedAsyncioTestCase):
+    async def test_retry_after(self) -> None:
+        async with StandInServer(
+            1, error_rate=1, error_status=429, retry_after=30
+        ) as server, create_catalog(
+            server, retry_policy=RetryPolicy(max_delay=10)
+        ) as catalog:
+            code = server.courses[0].時間割コード
+            with self.assertRaises(HTTPStatusError) as cm:
+                await catalog.retry(catalog.fetch_detail)(code, 2023)
+            self.assertEqual((cm.exception.status, cm.exception.retry_after), (429, 30))
+            # Retry-After exceeds max_delay, so the call is not retried
+            self.assertEqual(server.counts["detail"], 1)
+            breaker = catalog.retry_policy.breaker
+            assert breaker is not None
+            self.assertIs(breaker.state, CircuitState.open)
+
+    async def test_cancel_probe(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(reset_timeout=10, clock=clock)
+        limitter = RateLimitter(60, clock=clock)
+        async with StandInServer(1) as server, create_catalog(
+            server, rate_limitter=limitter, retry_policy=RetryPolicy(breaker=breaker)
+        ) as catalog:
+            await limitter.wait()
+            breaker.trip(10)
+            clock.now = 10
+            # the probe waits for the rate limitter and is cancelled
+            request = asyncio.create_task(
+                catalog.fetch_detail(server.courses[0].時間割コード, 2023)
+            )
+            await asyncio.sleep(0.01)
+            waiting = asyncio.create_task(breaker.acquire())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            await asyncio.wait_for(waiting, 1)
+            self.assertEqual(server.counts["detail"], 0)
+
+    async def test_cached_probe(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(reset_timeout=10, clock=clock)
+        async with StandInServer(1) as server, create_catalog(
+            server, retry_policy=RetryPolicy(breaker=breaker)
+        ) as catalog:
+            catalog.session = CachedSession(catalog.session)
+            breaker.trip(10)
+            clock.now = 10
+            # the probe is served from the cache and carries no outcome
+            await catalog.fetch_detail(server.courses[0].時間割コード, 2023)
+            await asyncio.wait_for(breaker.acquire(), 1)
+            self.assertIs(breaker.state, CircuitState.half_open)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from unittest import IsolatedAsyncioTestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog import Semester
+from ut_course_catalog.sharding import Shard, ShardPlan, check_coverage, plan_shards
+
+from .test_journal import create_search_result
+
+# (課程, 開講所属, 学期) of fake courses
+COURSES = (
+    [(utcc.Institution.学部前期課程, utcc.Faculty.教養学部前期課程, {Semester.S1})] * 30
+    + [(utcc.Institution.学部後期課程, utcc.Faculty.理学部, {Semester.S1})] * 12
+    + [(utcc.Institution.学部後期課程, utcc.Faculty.理学部, {Semester.A1})] * 8
+    + [(utcc.Institution.学部後期課程, utcc.Faculty.工学部, {Semester.S1, Semester.S2})] * 15
+)
+
+
+class FakeCatalog:
+    def retry(self, func):  # type: ignore
+        return func
+
+    async def fetch_search(
+        self, params: utcc.SearchParams, page: int = 1
+    ) -> utcc.SearchResult:
+        count = sum(
+            (params.課程 in (utcc.Institution.All, institution))
+            and params.開講所属 in (None, faculty)
+            and (params.学期 is None or params.学期 in semesters)
+            and params.曜日 is None
+            and params.時限 is None
+            for institution, faculty, semesters in COURSES
+        )
+        return create_search_result([], page)._replace(total_items_count=count)
+
+
+class TestSharding(IsolatedAsyncioTestCase):
+    async def test_plan(self) -> None:
+        plan = await plan_shards(FakeCatalog(), max_items=10)  # type: ignore
+        self.assertEqual(plan.total_items_count, 65)
+        self.assertEqual(plan.covered_items_count, 65)
+        # split by 学期, which is not proven disjoint by the counts
+        self.assertFalse(plan.disjoint)
+        self.assertFalse(plan.exact)
+        shards = {
+            (
+                shard.params.課程,
+                shard.params.開講所属,
+                shard.params.学期,
+            ): shard.total_items_count
+            for shard in plan.shards
+        }
+        self.assertEqual(
+            shards,
+            {
+                # cannot be split further
+                (utcc.Institution.学部前期課程, utcc.Faculty.教養学部前期課程, Semester.S1): 30,
+                (utcc.Institution.学部後期課程, utcc.Faculty.理学部, Semester.S1): 12,
+                (utcc.Institution.学部後期課程, utcc.Faculty.理学部, Semester.A1): 8,
+                # semesters overlap
+                (utcc.Institution.学部後期課程, utcc.Faculty.工学部, None): 15,
+            },
+        )
+        self.assertEqual(
+            [sum(shard.pages for shard in shards) for shards in plan.assign(2)],
+            [4, 4],
+        )
+
+    async def test_plan_exclusive(self) -> None:
+        plan = await plan_shards(FakeCatalog(), max_items=40)  # type: ignore
+        self.assertEqual(
+            [(shard.params.課程, shard.total_items_count) for shard in plan.shards],
+            [(utcc.Institution.学部前期課程, 30), (utcc.Institution.学部後期課程, 35)],
+        )
+        self.assertTrue(plan.disjoint)
+        self.assertTrue(plan.exact)
+
+    def test_coverage(self) -> None:
+        shards = [
+            Shard(utcc.SearchParams(keyword=str(i)), count)
+            for i, count in enumerate([2, 1, 1])
+        ]
+        plan = ShardPlan(utcc.SearchParams(), 3, shards)
+        items = create_search_result(["1", "2", "3"], 1).items
+        coverage = check_coverage(
+            plan,
+            [(shards[0], items[:2]), (shards[1], items[1:2]), (shards[2], items[2:])],
+        )
+        self.assertEqual((coverage.found, coverage.duplicates), (3, 1))
+        self.assertTrue(coverage.complete)
+        coverage = check_coverage(
+            plan, [(shards[0], items[:2]), (shards[2], RuntimeError())]
+        )
+        self.assertFalse(coverage.complete)
@@ -0,0 +1,111 @@
+import pickle  # nosec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.snapshot import Fingerprint, Snapshot
+from ut_course_catalog.stand_in import StandInServer, generate_courses
+
+from .test_journal import create_details
+from .test_stand_in import create_catalog
+
+
+class TestSnapshot(IsolatedAsyncioTestCase):
+    def test_load(self) -> None:
+        details = [create_details("0505001"), None, create_details("0505002")]
+        with TemporaryDirectory() as d:
+            path = Path(d) / "all.pkl"
+            with path.open("wb") as f:
+                pickle.dump(details, f)
+            snapshot = Snapshot.load(path, year=2023)
+            self.assertEqual(snapshot.year, 2023)
+            self.assertEqual(list(snapshot.details), ["0505001", "0505002"])
+            snapshot.fingerprints["0505001"] = Fingerprint.of("page")
+            snapshot.save(Path(d) / "all.snapshot.pkl")
+            self.assertEqual(Snapshot.load(Path(d) / "all.snapshot.pkl"), snapshot)
+
+    def test_load_years(self) -> None:
+        details = {
+            2022: [create_details("0505001")],
+            2023: [create_details("0505001"), create_details("0505002")],
+        }
+        with TemporaryDirectory() as d:
+            path = Path(d) / "all.pkl"
+            with path.open("wb") as f:
+                pickle.dump(details, f)
+            snapshot = Snapshot.load(path, year=2023)
+            self.assertEqual(snapshot.year, 2023)
+            self.assertEqual(list(snapshot.details), ["0505001", "0505002"])
+            with self.assertRaises(ValueError):
+                Snapshot.load(path)
+            with self.assertRaises(ValueError):
+                Snapshot.load(path, year=2021)
+            self.assertEqual(
+                list(Snapshot.from_pickled(details, 2022).details), ["0505001"]
+            )
+            with path.open("wb") as f:
+                pickle.dump({2022: details[2022]}, f)
+            self.assertEqual(Snapshot.load(path).year, 2022)
+        with self.assertRaises(TypeError):
+            Snapshot.from_details(details, 2023)  # type: ignore
+
+    async def test_fetch_detail_if_changed(self) -> None:
+        async with StandInServer(3) as server, create_catalog(server) as catalog:
+            code = server.courses[0].時間割コード
+            details, fingerprint = await catalog.fetch_detail_if_changed(code, 2023)
+            self.assertEqual(details.時間割コード, code)
+            unchanged, same = await catalog.fetch_detail_if_changed(
+                code, 2023, fingerprint
+            )
+            self.assertIsNone(unchanged)
+            self.assertEqual(same, fingerprint)
+            changed, other = await catalog.fetch_detail_if_changed(
+                code, 2024, fingerprint
+            )
+            self.assertEqual(changed.時間割コード, code)
+            self.assertNotEqual(other, fingerprint)
+            self.assertEqual(server.counts["detail"], 3)
+
+    async def test_incremental(self) -> None:
+        courses = generate_courses(21)
+        async with StandInServer(courses[:20]) as server:
+            async with create_catalog(server) as catalog:
+                previous, delta = await catalog.fetch_search_detail_all_incremental(
+                    utcc.SearchParams(), Snapshot(year=2023), use_tqdm=False
+                )
+        self.assertEqual(len(delta.added), 20)
+        self.assertEqual(len(previous.fingerprints), 20)
+        removed, changed, unchanged = courses[0], courses[1], courses[2:20]
+        new = [changed._replace(ねらい="新しいねらい"), *unchanged, courses[20]]
+        async with StandInServer(new) as server:
+            async with create_catalog(server) as catalog:
+                snapshot, delta = await catalog.fetch_search_detail_all_incremental(
+                    utcc.SearchParams(), previous, use_tqdm=False
+                )
+            self.assertEqual(server.counts["detail"], 20)
+        self.assertEqual([x.時間割コード for x in delta.added], [courses[20].時間割コード])
+        self.assertEqual([x.時間割コード for x in delta.changed], [changed.時間割コード])
+        self.assertEqual(delta.changed[0].ねらい, "新しいねらい")
+        self.assertEqual([x.時間割コード for x in delta.removed], [removed.時間割コード])
+        self.assertEqual(set(snapshot.details), {x.時間割コード for x in new})
+        for course in unchanged:
+            # reused without parsing
+            code = course.時間割コード
+            self.assertIs(snapshot.details[code], previous.details[code])
+            self.assertEqual(snapshot.fingerprints[code], previous.fingerprints[code])
+
+    async def test_incremental_without_previous_details(self) -> None:
+        courses = generate_courses(5)
+        async with StandInServer(courses) as server, create_catalog(server) as catalog:
+            previous, _ = await catalog.fetch_search_detail_all_incremental(
+                utcc.SearchParams(), Snapshot(year=2023), use_tqdm=False
+            )
+            code = courses[0].時間割コード
+            del previous.details[code]
+            snapshot, delta = await catalog.fetch_search_detail_all_incremental(
+                utcc.SearchParams(), previous, use_tqdm=False
+            )
+        self.assertEqual([x.時間割コード for x in delta.added], [code])
+        self.assertEqual(delta.changed, [])
+        self.assertEqual(snapshot.details[code].時間割コード, code)
@@ -0,0 +1,281 @@
+import asyncio
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog import PageArchive, Semester
+from ut_course_catalog.benchmark import BenchmarkReport, BenchmarkResult, run_benchmarks
+from ut_course_catalog.stand_in import StandInServer
+
+
+def create_catalog(server: StandInServer, **kwargs: object) -> utcc.UTCourseCatalog:
+    return utcc.UTCourseCatalog(
+        min_interval=0,
+        cache=False,
+        code_index=False,
+        base_url=server.base_url,
+        **kwargs,  # type: ignore
+    )
+
+
+class TestStandInServer(IsolatedAsyncioTestCase):
+    async def test_crawl(self) -> None:
+        async with StandInServer(25) as server, create_catalog(server) as catalog:
+            details = await catalog.fetch_search_detail_all(
+                utcc.SearchParams(), year=2023, use_tqdm=False
+            )
+            self.assertEqual(
+                [x.時間割コード for x in details],
+                [x.時間割コード for x in server.courses],
+            )
+            self.assertEqual(
+                [x.開講所属 for x in details], [x.開講所属 for x in server.courses]
+            )
+            self.assertEqual(server.counts["result"], 3)
+            result = await catalog.fetch_search(utcc.SearchParams(学期=Semester.S1))
+            self.assertEqual(
+                result.total_items_count,
+                sum(Semester.S1 in x.学期 for x in server.courses),
+            )
+
+    async def test_error(self) -> None:
+        async with StandInServer(1, error_rate=1) as server, create_catalog(
+            server
+        ) as catalog:
+            with self.assertRaises(Exception):
+                await catalog.fetch_detail(server.courses[0].時間割コード, 2023)
+            self.assertEqual(server.counts["error"], 1)
+
+    async def test_error_on_first_page(self) -> None:
+        async with StandInServer(1, error_rate=1) as server, create_catalog(
+            server
+        ) as catalog:
+            with patch.object(utcc, "tqdm") as tqdm:
+                with self.assertRaises(utcc.HTTPStatusError):
+                    await catalog.fetch_search_all(utcc.SearchParams()).__anext__()
+            # no progress bar is left open
+            tqdm.assert_not_called()
+
+    async def test_replay(self) -> None:
+        with TemporaryDirectory() as tempdir, PageArchive(
+            Path(tempdir) / "archive"
+        ) as archive:
+            async with StandInServer(5) as server, create_catalog(
+                server, archive=archive
+            ) as catalog:
+                expected = await catalog.fetch_search(utcc.SearchParams())
+            async with StandInServer(0, archive=archive) as server, create_catalog(
+                server
+            ) as catalog:
+                self.assertEqual(
+                    await catalog.fetch_search(utcc.SearchParams()), expected
+                )
+                with self.assertRaises(Exception):
+                    await catalog.fetch_detail(expected.items[0].時間割コード, 2023)
+                self.assertEqual(server.counts["detail"], 1)
+
+
+def search_tasks() -> list[asyncio.Task[object]]:
+    """Tasks of fetch_search_all which are fetching a page."""
+    return [
+        task
+        for task in asyncio.all_tasks()
+        if "fetch_search_all" in task.get_coro().__qualname__  # type: ignore
+    ]
+
+
+class TestFetchSearchAll(IsolatedAsyncioTestCase):
+    async def test_limit(self) -> None:
+        async with StandInServer(95) as server, create_catalog(server) as catalog:
+            items = [
+                x
+                async for x in catalog.fetch_search_all(
+                    utcc.SearchParams(), use_tqdm=False, limit=25
+                )
+            ]
+            self.assertEqual(
+                [x.時間割コード for x in items],
+                [x.時間割コード for x in server.courses[:25]],
+            )
+            self.assertEqual(server.counts["result"], 3)
+
+    async def test_ordered(self) -> None:
+        async with StandInServer(95, jitter=0.02) as server, create_catalog(
+            server
+        ) as catalog:
+            expected = [x.時間割コード for x in server.courses]
+            ordered = [
+                x.時間割コード
+                async for x in catalog.fetch_search_all(
+                    utcc.SearchParams(), use_tqdm=False
+                )
+            ]
+            self.assertEqual(ordered, expected)
+            unordered = [
+                x.時間割コード
+                async for x in catalog.fetch_search_all(
+                    utcc.SearchParams(), use_tqdm=False, ordered=False
+                )
+            ]
+            self.assertCountEqual(unordered, expected)
+
+    async def test_cancel_on_break(self) -> None:
+        async with StandInServer(200, latency=0.2) as server, create_catalog(
+            server
+        ) as catalog:
+            count = 0
+            async for _ in catalog.fetch_search_all(
+                utcc.SearchParams(), use_tqdm=False, max_concurrency=4
+            ):
+                count += 1
+                if count > 10:
+                    break
+            tasks = search_tasks()
+            self.assertEqual(len(tasks), 3)
+            await asyncio.wait(tasks, timeout=0.1)
+            self.assertTrue(all(task.cancelled() for task in tasks))
+            await asyncio.sleep(0.3)
+            self.assertEqual(server.counts["result"], 5)
+
+    async def test_cancel_on_aclose(self) -> None:
+        async with StandInServer(200, latency=0.2) as server, create_catalog(
+            server
+        ) as catalog:
+            async with catalog.fetch_search_all(
+                utcc.SearchParams(), use_tqdm=False, max_concurrency=4
+            ) as items:
+                count = 0
+                async for _ in items:
+                    count += 1
+                    if count > 10:
+                        break
+                self.assertEqual(len(search_tasks()), 3)
+            self.assertEqual(search_tasks(), [])
+            self.assertEqual(server.counts["result"], 5)
+
+
+class TestPipeline(IsolatedAsyncioTestCase):
+    async def test_pipeline(self) -> None:
+        async with StandInServer(100, latency=0.005) as server, create_catalog(
+            server
+        ) as catalog:
+            search_requests: list[int] = []
+
+            def on_detail_request(details: utcc.Details) -> None:
+                search_requests.append(server.counts["result"])
+
+            details = [
+                x
+                async for x in catalog.iter_search_detail_all(
+                    utcc.SearchParams(),
+                    year=2023,
+                    use_tqdm=False,
+                    on_detail_request=on_detail_request,
+                    max_concurrency=5,
+                    max_search_concurrency=1,
+                    ordered=True,
+                )
+            ]
+            self.assertEqual(
+                [x.時間割コード for x in details],
+                [x.時間割コード for x in server.courses],
+            )
+            # details are fetched while the search pages are still being fetched
+            self.assertLess(search_requests[0], 10)
+            self.assertEqual(server.counts["result"], 10)
+            self.assertEqual(server.counts["detail"], 100)
+
+    async def test_unordered(self) -> None:
+        async with StandInServer(50, jitter=0.01) as server, create_catalog(
+            server
+        ) as catalog:
+            details = [
+                x
+                async for x in catalog.iter_search_detail_all(
+                    utcc.SearchParams(), year=2023, use_tqdm=False
+                )
+            ]
+            self.assertCountEqual(
+                [x.時間割コード for x in details],
+                [x.時間割コード for x in server.courses],
+            )
+
+    async def test_failures_are_left_out(self) -> None:
+        async with StandInServer(25) as server, create_catalog(server) as catalog:
+            missing = server.courses[3].時間割コード
+            del server._by_code[missing]  # answered with 404
+            details = await catalog.fetch_search_detail_all(
+                utcc.SearchParams(), year=2023, use_tqdm=False
+            )
+            self.assertEqual(
+                [x.時間割コード for x in details],
+                [x.時間割コード for x in server.courses if x.時間割コード != missing],
+            )
+
+    async def test_years(self) -> None:
+        async with StandInServer(25) as server, create_catalog(server) as catalog:
+            results = [
+                (year, x.時間割コード)
+                async for year, x in catalog.iter_search_detail_all_years(
+                    utcc.SearchParams(),
+                    years=[2022, 2023, 2022],
+                    use_tqdm=False,
+                    ordered=True,
+                )
+            ]
+            self.assertEqual(
+                results,
+                [(year, x.時間割コード) for x in server.courses for year in (2022, 2023)],
+            )
+            # the search pages are shared by the years
+            self.assertEqual(server.counts["result"], 3)
+            self.assertEqual(server.counts["detail"], 50)
+
+
+class TestBenchmark(IsolatedAsyncioTestCase):
+    async def test_run_benchmarks(self) -> None:
+        report = await run_benchmarks(courses=20, latency=0, repeat=1)
+        self.assertEqual(
+            [(x.name, x.count) for x in report.results],
+            [
+                ("fetch_search", 2),
+                ("fetch_detail", 20),
+                ("crawl", 20),
+                ("to_perfect_isolated_dataframe", 20),
+            ],
+        )
+        with TemporaryDirectory() as tempdir:
+            report.save(Path(tempdir) / "benchmark.json")
+            self.assertEqual(
+                BenchmarkReport.load(Path(tempdir) / "benchmark.json"), report
+            )
+
+    async def test_archive(self) -> None:
+        with TemporaryDirectory() as tempdir:
+            async with StandInServer(25) as server, create_catalog(
+                server, archive=tempdir
+            ) as catalog:
+                await catalog.fetch_search_detail_all(
+                    utcc.SearchParams(), year=2022, use_tqdm=False
+                )
+                await catalog.fetch_detail(server.courses[0].時間割コード, 2023)
+            report = await run_benchmarks(archive=tempdir, latency=0, repeat=1)
+        self.assertEqual(
+            [(x.name, x.count) for x in report.results],
+            [
+                ("fetch_search", 3),
+                ("fetch_detail", 25),
+                ("crawl", 25),
+                ("to_perfect_isolated_dataframe", 25),
+            ],
+        )
+        self.assertEqual(report.environment["archive"], tempdir)
+
+    def test_compare(self) -> None:
+        baseline = BenchmarkReport([BenchmarkResult("a", 100, 1, "pages/s")])
+        current = BenchmarkReport([BenchmarkResult("a", 85, 1, "pages/s")])
+        self.assertEqual(current.compare(baseline, tolerance=0.2), [])
+        (regression,) = current.compare(baseline)
+        self.assertAlmostEqual(regression.change, -0.15)
@@ -0,0 +1,81 @@
+import pickle  # nosec
+import sys
+from decimal import Decimal
+from unittest import TestCase
+
+import numpy as np
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.common import Semester, Weekday
+from ut_course_catalog.table import CatalogTable
+
+from .test_journal import create_details
+
+
+def create_catalog(n: int) -> list[utcc.Details]:
+    return [
+        create_details(f"{i:07d}")._replace(
+            学期={Semester.S1, Semester.S2} if i % 2 else {Semester.A1},
+            曜限={(Weekday(i % 6), i % 6 + 1)} if i % 3 else {(Weekday.Sat, 8), None},
+            単位数=Decimal("1.5") if i % 4 else Decimal(2),
+            開講所属=utcc.Faculty.工学部 if i % 5 else utcc.Faculty.理学部,
+            授業計画="計画" * 100 if i % 2 else None,
+        )
+        for i in range(n)
+    ]
+
+
+class TestCatalogTable(TestCase):
+    def test_round_trip(self) -> None:
+        details = create_catalog(30)
+        table = CatalogTable.from_details([*details, None])
+        self.assertEqual(len(table), 30)
+        self.assertIsNone(table.years)
+        self.assertEqual(list(table), details)
+        self.assertEqual(table[-1], details[-1])
+        self.assertIsInstance(table[0].共通科目コード, utcc.CommonCode)
+        self.assertEqual(len(table.dictionaries["授業計画"]), 1)
+        with self.assertRaises(IndexError):
+            table[30]
+
+    def test_years_and_take(self) -> None:
+        details = create_catalog(10)
+        table = CatalogTable.from_details_by_year({2022: details, 2023: details})
+        np.testing.assert_array_equal(table.years, [2022] * 10 + [2023] * 10)
+        self.assertEqual(len(table.dictionaries["時間割コード"]), 10)
+        recent = table.take(table.years == 2023)
+        self.assertEqual(list(recent), details)
+        self.assertIs(recent.dictionaries, table.dictionaries)
+        self.assertEqual(table.take([3])[0], details[3])
+
+    def test_to_pandas(self) -> None:
+        details = create_catalog(12)
+        table = CatalogTable.from_details(details, year=2023)
+        df = table.to_pandas()
+        self.assertEqual(len(df), 12)
+        self.assertEqual(df["コース名"].dtype, "category")
+        self.assertEqual(df["単位数"].tolist(), [float(x.単位数) for x in details])
+        self.assertTrue(df["授業計画"].isna().iloc[0])
+        self.assertEqual(df["開講所属"].iloc[0], utcc.Faculty.理学部.value)
+        self.assertTrue(np.shares_memory(df["曜限"].to_numpy(), table.columns["曜限"]))
+        decoded = table.to_pandas(decode_sets=True)
+        self.assertEqual(decoded["学期"].tolist(), [x.学期 for x in details])
+        self.assertEqual(decoded["曜限"].tolist(), [x.曜限 for x in details])
+
+    def test_invalid_period(self) -> None:
+        details = create_details("0000000")._replace(曜限={(Weekday.Mon, 9)})
+        with self.assertRaises(ValueError):
+            CatalogTable.from_details([details])
+
+    def test_smaller_than_details(self) -> None:
+        details = create_catalog(200)
+        years = {
+            year: pickle.loads(pickle.dumps(details))  # nosec
+            for year in range(2020, 2024)
+        }
+        size = sum(
+            sys.getsizeof(x) + sum(sys.getsizeof(v) for v in x)
+            for xs in years.values()
+            for x in xs
+        )
+        self.assertLess(CatalogTable.from_details_by_year(years).nbytes, size / 4)
@@ -0,0 +1,43 @@
+from unittest import IsolatedAsyncioTestCase
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from ut_course_catalog.transport import TransportConfig, TransportStats
+
+BODY = "x" * 1000
+
+
+class TestTransport(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        app = web.Application()
+
+        async def handler(request: web.Request) -> web.Response:
+            return web.Response(text=BODY)
+
+        app.router.add_get("/", handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.close()
+
+    async def fetch(self, config: TransportConfig, n: int) -> TransportStats:
+        stats = TransportStats()
+        async with config.create_session([stats.trace_config()]) as session:
+            for _ in range(n):
+                async with session.get(self.server.make_url("/")) as response:
+                    self.assertEqual(await response.text(), BODY)
+        return stats
+
+    async def test_keepalive(self) -> None:
+        stats = await self.fetch(TransportConfig(), 5)
+        self.assertEqual(stats.requests, 5)
+        self.assertEqual((stats.connections_created, stats.connections_reused), (1, 4))
+        self.assertEqual(stats.decoded_bytes_in, 5 * len(BODY))
+        self.assertGreater(stats.bytes_in, stats.decoded_bytes_in)
+        self.assertGreater(stats.bytes_out, 0)
+
+    async def test_force_close(self) -> None:
+        stats = await self.fetch(TransportConfig(keepalive_timeout=None), 3)
+        self.assertEqual((stats.connections_created, stats.connections_reused), (3, 0))
@@ -0,0 +1,140 @@
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import ut_course_catalog.ja as utcc
+from ut_course_catalog.metrics import Metrics
+from ut_course_catalog.work_queue import (
+    QueueRateLimitter,
+    WorkQueue,
+    collect_details,
+    enqueue_crawl,
+    run_worker,
+)
+
+from .test_common import FakeClock
+from .test_journal import create_details, create_search_result
+
+
+class TestWorkQueue(TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.clock = FakeClock()
+        self.queue = WorkQueue(
+            Path(self.tempdir.name) / "queue.sqlite",
+            lease=10,
+            max_attempts=2,
+            clock=self.clock,
+        ).open()
+
+    def tearDown(self) -> None:
+        self.queue.close()
+        self.tempdir.cleanup()
+
+    def test_lease(self) -> None:
+        self.assertTrue(self.queue.put("detail", "a", 1))
+        self.assertFalse(self.queue.put("detail", "a", 2))
+        (job,) = self.queue.claim("w1", 10)
+        self.assertEqual((job.key, job.payload, job.attempts), ("a", 1, 1))
+        self.assertEqual(self.queue.claim("w2"), [])
+        # the lease of w1 expires
+        self.clock.now = 11
+        (job2,) = self.queue.claim("w2")
+        self.assertEqual(job2.attempts, 2)
+        self.assertFalse(self.queue.complete(job, "w1"))
+        self.assertTrue(self.queue.complete(job2, "w2", [("detail", "b", 3)]))
+        self.assertEqual(list(self.queue.results("detail")), [("a", "w2")])
+        self.assertEqual(self.queue.counts()["pending"], 1)
+
+    def test_fail(self) -> None:
+        self.queue.put("detail", "a", 1)
+        self.assertTrue(self.queue.fail(self.queue.claim("w")[0], "error"))
+        self.assertEqual(self.queue.counts()["pending"], 1)
+        self.queue.fail(self.queue.claim("w")[0], "error")
+        self.assertEqual(self.queue.counts()["failed"], 1)
+        self.assertEqual(list(self.queue.failures()), [("detail", "a", "'error'")])
+        self.assertEqual(self.queue.retry_failed(), 1)
+        self.assertEqual(self.queue.claim("w")[0].attempts, 1)
+
+    def test_reserve(self) -> None:
+        self.assertEqual(self.queue.reserve(2), 0)
+        self.assertEqual(self.queue.reserve(2), 2)
+        self.clock.now = 1
+        self.assertEqual(self.queue.reserve(2), 3)
+
+
+class FakeCatalog:
+    def __init__(self) -> None:
+        self.failures = {"0001/2022"}
+        self.metrics = Metrics()
+
+    async def fetch_search(
+        self, params: utcc.SearchParams, page: int = 1
+    ) -> utcc.SearchResult:
+        return create_search_result(
+            [f"{i:04d}" for i in range(page * 10 - 9, page * 10 + 1)], page
+        )
+
+    async def fetch_detail(self, code: str, year: int) -> utcc.Details:
+        if f"{code}/{year}" in self.failures:
+            self.failures.remove(f"{code}/{year}")
+            raise RuntimeError("failed once")
+        return create_details(code)
+
+
+class TestRunWorker(IsolatedAsyncioTestCase):
+    async def test_run_worker(self) -> None:
+        with TemporaryDirectory() as tempdir, WorkQueue(
+            Path(tempdir) / "queue.sqlite"
+        ) as queue:
+            self.assertEqual(enqueue_crawl(queue, utcc.SearchParams(), [2022, 2023]), 1)
+            catalog = FakeCatalog()
+            stats = await run_worker(catalog, queue, concurrency=4)  # type: ignore
+            self.assertEqual((stats.completed, stats.retried), (2 + 40, 1))
+            self.assertEqual(
+                catalog.metrics.get("utcc_jobs_total", kind="detail", result="retried"),
+                1,
+            )
+            self.assertEqual(catalog.metrics.get("utcc_queue_jobs", state="done"), 42)
+            self.assertEqual(queue.counts()["done"], 42)
+            details = collect_details(queue)
+            self.assertEqual(sorted(details), [2022, 2023])
+            self.assertEqual(len(details[2022]), 20)
+
+    async def test_locked(self) -> None:
+        with TemporaryDirectory() as tempdir, WorkQueue(
+            Path(tempdir) / "queue.sqlite", timeout=5
+        ) as queue:
+            enqueue_crawl(queue, utcc.SearchParams(), [2022])
+            # another process holds the database
+            other = sqlite3.connect(queue.path, isolation_level=None)
+            self.addCleanup(other.close)
+            other.execute("BEGIN IMMEDIATE")
+            worker = asyncio.create_task(run_worker(FakeCatalog(), queue))  # type: ignore
+            # the event loop is not blocked while the worker waits for the lock
+            start = time.monotonic()
+            await asyncio.sleep(0.05)
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertFalse(worker.done())
+            other.execute("COMMIT")
+            stats = await asyncio.wait_for(worker, 5)
+            self.assertEqual((stats.completed, stats.retried), (2 + 20, 1))
+
+    async def test_rate_limitter(self) -> None:
+        with TemporaryDirectory() as tempdir, WorkQueue(
+            Path(tempdir) / "queue.sqlite", timeout=5
+        ) as queue:
+            limitter = QueueRateLimitter(queue, 0)
+            await limitter.wait()
+            # another process holds the database
+            other = sqlite3.connect(queue.path, isolation_level=None)
+            self.addCleanup(other.close)
+            other.execute("BEGIN IMMEDIATE")
+            waiting = asyncio.create_task(limitter.wait())
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            other.execute("COMMIT")
+            await asyncio.wait_for(waiting, 5)